@@ -0,0 +1,120 @@
+"""
+Benchmark the writing speed (MB/s) of the fast CoNLL-U writer against Stanza's
+CoNLL.write_doc2conll. The outputs are also checked to be byte-identical, for the corpus and for
+a small sample with multi-word tokens, whitespace misc (e.g. SpaceAfter=No) and unsorted
+features. The output of the fast writer is then read back with Stanza and written again with
+CoNLL.write_doc2conll, which must give the same output (a round trip). The script exits with an
+error if a check fails, so that it can be run as a check of the installed Stanza version.
+
+Usage: python benchmark_conllu_writer.py <corpus> [repeats]
+"""
+# Example: python scripts/benchmark_conllu_writer.py 'data/test-set.conllu.bz2' 5
+
+from context import speechact
+import speechact.corpus as corp
+import speechact.conllu as conllu
+from stanza.utils.conll import CoNLL
+import io
+import sys
+import time
+
+SAMPLE = (
+    '# text = Hej, dum-dom!\n'
+    '1\tHej\thej\tINTJ\t_\tNumber=Sing|Case=Nom\t0\troot\t_\tSpacesBefore=\\s|SpaceAfter=No|Foo=Bar\n'
+    '2\t,\t,\tPUNCT\t_\t_\t1\tpunct\t_\t_\n'
+    '3-4\tdum-dom\t_\t_\t_\t_\t_\t_\t_\tSpaceAfter=No\n'
+    '3\tdum\tdum\tADJ\t_\t_\t1\tamod\t_\tZed=1\n'
+    '4\tdom\tdom\tNOUN\t_\t_\t1\tobj\t_\t_\n'
+    '5\t!\t!\tPUNCT\t_\t_\t1\tpunct\t_\tSpacesAfter=\\n\n'
+    '\n'
+)
+"""A CoNLL-U sentence with the token fields that the writers treat specially."""
+
+
+def stanza_output(document) -> str:
+    target = io.StringIO()
+    CoNLL.write_doc2conll(document, target)
+    return target.getvalue()
+
+
+def fast_output(document) -> str:
+    target = io.StringIO()
+    conllu.write_doc2conll(document, target)
+    return target.getvalue()
+
+
+def measure(name: str, write, repeats: int, reference: str|None) -> str:
+    """
+    Time the write function, which writes to the given TextIO, and print the speed in MB/s.
+    """
+    output = ''
+    best_time = float('inf')
+    for _ in range(repeats):
+        target = io.StringIO()
+        start = time.perf_counter()
+        write(target)
+        best_time = min(best_time, time.perf_counter() - start)
+        output = target.getvalue()
+
+    megabytes = len(output.encode('utf-8')) / 1e6
+    identical = '' if reference is None else f', identical: {output == reference}'
+    print(f'{name:>16}: {megabytes / best_time:8.2f} MB/s ({best_time:.3f} s{identical})')
+    return output
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) != 2 and len(sys.argv) != 3:
+        print('Usage: python benchmark_conllu_writer.py <corpus> [repeats]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print('Loading corpus...')
+    documents = list(corpus.batched_docs(1000))
+    sentences = list(corpus.sentences())
+    sentence_dicts = [(sentence.to_dict(), sentence.comments)
+                      for document in documents for sentence in document.sentences]
+    print(f'Loaded {len(sentences)} sentences.')
+
+    def write_stanza(target):
+        for document in documents:
+            CoNLL.write_doc2conll(document, target)
+
+    def write_documents(target):
+        with conllu.ConlluWriter(target) as writer:
+            for document in documents:
+                writer.write_document(document)
+
+    def write_dicts(target):
+        with conllu.ConlluWriter(target) as writer:
+            for token_dicts, comments in sentence_dicts:
+                writer.write_dicts(token_dicts, comments)
+
+    def write_lines(target):
+        with conllu.ConlluWriter(target) as writer:
+            for sentence in sentences:
+                writer.write_lines(sentence.sentence_lines, properties={'speech_act': 'assertion'})
+
+    reference = measure('write_doc2conll', write_stanza, repeats, None)
+    document_output = measure('document', write_documents, repeats, reference)
+    dicts_output = measure('token dicts', write_dicts, repeats, reference)
+    measure('patched lines', write_lines, repeats, None)
+    failed = document_output != reference or dicts_output != reference
+
+    # The sample sentence.
+    sample = CoNLL.conll2doc(input_str=SAMPLE)
+    sample_identical = fast_output(sample) == stanza_output(sample)
+    print(f'Sample identical: {sample_identical}')
+    failed = failed or not sample_identical
+
+    # Read the output of the fast writer back, and write it again with Stanza.
+    round_trip = ''.join(stanza_output(CoNLL.conll2doc(input_str=fast_output(document)))
+                         for document in documents + [sample])
+    expected = ''.join(fast_output(document) for document in documents + [sample])
+    print(f'Round trip identical: {round_trip == expected}')
+    failed = failed or round_trip != expected
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,115 @@
+"""
+Benchmark a frozen inference artifact (see speechact/classifier/frozen.py) against the embedding
+classifier it was exported from. The artifact is exported first, if the artifact directory does
+not have one.
+
+Each classifier is measured in a fresh Python process, so that the load time includes importing
+its modules: the time to import and load the classifier, the latency of the first call (one
+sentence), and the steady-state throughput of classifying the corpus. The speech acts of the two
+classifiers are compared.
+
+The SBERT model can be a stand-in model from create_standin_model.py, so that the benchmark runs
+offline. Without a classification model file, the network is randomly initialized and saved to
+the artifact directory, so that both classifiers use the same one.
+
+Usage: python benchmark_frozen_classifier.py <corpus> <sbert model> <artifact directory> [model file] [batch size]
+"""
+# Example: python scripts/benchmark_frozen_classifier.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/frozen' 'models/embedding-based.pth' 32
+
+from context import speechact
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+import time
+
+MEASURE = '--measure'
+NETWORK_FILE = 'network.pth'
+
+
+def measure(kind: str, corpus_file: str, sbert_model: str, artifact_dir: str, model_file: str, batch_size: int) -> dict:
+    """
+    Measure a classifier, in the current process.
+    """
+    start = time.perf_counter()
+    if kind == 'frozen':
+        import speechact.classifier.frozen as frozen
+        classifier = frozen.FrozenClassifier(artifact_dir, batch_size=batch_size)
+        predict = lambda sentences: classifier.predict_batch(sentences)
+    else:
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model)
+        classifier.load(model_file)
+        predict = lambda sentences: classifier.predict_batch(sentences, batch_size=batch_size)
+    load_time = time.perf_counter() - start
+
+    import speechact.corpus as corp
+    sentences = [sentence for document in corp.Corpus(corpus_file).batched_docs(1000) for sentence in document.sentences]
+
+    start = time.perf_counter()
+    predict(sentences[:1])
+    first_call = time.perf_counter() - start
+
+    best_time = float('inf')
+    for _ in range(2):
+        start = time.perf_counter()
+        codes = predict(sentences)
+        best_time = min(best_time, time.perf_counter() - start)
+
+    return {
+        'load_time': load_time,
+        'first_call': first_call,
+        'throughput': len(sentences) / best_time,
+        'sbert_imported': 'sentence_transformers' in sys.modules,
+        'codes': codes.tolist()  # type: ignore
+    }
+
+
+if __name__ == '__main__':
+    # Measure a classifier in this process.
+    if len(sys.argv) == 8 and sys.argv[1] == MEASURE:
+        result = measure(sys.argv[2], sys.argv[3], sys.argv[4], sys.argv[5], sys.argv[6], int(sys.argv[7]))
+        print(json.dumps(result))
+        sys.exit(0)
+
+    # Check the number of arguments passed
+    if len(sys.argv) < 4 or len(sys.argv) > 6:
+        print('Usage: python benchmark_frozen_classifier.py <corpus> <sbert model> <artifact directory> [model file] [batch size]')
+        sys.exit(1)
+
+    corpus_file = sys.argv[1]
+    sbert_model = sys.argv[2]
+    artifact_dir = sys.argv[3]
+    model_file = sys.argv[4] if len(sys.argv) > 4 else os.path.join(artifact_dir, NETWORK_FILE)
+    batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 32
+
+    import speechact.classifier.frozen as frozen
+    if not os.path.isfile(os.path.join(artifact_dir, frozen.MODEL_FILE)):
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model)
+        if os.path.isfile(model_file):
+            classifier.load(model_file)
+        else:
+            os.makedirs(artifact_dir, exist_ok=True)
+            classifier.save(model_file)
+
+        start = time.perf_counter()
+        frozen.export(classifier, artifact_dir)
+        print(f'Exported in {time.perf_counter() - start:.1f} s')
+
+    results = {}
+    for kind in ['embedding', 'frozen']:
+        print(f'Measuring the {kind} classifier...')
+        output = subprocess.run([sys.executable, __file__, MEASURE, kind, corpus_file, sbert_model,
+                                 artifact_dir, model_file, str(batch_size)],
+                                stdout=subprocess.PIPE, text=True, check=True).stdout
+        results[kind] = json.loads(output.strip().splitlines()[-1])
+
+    print(f'{"classifier":>10} {"load s":>8} {"first call ms":>14} {"sentences/sec":>14} {"imports sbert":>14}')
+    for kind, result in results.items():
+        print(f'{kind:>10} {result["load_time"]:8.2f} {1000 * result["first_call"]:14.1f} '
+              f'{result["throughput"]:14.0f} {str(result["sbert_imported"]):>14}')
+
+    agreement = np.mean(np.array(results['embedding']['codes']) == np.array(results['frozen']['codes']))
+    print(f'Agreement: {100 * agreement:.2f}%')
@@ -0,0 +1,117 @@
+"""
+Benchmark the shared-weight inference pool (see speechact/classifier/pool.py). The classifier is
+loaded once, and the corpus is classified by pools of 1 up to the maximum number of workers. For
+each pool size, the throughput is reported, with the memory of the workers: their unique memory
+(USS, the memory that only the worker uses), which is what each added worker costs, and their
+proportional memory (PSS, where the shared pages are split between the processes). The unique
+memory is measured when the workers have started, which shows what of the model is copied into
+them, and after the corpus is classified, which adds the working memory of the inference (the
+activations, and the memory that the allocator keeps for them). The working memory depends on the
+batch sizes and the sentence lengths, not on the size of the model.
+
+The speech acts of the pools are compared to those of the classifier in this process.
+
+The model is either a classification model file (.pth) for the SBERT model, or the directory of a
+frozen classifier (see speechact/classifier/frozen.py). The SBERT model can be a stand-in model
+from create_standin_model.py, so that the benchmark runs offline. Without a model file, the
+network is randomly initialized.
+
+Usage: python benchmark_inference_pool.py <corpus> <sbert model> [model] [max workers] [threads per worker] [chunk size]
+"""
+# Example: python scripts/benchmark_inference_pool.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/embedding-based.pth' 8 1 64
+# Example: python scripts/benchmark_inference_pool.py 'data/test-set.conllu.bz2' 'None' 'models/frozen' 4
+
+from context import speechact
+import speechact.classifier.pool as pool
+import speechact.corpus as corp
+import multiprocessing as mp
+import numpy as np
+import os
+import sys
+import time
+import torch
+
+
+def memory(pid: int) -> tuple[int, int]:
+    """
+    Get the unique (USS) and the proportional (PSS) memory of a process, in bytes.
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return values['Private_Clean'] + values['Private_Dirty'], values['Pss']
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 7:
+        print('Usage: python benchmark_inference_pool.py <corpus> <sbert model> [model] [max workers] [threads per worker] [chunk size]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    sbert_model = sys.argv[2]
+    model = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'None' else None
+    max_workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count() or 1
+    threads_per_worker = int(sys.argv[5]) if len(sys.argv) > 5 else 1
+    chunk_size = int(sys.argv[6]) if len(sys.argv) > 6 else 64
+
+    print('Loading sentences...')
+    sentences = [sentence for document in corpus.batched_docs(1000) for sentence in document.sentences]
+    texts = [sentence.text for sentence in sentences]
+
+    if model != None and os.path.isdir(model):
+        import speechact.classifier.frozen as frozen
+        classifier = frozen.FrozenClassifier(model, batch_size=chunk_size)
+        model_size = os.path.getsize(os.path.join(model, frozen.MODEL_FILE))
+    else:
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model)
+        if model != None:
+            classifier.load(model)
+        model_size = None
+
+    # The reference: the classifier in this process, with the threads of one worker.
+    torch.set_num_threads(threads_per_worker)
+    start = time.perf_counter()
+    reference = np.concatenate([pool.predict_texts(classifier, texts[start:start + chunk_size])[0]
+                                for start in range(0, len(texts), chunk_size)])
+    reference_time = time.perf_counter() - start
+
+    with pool.InferencePool(classifier, workers=1) as size_check:
+        weights_size = size_check.weights_size
+    if model_size == None:
+        model_size = weights_size
+
+    print(f'{len(sentences)} sentences, {os.cpu_count()} cores, {threads_per_worker} threads per worker, '
+          f'model {model_size / 2**20:.1f} MiB')
+    print(f'In this process: {len(sentences) / reference_time:.0f} sentences/sec')
+    print(f'{"workers":>7} {"sentences/sec":>14} {"speedup":>8} {"started USS MiB":>16} {"/model":>7} '
+          f'{"final USS MiB":>14} {"/model":>7} {"PSS total MiB":>14} {"agreement":>10}')
+
+    base_throughput = None
+    for workers in range(1, max_workers + 1):
+        with pool.InferencePool(classifier, workers=workers, threads_per_worker=threads_per_worker,
+                                chunk_size=chunk_size) as inference_pool:
+            started_memory = [memory(process.pid) for process in mp.active_children()]  # type: ignore
+
+            # Warm up the workers.
+            list(inference_pool.predict_texts(texts[:chunk_size * workers]))
+
+            start = time.perf_counter()
+            codes = np.concatenate([chunk_codes for chunk_codes, _ in inference_pool.predict_texts(texts)])
+            throughput = len(texts) / (time.perf_counter() - start)
+
+            worker_memory = [memory(process.pid) for process in mp.active_children()]  # type: ignore
+
+        if base_throughput == None:
+            base_throughput = throughput
+        started_uss = np.mean([unique for unique, _ in started_memory])
+        uss = np.mean([unique for unique, _ in worker_memory])
+        pss = sum(proportional for _, proportional in worker_memory)
+        agreement = np.mean(codes == reference)
+        print(f'{workers:7} {throughput:14.0f} {throughput / base_throughput:7.2f}x {started_uss / 2**20:16.1f} '
+              f'{started_uss / model_size:7.1%} {uss / 2**20:14.1f} {uss / model_size:7.1%} {pss / 2**20:14.1f} '
+              f'{100 * agreement:9.2f}%')
@@ -0,0 +1,125 @@
+"""
+Benchmark length-bucketed batching (see speechact/batching.py) against the fixed batching of
+the SBERT encoder (32 sentences at a time, in corpus order) and of the dependency parser
+(documents of 200 sentences, which stanza batches by at most 1000 words). The padding waste,
+i.e. the fraction of the padded tokens that are padding, and the throughput are reported.
+
+The speech acts of the embedding classifier are compared, to make sure that the batching does
+not change them. The dependency parser is only timed if parse is True, since its model needs
+to be downloaded. The parses are then compared too.
+
+Usage: python benchmark_length_bucketing.py <corpus> <sbert model> [device] [token budget] [window] [parse]
+"""
+# Example: python scripts/benchmark_length_bucketing.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' cpu 4096 1024 True
+
+from context import speechact
+import speechact.batching as batching
+import speechact.classifier.embedding as emb
+import speechact.corpus as corp
+import speechact.preprocess as pre
+import numpy as np
+import sys
+import time
+
+def stanza_batches(lengths: np.ndarray, document_size: int, batch_size: int) -> list[np.ndarray]:
+    """
+    Get the batches that stanza parses documents of document_size sentences in. Stanza sorts
+    the sentences of a document by length, and batches them by at most batch_size words.
+    """
+    batches = []
+    for start in range(0, len(lengths), document_size):
+        order = start + np.argsort(-lengths[start:start + document_size], kind='stable')
+        batch = []
+        words = 0
+        for index in order:
+            if words + lengths[index] > batch_size and len(batch) > 0:
+                batches.append(np.array(batch))
+                batch = []
+                words = 0
+            batch.append(index)
+            words += lengths[index]
+        if len(batch) > 0:
+            batches.append(np.array(batch))
+    return batches
+
+
+def get_parses(sentences) -> list[tuple]:
+    return [(word.head, word.deprel) for sentence in sentences for word in sentence.words]
+
+
+def clear_parses(sentences):
+    for sentence in sentences:
+        for word in sentence.words:
+            word.head = None
+            word.deprel = None
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 7:
+        print('Usage: python benchmark_length_bucketing.py <corpus> <sbert model> [device] [token budget] [window] [parse]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    model_name = sys.argv[2]
+    device = sys.argv[3] if len(sys.argv) > 3 else 'cpu'
+    token_budget = int(sys.argv[4]) if len(sys.argv) > 4 else 4096
+    window = int(sys.argv[5]) if len(sys.argv) > 5 else 1024
+    parse = sys.argv[6] == 'True' if len(sys.argv) > 6 else False
+
+    print('Loading sentences...')
+    sentences = [sentence for document in corpus.batched_docs(1000) for sentence in document.sentences]
+    print(f'Loaded {len(sentences)} sentences.')
+
+    # SBERT encoding.
+    classifier = emb.EmbeddingClassifier(device=device, model_name=model_name)
+    bucketer = batching.LengthBucketer(token_budget=token_budget, window=window)
+    lengths = np.array(classifier.token_lengths([sentence.text for sentence in sentences]))
+
+    classifier.predict_batch(sentences[:100])  # Warm up.
+    start = time.perf_counter()
+    fixed_codes = classifier.predict_batch(sentences)
+    fixed_time = time.perf_counter() - start
+
+    classifier.bucketer = bucketer
+    start = time.perf_counter()
+    bucketed_codes = classifier.predict_batch(sentences)
+    bucketed_time = time.perf_counter() - start
+
+    fixed_waste = batching.padding_waste(lengths, batching.fixed_batches(len(lengths), 32))
+    print('SBERT encoding:')
+    print(f'  fixed (32 sentences): {len(sentences) / fixed_time:8.0f} sentences/sec, padding waste {100 * fixed_waste:.1f}%')
+    print(f'  bucketed:             {len(sentences) / bucketed_time:8.0f} sentences/sec, padding waste {100 * bucketer.padding_waste:.1f}%')
+    print(f'  speedup: {fixed_time / bucketed_time:.2f}x, identical speech acts: {np.array_equal(fixed_codes, bucketed_codes)} '
+          f'({int(np.sum(fixed_codes != bucketed_codes))} mismatches)')
+    print(f'  {bucketer.report()}')
+
+    # Dependency parsing.
+    word_lengths = np.array([len(sentence.words) for sentence in sentences])
+    bucketer = batching.LengthBucketer(token_budget=5000, window=2000)
+    bucketed_waste = batching.padding_waste(word_lengths, bucketer.batches(word_lengths))
+    fixed_waste = batching.padding_waste(word_lengths, stanza_batches(word_lengths, 200, 1000))
+    print('Dependency parsing:')
+    print(f'  fixed (200 sentences): padding waste {100 * fixed_waste:.1f}%')
+    print(f'  bucketed:              padding waste {100 * bucketed_waste:.1f}%')
+
+    if parse:
+        pipeline = pre.create_dep_pipeline(batch_size=1000)
+        clear_parses(sentences)
+        start = time.perf_counter()
+        for index in range(0, len(sentences), 200):
+            pre.parse_dependencies(pipeline, sentences[index:index + 200])
+        fixed_time = time.perf_counter() - start
+        fixed_parses = get_parses(sentences)
+
+        pipeline = pre.create_dep_pipeline(batch_size=bucketer.token_budget)
+        clear_parses(sentences)
+        bucketer.reset_stats()
+        start = time.perf_counter()
+        for index in range(0, len(sentences), bucketer.window):
+            pre.parse_dependencies(pipeline, sentences[index:index + bucketer.window], bucketer)
+        bucketed_time = time.perf_counter() - start
+
+        print(f'  fixed:    {len(sentences) / fixed_time:8.0f} sentences/sec')
+        print(f'  bucketed: {len(sentences) / bucketed_time:8.0f} sentences/sec')
+        print(f'  speedup: {fixed_time / bucketed_time:.2f}x, identical parses: {fixed_parses == get_parses(sentences)}')
@@ -0,0 +1,93 @@
+"""
+Benchmark the asyncio micro-batching front end (see speechact/classifier/microbatch.py) with
+concurrent clients. Each client classifies its share of the sentences of the corpus one at a
+time, as a request-driven service would. The clients are run first with batches of one (a
+max_batch_size of 1), and then with micro-batching. For each, the throughput and the latency of
+the requests (from the call to the result) are reported, with the queueing delays and the batch
+sizes of the batcher.
+
+The model is either a classification model file (.pth) for the SBERT model, or the directory of a
+frozen classifier (see speechact/classifier/frozen.py). The SBERT model can be a stand-in model
+from create_standin_model.py, so that the benchmark runs offline. Without a model file, the
+network is randomly initialized.
+
+Usage: python benchmark_micro_batching.py <corpus> <sbert model> [model] [clients] [max batch size] [max wait ms] [sentences]
+"""
+# Example: python scripts/benchmark_micro_batching.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/embedding-based.pth' 64 32 5 2000
+
+from context import speechact
+import speechact.classifier.microbatch as microbatch
+import speechact.corpus as corp
+import asyncio
+import numpy as np
+import os
+import sys
+import time
+
+
+async def run_clients(batcher: microbatch.MicroBatcher, texts: list[str], clients: int) -> tuple[list[str|None], list[float], float]:
+    """
+    Classify the texts with concurrent clients, and get the speech acts, the latencies and the
+    total time.
+    """
+    speech_acts = [None] * len(texts)  # type: list[str|None]
+    latencies = []
+
+    async def client(first: int):
+        for index in range(first, len(texts), clients):
+            start = time.perf_counter()
+            speech_acts[index] = await batcher.classify(texts[index])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(first) for first in range(clients)])
+    return speech_acts, latencies, time.perf_counter() - start
+
+
+async def main(classifier, texts: list[str], clients: int, max_batch_size: int, max_wait: float):
+    results = {}
+    for name, batch_size in [('batch of one', 1), ('micro-batched', max_batch_size)]:
+        async with microbatch.MicroBatcher(classifier, max_batch_size=batch_size, max_wait=max_wait) as batcher:
+            await batcher.classify(texts[0])  # Warm up.
+            batcher.reset_stats()
+
+            speech_acts, latencies, elapsed = await run_clients(batcher, texts, clients)
+            results[name] = speech_acts
+            latencies = 1000 * np.array(latencies)
+            print(f'{name}: {len(texts) / elapsed:.0f} sentences/sec, latency ms: '
+                  f'p50 {np.percentile(latencies, 50):.1f}, p99 {np.percentile(latencies, 99):.1f}')
+            print(batcher.report())
+            print()
+
+    agreement = np.mean([a == b for a, b in zip(results['batch of one'], results['micro-batched'])])
+    print(f'Agreement: {100 * agreement:.2f}%')
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 8:
+        print('Usage: python benchmark_micro_batching.py <corpus> <sbert model> [model] [clients] [max batch size] [max wait ms] [sentences]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    sbert_model = sys.argv[2]
+    model = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'None' else None
+    clients = int(sys.argv[4]) if len(sys.argv) > 4 else 64
+    max_batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 32
+    max_wait = float(sys.argv[6]) / 1000 if len(sys.argv) > 6 else 0.005
+    sentence_count = int(sys.argv[7]) if len(sys.argv) > 7 else 2000
+
+    texts = [sentence.text for document in corpus.batched_docs(1000) for sentence in document.sentences]
+    texts = texts[:sentence_count]
+
+    if model != None and os.path.isdir(model):
+        import speechact.classifier.frozen as frozen
+        classifier = frozen.FrozenClassifier(model)
+    else:
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model)
+        if model != None:
+            classifier.load(model)
+
+    print(f'{len(texts)} sentences, {clients} clients, max batch size {max_batch_size}, max wait {1000 * max_wait:.1f} ms')
+    asyncio.run(main(classifier, texts, clients, max_batch_size, max_wait))
@@ -0,0 +1,83 @@
+"""
+Benchmark the CPU inference precisions of the embedding classifier (see PRECISIONS in
+speechact/classifier/embedding.py). For each precision, the latency of classifying one sentence
+and the throughput of classifying the corpus are measured, and the speech acts are compared to
+those of the full-precision (float32) classifier. The mean cosine similarity of the embeddings
+to the full-precision embeddings is reported too, since the speech acts of a randomly initialized
+network say little about the embeddings. The embeddings are centered by the mean full-precision
+embedding first, since the embeddings of a random model all point in about the same direction.
+
+The SBERT model can be a stand-in model from create_standin_model.py, so that the benchmark runs
+offline. Without a classification model file, the network is randomly initialized, with the same
+weights for all precisions.
+
+Usage: python benchmark_quantized_inference.py <corpus> <sbert model> [model file] [batch size] [latency sentences]
+"""
+# Example: python scripts/benchmark_quantized_inference.py 'data/test-set.conllu.bz2' 'models/standin' 'None' 32 200
+# Example: python scripts/benchmark_quantized_inference.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/embedding-based.pth'
+
+from context import speechact
+import speechact.classifier.embedding as emb
+import speechact.corpus as corp
+import numpy as np
+import sys
+import time
+import torch
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 6:
+        print('Usage: python benchmark_quantized_inference.py <corpus> <sbert model> [model file] [batch size] [latency sentences]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    model_name = sys.argv[2]
+    model_file = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'None' else None
+    batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else 32
+    latency_sentences = int(sys.argv[5]) if len(sys.argv) > 5 else 200
+
+    print('Loading sentences...')
+    sentences = [sentence for document in corpus.batched_docs(1000) for sentence in document.sentences]
+    print(f'Loaded {len(sentences)} sentences, {torch.get_num_threads()} threads, '
+          f'CPU capability {torch.backends.cpu.get_cpu_capability()}, native bfloat16: {emb.bfloat16_supported()}')
+
+    precisions = ['float32', 'int8', 'bfloat16']
+    network_state = None
+    reference_codes = None
+    reference_embeddings = None
+    texts = [sentence.text for sentence in sentences]
+
+    print(f'{"precision":>10} {"p50 ms":>8} {"p99 ms":>8} {"sentences/sec":>14} {"agreement":>10} {"cosine":>7}')
+    for precision in precisions:
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=model_name, precision=precision)
+        if model_file != None:
+            classifier.load(model_file)
+        elif network_state == None:
+            network_state = classifier.cls_model.state_dict()
+        else:
+            classifier.cls_model.load_state_dict(network_state)
+
+        # Latency of one sentence at a time.
+        classifier.predict_batch(sentences[:batch_size])  # Warm up.
+        latencies = []
+        for sentence in sentences[:latency_sentences]:
+            start = time.perf_counter()
+            classifier.predict_batch([sentence])
+            latencies.append(time.perf_counter() - start)
+
+        # Throughput of the whole corpus.
+        start = time.perf_counter()
+        codes = classifier.predict_batch(sentences, batch_size=batch_size)
+        elapsed = time.perf_counter() - start  # type: ignore
+
+        embeddings = torch.cat([classifier.encode(texts[start:start + batch_size])
+                                for start in range(0, len(texts), batch_size)])
+        if reference_codes is None:
+            reference_codes = codes
+            reference_embeddings = embeddings
+
+        agreement = float(np.mean(codes == reference_codes))
+        mean = reference_embeddings.mean(dim=0)  # type: ignore
+        cosine = float(torch.nn.functional.cosine_similarity(embeddings - mean, reference_embeddings - mean).mean())
+        print(f'{precision:>10} {1000 * np.percentile(latencies, 50):8.2f} {1000 * np.percentile(latencies, 99):8.2f} '
+              f'{len(sentences) / elapsed:14.0f} {100 * agreement:9.2f}% {cosine:7.4f}')
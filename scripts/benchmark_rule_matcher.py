@@ -0,0 +1,80 @@
+"""
+Benchmark the compiled rule matcher of the rule-based classifier against checking each rule in
+turn. The labels of both are compared to make sure they are identical.
+
+Usage: python benchmark_rule_matcher.py <corpus> <ruleset file> [ruleset file ...]
+"""
+# Example: python scripts/benchmark_rule_matcher.py 'data/test-set.conllu.bz2' 'models/rule-based.json' 'models/rules/trainable_rule_classifier_sentiment_large.json'
+
+from context import speechact
+import speechact.classifier.rulebased as rb
+import speechact.corpus as corp
+import sys
+import time
+
+def match_linear(rules: list[rb.Rule], synt_blocks: list[rb.SyntBlock]) -> rb.Rule|None:
+    """
+    Find the first matching rule by checking each rule in turn.
+    """
+    for rule in rules:
+        if rule.is_matching(synt_blocks):
+            return rule
+    return None
+
+
+def benchmark(ruleset_file: str, sentences: list):
+    # Sentiment rulesets need the SENTIMENT block.
+    classifier = rb.RuleBasedClassifier(ruleset_file)
+    if any(rb.SyntBlock.SENTIMENT in rule.synt_blocks for rule in classifier.rules):
+        classifier = rb.TrainableSentimentClassifier(ruleset_file)
+
+    all_blocks = [classifier.to_synt_blocks(sentence) for sentence in sentences]
+    unique_count = len({tuple(blocks) for blocks in all_blocks})
+    print(f'"{ruleset_file}": {classifier.rule_count} rules, {len(all_blocks)} sentences, {unique_count} unique block sequences')
+
+    # Compile the rules.
+    start = time.perf_counter()
+    compiled = classifier.compile_rules()
+    compile_time = time.perf_counter() - start
+    print(f'  compile:  {classifier.rule_count / compile_time:12.0f} rules/sec')
+
+    # Check each rule in turn.
+    start = time.perf_counter()
+    linear_rules = [match_linear(classifier.rules, blocks) for blocks in all_blocks]
+    linear_time = time.perf_counter() - start
+    print(f'  linear:   {len(all_blocks) / linear_time:12.0f} sentences/sec')
+
+    # Compiled matcher without cache.
+    compiled.cache_size = 0
+    start = time.perf_counter()
+    uncached_rules = [compiled.find_rule(blocks) for blocks in all_blocks]
+    uncached_time = time.perf_counter() - start
+    print(f'  compiled: {len(all_blocks) / uncached_time:12.0f} sentences/sec (no cache, {linear_time / uncached_time:.1f}x)')
+
+    # Compiled matcher with cache.
+    compiled.cache_size = 100_000
+    start = time.perf_counter()
+    cached_rules = [compiled.find_rule(blocks) for blocks in all_blocks]
+    cached_time = time.perf_counter() - start
+    print(f'  compiled: {len(all_blocks) / cached_time:12.0f} sentences/sec (cached, {linear_time / cached_time:.1f}x)')
+
+    # Compare the labels.
+    mismatches = 0
+    for linear, uncached, cached in zip(linear_rules, uncached_rules, cached_rules):
+        if not (linear is uncached is cached):
+            mismatches += 1
+    print(f'  identical labels: {mismatches == 0} ({mismatches} mismatches)')
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3:
+        print('Usage: python benchmark_rule_matcher.py <corpus> <ruleset file> [ruleset file ...]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    print('Loading sentences...')
+    sentences = list(corpus.stanza_sentences())
+
+    for ruleset_file in sys.argv[2:]:
+        benchmark(ruleset_file, sentences)
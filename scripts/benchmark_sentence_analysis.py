@@ -0,0 +1,161 @@
+"""
+Benchmark the single-pass sentence analysis of the algorithmic classifiers against computing
+each feature with its own scan over the words of the sentence. The features of both are
+compared to make sure they are identical.
+
+Usage: python benchmark_sentence_analysis.py <corpus> [repeats]
+"""
+# Example: python scripts/benchmark_sentence_analysis.py 'data/test-set.conllu.bz2' 5
+
+from context import speechact
+import speechact.classifier.algorithmic as alg
+import speechact.corpus as corp
+import stanza.models.common.doc as doc
+import sys
+import time
+
+# The features as they were computed before the sentence analysis, where every call scans the
+# words of the sentence again.
+
+def scan_head(sentence: doc.Sentence) -> doc.Word:
+    for word in sentence.words:
+        if word.head == 0:
+            return word
+    raise ValueError('Sentence lacks a head.')
+
+
+def scan_finite_verb(sentence: doc.Sentence) -> doc.Word|None:
+    head = scan_head(sentence)
+    if head.pos != 'VERB' or head.feats == None or 'VerbForm=Fin' not in head.feats:
+        return None
+    return head
+
+
+def scan_subject(sentence: doc.Sentence) -> doc.Word|None:
+    finite_verb = scan_finite_verb(sentence)
+    if finite_verb == None:
+        return None
+    for word in sentence.words:
+        if word.head == finite_verb.id and word.deprel in alg.SUBJECT_RELS:
+            return word
+    return None
+
+
+def scan_clause_base(sentence: doc.Sentence) -> list[doc.Word]:
+    finite_verb = scan_finite_verb(sentence)
+    if finite_verb is None:
+        raise ValueError('Sentence does not have a finite verb')
+    return [word for word in sentence.words if word.id < finite_verb.id]
+
+
+def scan_is_FA_clause(sentence: doc.Sentence) -> bool:
+    finite_verb = scan_finite_verb(sentence)
+    if finite_verb is None:
+        return False
+    subject = scan_subject(sentence)
+    if subject == None or subject.id > finite_verb.id:
+        return True
+    return subject in scan_clause_base(sentence)
+
+
+def scan_is_AF_clause(sentence: doc.Sentence) -> bool:
+    finite_verb = scan_finite_verb(sentence)
+    if finite_verb is None:
+        return False
+    subject = scan_subject(sentence)
+    if subject == None or subject.id > finite_verb.id:
+        return False
+    return subject not in scan_clause_base(sentence)
+
+
+def scan_starts_with(sentence: doc.Sentence, word: str, pos: str|None = None) -> bool:
+    first_word = sentence.words[0]
+    return first_word.text.lower() == word and (pos is None or first_word.pos == pos)
+
+
+def scan_clause_type(sentence: doc.Sentence) -> alg.ClauseType:
+    if scan_is_AF_clause(sentence):
+        clause_base = scan_clause_base(sentence)
+        if len(clause_base) > 0 and clause_base[0].text.lower() in ('vad', 'så'):
+            return alg.ClauseType.EXPRESSIVE
+        elif scan_starts_with(sentence, 'att', 'SCONJ') or scan_starts_with(sentence, 'så', 'SCONJ'):
+            return alg.ClauseType.EXPRESSIVE
+        elif scan_starts_with(sentence, 'bara'):
+            return alg.ClauseType.DESIDERATIVE
+        elif scan_starts_with(sentence, 'om') or alg.starts_with(sentence, ['tänk', 'om']):
+            return alg.ClauseType.SUPPOSITIVE
+    elif scan_is_FA_clause(sentence):
+        if len(scan_clause_base(sentence)) > 0:
+            first_word_text = sentence.words[0].text.lower()
+            if first_word_text in alg.INTERROGATIVE_ADVERBS or first_word_text in alg.INTERROGATIVE_PRONOUNS:
+                return alg.ClauseType.QUESITIVE
+            return alg.ClauseType.DECLARATIVE
+        finite_verb = scan_finite_verb(sentence)
+        if finite_verb != None and finite_verb.id == 1:
+            if scan_subject(sentence) != None:
+                return alg.ClauseType.ROGATIVE
+            return alg.ClauseType.DIRECTIVE
+        return alg.ClauseType.DESIDERATIVE
+    return alg.ClauseType.NONE
+
+
+def scan_features(sentence: doc.Sentence) -> tuple:
+    last_char = sentence.words[-1].text[-1]
+    return scan_clause_type(sentence), last_char, scan_head(sentence).pos == 'NOUN'
+
+
+def analysis_features(sentence: doc.Sentence) -> tuple:
+    return alg.get_clause_type(sentence), alg.get_punctation(sentence), alg.is_sentence_np(sentence)
+
+
+def clear_analyses(sentences: list[doc.Sentence]):
+    for sentence in sentences:
+        if hasattr(sentence, '_sentence_analysis'):
+            del sentence._sentence_analysis  # type: ignore
+
+
+def measure(name: str, func, sentences: list[doc.Sentence], repeats: int) -> tuple[list, float]:
+    """
+    Time the function on each sentence, without any memoized analyses, and print the speed.
+    """
+    results = []
+    best_time = float('inf')
+    for _ in range(repeats):
+        clear_analyses(sentences)
+        start = time.perf_counter()
+        results = [func(sentence) for sentence in sentences]
+        best_time = min(best_time, time.perf_counter() - start)
+
+    print(f'{name:>26}: {len(sentences) / best_time:10.0f} sentences/sec')
+    return results, best_time
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) != 2 and len(sys.argv) != 3:
+        print('Usage: python benchmark_sentence_analysis.py <corpus> [repeats]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print('Loading sentences...')
+    sentences = [sentence for sentence in corpus.stanza_sentences() if len(sentence.words) > 0]
+    print(f'Loaded {len(sentences)} sentences.')
+
+    # Compare the features.
+    scanned, scan_time = measure('features (scan per feature)', scan_features, sentences, repeats)
+    analyzed, analysis_time = measure('features (analysis)', analysis_features, sentences, repeats)
+    mismatches = sum(1 for (clause_type, last_char, is_np), (analyzed_type, punctuation, analyzed_np)
+                     in zip(scanned, analyzed)
+                     if clause_type != analyzed_type or is_np != analyzed_np
+                     or alg.Punctuation(last_char if last_char in '.!?' else 'none') != punctuation)
+    print(f'Speedup: {scan_time / analysis_time:.1f}x, identical features: {mismatches == 0} ({mismatches} mismatches)')
+
+    # Time the classifiers.
+    for classifier in [alg.PunctuationClassifier(), alg.ClauseClassifier(), alg.RuleBasedClassifier()]:
+        measure(type(classifier).__name__, classifier.classify_sentence, sentences, repeats)
+
+    # The link and date detectors are used by the rule-based classifier.
+    print(f'Detectors ({repeats} repeats):')
+    print(alg.report_detectors())
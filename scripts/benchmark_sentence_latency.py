@@ -0,0 +1,103 @@
+"""
+Benchmark the latency of classifying single sentences with the embedding classifier, and check
+it against latency targets. Three paths are measured, one sentence at a time:
+    encode: the previous single-sentence path, which sets the network to evaluation mode and
+        embeds the sentence with SentenceTransformer.encode() on every call.
+    batch of one: predict_batch() with one sentence.
+    sentence: predict_sentence(), the latency-optimized single-sentence path.
+
+The time to load the classifier (including its warm-up) and the latency of its first call are
+reported too. If the p50 and p99 targets (in milliseconds) are given, the sentence path is
+checked against them, and the script exits with an error if it misses a target, so that it can
+be run as a check.
+
+The SBERT model can be a stand-in model from create_standin_model.py, so that the benchmark runs
+offline. Without a model file, the network is randomly initialized.
+
+Usage: python benchmark_sentence_latency.py <corpus> <sbert model> [model file] [sentences] [p50 target ms] [p99 target ms] [precision]
+"""
+# Example: python scripts/benchmark_sentence_latency.py 'data/test-set.conllu.bz2' 'models/standin' 'None' 500 5 10
+# Example: python scripts/benchmark_sentence_latency.py 'data/test-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/embedding-based.pth' 500
+
+from context import speechact
+import speechact.classifier.embedding as emb
+import speechact.corpus as corp
+import numpy as np
+import sys
+import time
+import torch
+
+
+def encode_path(classifier: emb.EmbeddingClassifier, text: str) -> str:
+    """
+    Classify a sentence the way that get_speech_act_for() did before the single-sentence path.
+    """
+    classifier.cls_model.eval()
+    embedding = classifier.encode([text])[0]
+    with torch.no_grad():
+        output = classifier.cls_model.forward(embedding)
+    return emb.SPEECH_ACTS[torch.argmax(output)]
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 8:
+        print('Usage: python benchmark_sentence_latency.py <corpus> <sbert model> [model file] [sentences] [p50 target ms] [p99 target ms] [precision]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    model_name = sys.argv[2]
+    model_file = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'None' else None
+    sentence_count = int(sys.argv[4]) if len(sys.argv) > 4 else 500
+    p50_target = float(sys.argv[5]) if len(sys.argv) > 5 else None
+    p99_target = float(sys.argv[6]) if len(sys.argv) > 6 else None
+    precision = sys.argv[7] if len(sys.argv) > 7 else 'float32'
+
+    sentences = [sentence for document in corpus.batched_docs(1000) for sentence in document.sentences]
+    sentences = sentences[:sentence_count]
+
+    start = time.perf_counter()
+    classifier = emb.EmbeddingClassifier(device='cpu', model_name=model_name, precision=precision)
+    if model_file != None:
+        classifier.load(model_file)
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classifier.predict_sentence(sentences[0])
+    first_call = time.perf_counter() - start
+    print(f'{len(sentences)} sentences, {torch.get_num_threads()} threads, precision {precision}, '
+          f'load with warm-up {load_time:.2f} s, first call {1000 * first_call:.2f} ms')
+
+    paths = {
+        'encode': lambda sentence: encode_path(classifier, sentence.text),
+        'batch of one': lambda sentence: classifier.predict_batch([sentence]),
+        'sentence': lambda sentence: classifier.predict_sentence(sentence)
+    }
+
+    print(f'{"path":>12} {"p50 ms":>8} {"p99 ms":>8} {"mean ms":>8}')
+    latencies = {}
+    for name, classify in paths.items():
+        path_latencies = []
+        for sentence in sentences:
+            start = time.perf_counter()
+            classify(sentence)
+            path_latencies.append(1000 * (time.perf_counter() - start))
+        latencies[name] = path_latencies
+        print(f'{name:>12} {np.percentile(path_latencies, 50):8.2f} {np.percentile(path_latencies, 99):8.2f} '
+              f'{np.mean(path_latencies):8.2f}')
+
+    agreement = np.mean([encode_path(classifier, sentence.text) == classifier.predict_sentence(sentence)
+                         for sentence in sentences])
+    print(f'Agreement of the sentence and encode paths: {100 * agreement:.2f}%')
+
+    # Check the targets.
+    missed = False
+    for percentile, target in [(50, p50_target), (99, p99_target)]:
+        if target != None:
+            latency = np.percentile(latencies['sentence'], percentile)
+            passed = latency <= target
+            missed = missed or not passed
+            print(f'p{percentile} {latency:.2f} ms, target {target:.2f} ms: {"passed" if passed else "MISSED"}')
+
+    if missed:
+        sys.exit(1)
@@ -0,0 +1,100 @@
+"""
+Benchmark the vectorized clause and punctuation classifiers, which classify all the sentences of
+a document at once from its column arrays, against classifying one stanza Sentence at a time.
+The speech acts of both are compared to make sure they are identical, and so are those of
+classify_sentences(), which uses the vectorized path for CoNLL-U sentences (see
+Classifier.predict_lines()). The script exits with an error if they differ, so that it can be run
+as a check.
+
+Both the end-to-end time from CoNLL-U lines to speech acts and the time of the classification
+alone are measured. The stanza path parses the lines as a stanza Document, while the vectorized
+path encodes the lines directly as column arrays.
+
+Usage: python benchmark_vectorized_classifier.py <corpus> [batch size] [repeats]
+"""
+# Example: python scripts/benchmark_vectorized_classifier.py 'data/test-set.conllu.bz2' 5000 5
+
+from context import speechact
+import speechact.classifier.algorithmic as alg
+import speechact.classifier.docarrays as docarrays
+import speechact.corpus as corp
+import speechact.preprocess as pre
+import sys
+import time
+
+def measure(func, repeats: int) -> tuple[list, float]:
+    """
+    Get the results and the best time of the function.
+    """
+    results = []
+    best_time = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        results = func()
+        best_time = min(best_time, time.perf_counter() - start)
+    return results, best_time
+
+
+def classify_sentences(classifier, documents) -> list[str]:
+    speech_acts = []
+    for document in documents:
+        for sentence in document.sentences:
+            if hasattr(sentence, '_sentence_analysis'):
+                del sentence._sentence_analysis
+            classifier.classify_sentence(sentence)
+            speech_acts.append(sentence.speech_act)
+    return speech_acts
+
+
+def classify_arrays(classifier, all_arrays) -> list[str]:
+    return [str(speech_act) for arrays in all_arrays for speech_act in classifier.get_speech_acts(arrays)]
+
+
+def classify_corpus(classifier, corpus: corp.Corpus) -> list[str|None]:
+    return [speech_act for _, speech_act in classifier.classify_sentences(corpus.sentences())]
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        print('Usage: python benchmark_vectorized_classifier.py <corpus> [batch size] [repeats]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    print('Loading lines...')
+    batches = list(corpus.batched_lines(batch_size))
+
+    documents, parse_time = measure(lambda: [pre.parse_doc(lines) for lines in batches], repeats)
+    all_arrays, encode_time = measure(lambda: [docarrays.DocumentArrays.from_lines(lines) for lines in batches], repeats)
+    sentence_count = sum(arrays.sentence_count for arrays in all_arrays)
+    print(f'Loaded {sentence_count} sentences in {len(batches)} documents.')
+    print(f'  parse as stanza documents: {parse_time:.3f} s')
+    print(f'  encode as column arrays:   {encode_time:.3f} s')
+
+    failed = False
+    for classifier in [alg.PunctuationClassifier(), alg.ClauseClassifier()]:
+        sentence_speech_acts, sentence_time = measure(lambda: classify_sentences(classifier, documents), repeats)
+        array_speech_acts, array_time = measure(lambda: classify_arrays(classifier, all_arrays), repeats)
+
+        print(f'{type(classifier).__name__}:')
+        print(f'  per sentence: {sentence_count / sentence_time:10.0f} sentences/sec, '
+              f'{sentence_count / (parse_time + sentence_time):10.0f} sentences/sec from lines')
+        print(f'  vectorized:   {sentence_count / array_time:10.0f} sentences/sec, '
+              f'{sentence_count / (encode_time + array_time):10.0f} sentences/sec from lines')
+        print(f'  speedup: {sentence_time / array_time:.1f}x, '
+              f'{(parse_time + sentence_time) / (encode_time + array_time):.1f}x from lines')
+
+        mismatches = sum(1 for a, b in zip(sentence_speech_acts, array_speech_acts) if a != b)
+        print(f'  identical speech acts: {mismatches == 0} ({mismatches} mismatches)')
+
+        corpus_speech_acts, corpus_time = measure(lambda: classify_corpus(classifier, corpus), 1)
+        corpus_mismatches = sum(1 for a, b in zip(sentence_speech_acts, corpus_speech_acts) if a != b)
+        print(f'  classify_sentences(): {sentence_count / corpus_time:10.0f} sentences/sec from the corpus file, '
+              f'identical speech acts: {corpus_mismatches == 0} ({corpus_mismatches} mismatches)')
+        failed = failed or mismatches > 0 or corpus_mismatches > 0 or len(corpus_speech_acts) != sentence_count
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,75 @@
+"""
+Check that several writers of the same embedding store directory (see
+speechact/classifier/embstore.py) get the right embeddings. Each writer is a process that encodes
+overlapping batches of texts, with an encode function that gives each text a vector of its own,
+and the vectors that the store returns are compared with the vectors of the texts. A store that is
+opened after the writers are done must also return them. The script exits with an error if an
+embedding is wrong, so that it can be run as a check.
+
+Usage: python check_embedding_store.py [writers] [batches] [batch size]
+"""
+# Example: python scripts/check_embedding_store.py 4 20 50
+
+from context import speechact
+import speechact.classifier.embstore as embstore
+import multiprocessing as mp
+import numpy as np
+import sys
+import tempfile
+
+DIMENSION = 8
+TEXT_COUNT = 500
+
+
+def text_vector(text: str) -> np.ndarray:
+    """
+    The vector of a text, which is its number in every dimension.
+    """
+    return np.full(DIMENSION, int(text.split()[1]), dtype=np.float32)
+
+
+def encode(texts: list[str]) -> np.ndarray:
+    return np.stack([text_vector(text) for text in texts])
+
+
+def write(directory: str, seed: int, batches: int, batch_size: int) -> int:
+    """
+    Encode random batches of texts with a store of the directory, and count the wrong
+    embeddings.
+    """
+    store = embstore.EmbeddingStore(directory, 'check', DIMENSION)
+    random = np.random.default_rng(seed)
+    wrong = 0
+    for _ in range(batches):
+        texts = [f'text {number}' for number in random.integers(0, TEXT_COUNT, batch_size)]
+        wrong += int((store.encode(texts, encode) != encode(texts)).any(axis=1).sum())
+    return wrong
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) > 4:
+        print('Usage: python check_embedding_store.py [writers] [batches] [batch size]')
+        sys.exit(1)
+
+    writers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    batches = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    with tempfile.TemporaryDirectory() as directory:
+        with mp.Pool(writers) as pool:
+            wrong_counts = pool.starmap(write, [(directory, seed, batches, batch_size) for seed in range(writers)])
+
+        store = embstore.EmbeddingStore(directory, 'check', DIMENSION)
+        texts = [f'text {number}' for number in range(TEXT_COUNT)]
+        stored = store.encode(texts, encode)
+        reopened_wrong = int((stored != encode(texts)).any(axis=1).sum())
+        rows = len(store)
+
+    print(f'{writers} writers: {sum(wrong_counts)} wrong embeddings ({wrong_counts})')
+    print(f'Reopened store: {rows} rows, {reopened_wrong} wrong embeddings')
+    passed = sum(wrong_counts) == 0 and reopened_wrong == 0 and rows == TEXT_COUNT
+    print('passed' if passed else 'FAILED')
+
+    if not passed:
+        sys.exit(1)
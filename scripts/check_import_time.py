@@ -0,0 +1,97 @@
+"""
+Check the import time of the modules of the rule-based tagging path against a budget. The heavy
+dependencies (stanza, torch, transformers, sklearn, pandas) take seconds to import, so the
+speechact modules only import them when they are first used. This script guards against a
+top-level import of one of them sneaking back in.
+
+The modules are imported in a fresh interpreter with 'python -X importtime', a few times, and the
+median of the total import time is compared with the budget (in milliseconds). The import time
+of each module is listed, and the heavy dependencies that were imported are reported. The script exits
+with an error if the budget is exceeded or a heavy dependency is imported, so that it can be run
+as a check.
+
+The modules default to the ones that tag_speech_acts_rulebased.py imports before it classifies.
+
+Usage: python check_import_time.py [budget ms] [runs] [modules]
+"""
+# Example: python scripts/check_import_time.py 500
+# Example: python scripts/check_import_time.py 2500 5 'speechact.classifier.embedding'
+
+from context import speechact
+import numpy as np
+import os
+import subprocess
+import sys
+
+RULE_BASED_MODULES = [
+    'speechact.client',
+    'speechact.corpus',
+    'speechact.conllu',
+    'speechact.preprocess',
+    'speechact.classifier.features',
+    'speechact.classifier.rulebased'
+]
+"""The modules of the rule-based tagging path."""
+
+HEAVY_MODULES = ['stanza', 'torch', 'transformers', 'sentence_transformers', 'sklearn', 'pandas']
+"""The dependencies that must not be imported by the modules."""
+
+
+def import_times(modules: list[str]) -> dict[str, tuple[int, int, int]]:
+    """
+    Import the modules in a new interpreter, and get the self and cumulative import time (in
+    microseconds) and the nesting level of each imported module.
+    """
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+                             cwd=root, capture_output=True, text=True)
+    assert process.returncode == 0, f'Failed to import {modules}:\n{process.stderr}'
+
+    times = {}
+    for line in process.stderr.splitlines():
+        # E.g. 'import time:       250 |        630 |   speechact.corpus'
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times[name.strip()] = (int(self_time), int(cumulative), level)
+    return times
+
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) > 4:
+        print('Usage: python check_import_time.py [budget ms] [runs] [modules]')
+        sys.exit(1)
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 500
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    modules = sys.argv[3].split(',') if len(sys.argv) > 3 else RULE_BASED_MODULES
+
+    # The imports of the interpreter startup (e.g. site) are not counted, only the top-level
+    # imports of the modules and their packages.
+    packages = {module.split('.')[0] for module in modules}
+    def is_counted(name: str, level: int) -> bool:
+        return level == 0 and name.split('.')[0] in packages
+
+    # The first import compiles the modules that are not cached, so it is not counted.
+    import_times(modules)
+    totals = []
+    for _ in range(runs):
+        times = import_times(modules)
+        totals.append(sum(cumulative for name, (_, cumulative, level) in times.items() if is_counted(name, level)) / 1000)
+    total = float(np.median(totals))
+
+    print(f'Imported {", ".join(modules)}')
+    print('Import time of each module (last run):')
+    counted = [(cumulative, name) for name, (_, cumulative, level) in times.items() if is_counted(name, level)]
+    for cumulative, name in sorted(counted, reverse=True):
+        print(f'    {cumulative / 1000:8.1f} ms  {name}')
+
+    heavy = [module for module in HEAVY_MODULES if module in times]
+    passed = total <= budget and len(heavy) == 0
+    print(f'Heavy dependencies imported: {", ".join(heavy) if len(heavy) > 0 else "none"}')
+    print(f'Import time {total:.1f} ms (median of {runs} runs), budget {budget:.1f} ms: {"passed" if passed else "FAILED"}')
+
+    if not passed:
+        sys.exit(1)
@@ -0,0 +1,71 @@
+"""
+Check that the streaming tagger (see speechact/classifier/streaming.py) tags a corpus with
+several tokenizer threads exactly as predict_batch() classifies it. The corpus is tagged a few
+times with small windows and batches, so that the tokenizer threads often run at the same time.
+The script exits with an error if a tagging fails or differs, so that it can be run as a check.
+
+The model is either a classification model file (.pth) for the SBERT model, or the directory of a
+frozen classifier. The SBERT model can be a stand-in model from create_standin_model.py, so that
+the check runs offline. Without a model file, the network is randomly initialized.
+
+Usage: python check_streaming_tagger.py <corpus> <sbert model> [model] [tokenizer threads] [runs] [window] [token budget]
+"""
+# Example: python scripts/check_streaming_tagger.py 'data/dev-set.conllu.bz2' 'models/standin' 'None' 2
+# Example: python scripts/check_streaming_tagger.py 'data/dev-set.conllu.bz2' 'KBLab/sentence-bert-swedish-cased' 'models/frozen' 4
+
+from context import speechact
+import speechact.batching as batching
+import speechact.classifier.base as base
+import speechact.classifier.streaming as streaming
+import speechact.corpus as corp
+import os
+import sys
+import tempfile
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 8:
+        print('Usage: python check_streaming_tagger.py <corpus> <sbert model> [model] [tokenizer threads] [runs] [window] [token budget]')
+        sys.exit(1)
+
+    corpus_file = sys.argv[1]
+    sbert_model = sys.argv[2]
+    model = sys.argv[3] if len(sys.argv) > 3 and sys.argv[3] != 'None' else None
+    tokenizer_threads = int(sys.argv[4]) if len(sys.argv) > 4 else 2
+    runs = int(sys.argv[5]) if len(sys.argv) > 5 else 3
+    window = int(sys.argv[6]) if len(sys.argv) > 6 else 20
+    token_budget = int(sys.argv[7]) if len(sys.argv) > 7 else 300
+
+    if model != None and os.path.isdir(model):
+        import speechact.classifier.frozen as frozen
+        classifier = frozen.FrozenClassifier(model)
+    else:
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model)
+        if model != None:
+            classifier.load(model)
+
+    sentences = [sentence for document in corp.Corpus(corpus_file).batched_docs(1000) for sentence in document.sentences]
+    expected = base.to_labels(classifier.predict_batch(sentences))  # type: ignore
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        target_file = os.path.join(directory, 'tagged.conllu')
+        for run in range(runs):
+            bucketer = batching.LengthBucketer(token_budget=token_budget, window=window)
+            tagger = streaming.StreamingTagger(classifier, bucketer, tokenizer_threads=tokenizer_threads, log_interval=None)
+            try:
+                streaming.tag_file(tagger, corpus_file, target_file, format=streaming.CONLLU)
+            except Exception as error:
+                print(f'Run {run + 1}: FAILED with {type(error).__name__}: {error}')
+                failed = True
+                continue
+
+            speech_acts = [record.source.try_get_meta_date('speech_act') for record in streaming.read_records(target_file)]
+            differences = sum(a != b for a, b in zip(speech_acts, expected)) + abs(len(speech_acts) - len(expected))
+            failed = failed or differences > 0
+            print(f'Run {run + 1}: {len(speech_acts)} sentences, {differences} differ from predict_batch(): '
+                  f'{"passed" if differences == 0 else "FAILED"}. {tagger.report()}')
+
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,44 @@
+"""
+Compute the signatures of all the sentences in a CoNLL-U corpus, and save them to a .npz file.
+Rule sets can then be evaluated on the signatures with evaluation.evaluate_signatures, which
+only classifies each unique signature once.
+
+The classifier type decides what the signatures consist of:
+  rule: the synt-blocks (RuleBasedClassifier and TrainableClassifier).
+  sentiment: the synt-blocks with the SENTIMENT block (TrainableSentimentClassifier).
+  sentiment2: the synt-blocks and the sentiment override (TrainableSentimentClassifierV2).
+
+Usage: python compute_signatures.py <corpus> <classifier type> <target file> [jobs]
+"""
+# Example: python scripts/compute_signatures.py 'data/test-set.conllu.bz2' sentiment2 'data/test-set-signatures.npz' 4
+
+from context import speechact
+import speechact.classifier.rulebased as rb
+import speechact.classifier.signatures as sig
+import speechact.corpus as corp
+import sys
+import time
+
+CLASSIFIER_TYPES = {
+    'rule': rb.TrainableClassifier,
+    'sentiment': rb.TrainableSentimentClassifier,
+    'sentiment2': rb.TrainableSentimentClassifierV2
+}
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) != 4 and len(sys.argv) != 5:
+        print('Usage: python compute_signatures.py <corpus> <classifier type> <target file> [jobs]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    classifier = CLASSIFIER_TYPES[sys.argv[2]]()
+    target_file = sys.argv[3]
+    jobs = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+
+    start = time.perf_counter()
+    signature_corpus = sig.SignatureCorpus.compute(corpus, classifier, jobs=jobs, print_progress=True)
+    signature_corpus.save(target_file)
+
+    print(f'Computed {signature_corpus.sentence_count} signatures ({len(signature_corpus.signatures)} unique) in {time.perf_counter() - start:.1f} s.')
+    print(f'Saved signatures to "{target_file}".')
@@ -0,0 +1,66 @@
+"""
+Create a small, randomly initialized SBERT model that can stand in for the real embedding model
+(KBLab/sentence-bert-swedish-cased) in benchmarks, so that they can run offline. It has the same
+architecture as the real model (a BERT encoder with mean pooling), but fewer and smaller layers.
+The vocabulary is the most frequent words of a corpus, so the sentences are tokenized into
+realistic numbers of tokens. The embeddings are random, so only use it for measuring speed and
+agreement, not accuracy.
+
+Usage: python create_standin_model.py <corpus> <target directory> [hidden size] [layers] [vocabulary size]
+"""
+# Example: python scripts/create_standin_model.py 'data/dev-set.conllu.bz2' 'models/standin' 256 4 20000
+
+from context import speechact
+import speechact.corpus as corp
+import collections as col
+import os
+import sentence_transformers as stf
+import sentence_transformers.models as stm
+import sys
+import torch
+import transformers as trf
+
+SPECIAL_TOKENS = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+MAX_SEQ_LENGTH = 128
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 6:
+        print('Usage: python create_standin_model.py <corpus> <target directory> [hidden size] [layers] [vocabulary size]')
+        sys.exit(1)
+
+    corpus = corp.Corpus(sys.argv[1])
+    target_dir = sys.argv[2]
+    hidden_size = int(sys.argv[3]) if len(sys.argv) > 3 else 256
+    layers = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+    vocabulary_size = int(sys.argv[5]) if len(sys.argv) > 5 else 20000
+
+    torch.manual_seed(0)
+
+    print('Counting words...')
+    word_counts = col.Counter(word.text for document in corpus.batched_docs(1000)
+                              for sentence in document.sentences for word in sentence.words)
+    vocabulary = SPECIAL_TOKENS + [word for word, _ in word_counts.most_common(vocabulary_size - len(SPECIAL_TOKENS))]
+
+    # Create the encoder and its tokenizer.
+    encoder_dir = os.path.join(target_dir, 'encoder')
+    os.makedirs(encoder_dir, exist_ok=True)
+    vocabulary_file = os.path.join(encoder_dir, 'vocab.txt')
+    with open(vocabulary_file, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(vocabulary) + '\n')
+
+    config = trf.BertConfig(vocab_size=len(vocabulary),
+                            hidden_size=hidden_size,
+                            num_hidden_layers=layers,
+                            num_attention_heads=max(1, hidden_size // 64),
+                            intermediate_size=4 * hidden_size,
+                            max_position_embeddings=MAX_SEQ_LENGTH)
+    trf.BertModel(config).save_pretrained(encoder_dir)
+    trf.BertTokenizerFast(vocab_file=vocabulary_file, do_lower_case=False).save_pretrained(encoder_dir)
+
+    # Wrap the encoder as an SBERT model with mean pooling.
+    transformer = stm.Transformer(encoder_dir, max_seq_length=MAX_SEQ_LENGTH)
+    pooling = stm.Pooling(transformer.get_word_embedding_dimension(), 'mean')
+    stf.SentenceTransformer(modules=[transformer, pooling]).save(target_dir)
+
+    print(f'Created a stand-in model with {len(vocabulary)} words, hidden size {hidden_size} and {layers} layers in "{target_dir}"')
@@ -0,0 +1,76 @@
+"""
+Evaluate a cascade of a punctuation classifier (for questions only), a trained rule-based
+classifier and the embedding classifier. The sentences that the cheap classifiers are not
+confident about are forwarded to the embedding classifier.
+
+The accuracy/throughput trade-off is reported for a range of confidence thresholds, and the
+cascade is then run with the given threshold.
+
+The rule-based classifier (TrainableSentimentClassifierV2) is trained on the train corpus, since
+the confidence of a rule comes from its training counts. The corpora need to be tagged with
+sentiment labels.
+
+Usage: python evaluate_cascade.py <test corpus> <rule train corpus> <embedding model file> [device] [threshold]
+"""
+# Example: python scripts/evaluate_cascade.py 'data/test-set.conllu.bz2' 'data/dev-set.conllu.bz2' 'models/embedding-based.pth' cpu 0.9
+
+from context import speechact
+import speechact.annotate as anno
+import speechact.classifier.algorithmic as alg
+import speechact.classifier.base as base
+import speechact.classifier.cascade as cascade
+import speechact.classifier.embedding as emb
+import speechact.classifier.rulebased as rb
+import speechact.corpus as corp
+import numpy as np
+import sys
+import time
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99, 1.0]
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 4 or len(sys.argv) > 6:
+        print('Usage: python evaluate_cascade.py <test corpus> <rule train corpus> <embedding model file> [device] [threshold]')
+        sys.exit(1)
+
+    test_corpus = corp.Corpus(sys.argv[1])
+    train_corpus = corp.Corpus(sys.argv[2])
+    model_file = sys.argv[3]
+    device = sys.argv[4] if len(sys.argv) > 4 else 'cpu'
+    threshold = float(sys.argv[5]) if len(sys.argv) > 5 else 0.9
+
+    print('Loading sentences...')
+    sentences = [sentence for document in test_corpus.batched_docs(1000) for sentence in document.sentences]
+    correct_codes = base.to_codes(sentence.speech_act for sentence in sentences)  # type: ignore
+    print(f'Loaded {len(sentences)} sentences.')
+
+    print('Training rules...')
+    rule_classifier = rb.TrainableSentimentClassifierV2()
+    rule_classifier.train(train_corpus)
+
+    embedding_classifier = emb.EmbeddingClassifier(device=device)
+    embedding_classifier.load(model_file)
+
+    classifier = cascade.CascadeClassifier([
+        cascade.Stage(alg.PunctuationClassifier(), labels=[anno.SpeechActLabels.QUESTION], name='punctuation (questions)'),
+        cascade.Stage(rule_classifier, name='rules')
+    ], fallback=embedding_classifier)
+
+    # Report the trade-off. An infinite threshold forwards all sentences to the fallback.
+    print('Evaluating thresholds...')
+    print(f'{"threshold":>14} {"accuracy":>9} {"forwarded":>10} {"sentences/sec":>14}')
+    for evaluation in classifier.evaluate_thresholds(sentences, correct_codes, THRESHOLDS + [float('inf')]):
+        name = f'{evaluation["threshold"]:.2f}' if evaluation['threshold'] != float('inf') else 'fallback only'
+        print(f'{name:>14} {evaluation["accuracy"]:9.4f} {100 * evaluation["forwarded"]:9.1f}% {evaluation["throughput"]:14.0f}')
+
+    # Run the cascade with the threshold.
+    print(f'Running the cascade with threshold {threshold}...')
+    classifier.set_thresholds(threshold)
+    classifier.reset_stats()
+    start = time.perf_counter()
+    predicted_codes = classifier.predict_batch(sentences)
+    elapsed = time.perf_counter() - start
+
+    print(f'Accuracy: {np.mean(predicted_codes == correct_codes):.4f}, {len(sentences) / elapsed:.0f} sentences/sec')
+    print(classifier.report())
@@ -0,0 +1,53 @@
+"""
+This script runs a classification daemon, which keeps a classifier loaded and classifies
+sentences for other processes (see speechact/daemon.py). The scripts that can offload their
+classification to it take the address of the daemon as an argument.
+
+The classifier type is one of rulebased, embedding or frozen, and the model is the rule set file,
+the classification model file, or the directory of the frozen classifier. The address is either
+'host:port' for localhost HTTP, or the path of a Unix socket. The embedding classifier also takes
+the SBERT model (a name or a local path, e.g. a stand-in model) and its precision (float32, int8,
+bfloat16 or auto).
+
+The daemon runs until it is interrupted (Ctrl+C).
+
+Usage: python run_classification_daemon.py <classifier type> [model] [address] [device] [chunk size] [sbert model] [precision]
+"""
+# Example: python scripts/run_classification_daemon.py rulebased 'models/rule-based.json' 'localhost:8765' cpu
+# Example: python scripts/run_classification_daemon.py frozen 'models/frozen' '/tmp/speechact.sock'
+# Example: python scripts/run_classification_daemon.py embedding 'models/embedding-based.pth' 'localhost:8765' cpu 256 'None' int8
+
+from context import speechact
+import speechact.client as client
+import speechact.daemon as daemon
+import sys
+import time
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 2 or len(sys.argv) > 8:
+        print('Usage: python run_classification_daemon.py <classifier type> [model] [address] [device] [chunk size] [sbert model] [precision]')
+        sys.exit(1)
+
+    classifier_type = sys.argv[1]
+    model = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != 'None' else None
+    address = sys.argv[3] if len(sys.argv) > 3 else client.DEFAULT_ADDRESS
+    device = sys.argv[4] if len(sys.argv) > 4 else 'cpu'
+    chunk_size = int(sys.argv[5]) if len(sys.argv) > 5 else 256
+    model_name = sys.argv[6] if len(sys.argv) > 6 and sys.argv[6] != 'None' else None
+    precision = sys.argv[7] if len(sys.argv) > 7 else 'float32'
+
+    if classifier_type not in daemon.CLASSIFIER_TYPES:
+        print(f'Unknown classifier type: {classifier_type}. Expected one of {daemon.CLASSIFIER_TYPES}')
+        sys.exit(1)
+
+    print(f'Loading the {classifier_type} classifier...')
+    start = time.perf_counter()
+    classifier = daemon.load_classifier(classifier_type, model, device, model_name, precision)
+    print(f'Loaded in {time.perf_counter() - start:.1f} s')
+
+    classification_daemon = daemon.ClassificationDaemon(classifier, address, name=classifier_type, chunk_size=chunk_size)
+    try:
+        classification_daemon.serve_forever()
+    except KeyboardInterrupt:
+        print('Stopped')
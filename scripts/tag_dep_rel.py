@@ -2,6 +2,10 @@
 Parse dependency tags for CoNLL-U sentences. The dependency tags are the Universal 
 Dependency Relations: https://universaldependencies.org/u/dep/index.html
 
+The stanza pipeline is loaded once, and used for all the files of a directory. Set
+SPEECHACT_MODEL_DIR to load the stanza models from <model dir>/stanza (see
+speechact/registry.py).
+
 Usage: python tag_dep_rel.py <source corpus|directory> <target directory>
 """
 # Example: python scripts/tag_dep_rel.py 'data/for-testing/dir2/test-set.conllu.bz2' 'data/for-testing/dir2/tagged'
@@ -9,6 +13,7 @@ Usage: python tag_dep_rel.py <source corpus|directory> <target directory>
 from context import speechact
 import bz2
 import speechact.preprocess as pre
+import speechact.registry as registry
 import sys
 import os
 
@@ -51,5 +56,8 @@ if __name__ == '__main__':
             tag_bz2(source_file, target_file)
     else:
         print(f'Error: "{source}" is neither a file nor a directory')
+        sys.exit(1)
+
+    print(registry.report())
 
             
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""
+This script tags a corpus with speech acts using the embedding-based classifier. The sentences are
+streamed through the classifier: they are read and tokenized on worker threads, in batches of
+similar lengths, while the model classifies the previous batches.
+
+The source can be a CoNLL-U corpus, a text file with one sentence per line, or a JSONL file with a
+'text' in each object, optionally bz2 compressed (.conllu, .txt, .jsonl, and .bz2). CoNLL-U
+sentences are written to the target as CoNLL-U, with a '# speech_act' comment. Text and JSONL
+sentences are written as JSONL, with a 'speech_act' key.
+
+The model is either a classification model file (.pth) for the SBERT model, or the directory of a
+frozen classifier (see speechact/classifier/frozen.py). The token budget is the maximum padded
+number of tokens of a batch, and the window is the number of sentences that are sorted into
+batches together.
+
+If resume is True, a tagging that was interrupted continues from its last checkpoint.
+
+Usage: python tag_speech_acts_embedding.py <source corpus> <target corpus> [model] [sbert model] [precision] [token budget] [max batch size] [window] [tokenizer threads] [resume]
+"""
+# Example: python scripts/tag_speech_acts_embedding.py 'data/test-set.conllu.bz2' 'data/for-testing/speech-acts.conllu.bz2' 'models/embedding-based.pth' 'KBLab/sentence-bert-swedish-cased' int8 4096 256 2048 1 True
+# Example: python scripts/tag_speech_acts_embedding.py 'sentences.txt' 'speech-acts.jsonl' 'models/frozen'
+
+from context import speechact
+import speechact.batching as batching
+import speechact.classifier.streaming as streaming
+import os
+import sys
+
+if __name__ == '__main__':
+    # Check the number of arguments passed
+    if len(sys.argv) < 3 or len(sys.argv) > 11:
+        print('Usage: python tag_speech_acts_embedding.py <source corpus> <target corpus> [model] [sbert model] [precision] [token budget] [max batch size] [window] [tokenizer threads] [resume]')
+        sys.exit(1)
+
+    source_file = sys.argv[1]
+    target_file = sys.argv[2]
+    model = sys.argv[3] if len(sys.argv) > 3 else 'models/embedding-based.pth'
+    sbert_model = sys.argv[4] if len(sys.argv) > 4 else None
+    precision = sys.argv[5] if len(sys.argv) > 5 else 'float32'
+    token_budget = int(sys.argv[6]) if len(sys.argv) > 6 else 4096
+    max_batch_size = int(sys.argv[7]) if len(sys.argv) > 7 else 256
+    window = int(sys.argv[8]) if len(sys.argv) > 8 else 2048
+    tokenizer_threads = int(sys.argv[9]) if len(sys.argv) > 9 else 1
+    resume = sys.argv[10] == 'True' if len(sys.argv) > 10 else False
+
+    if os.path.isdir(model):
+        import speechact.classifier.frozen as frozen
+        classifier = frozen.FrozenClassifier(model)
+    else:
+        import speechact.classifier.embedding as emb
+        if sbert_model == None:
+            sbert_model = emb.EMBEDDING_MODEL
+        classifier = emb.EmbeddingClassifier(device='cpu', model_name=sbert_model, precision=precision)
+        classifier.load(model)
+
+    bucketer = batching.LengthBucketer(token_budget=token_budget, window=window, max_batch_size=max_batch_size)
+    tagger = streaming.StreamingTagger(classifier, bucketer, tokenizer_threads=tokenizer_threads)
+
+    print(f'Tagging "{source_file}" to "{target_file}"')
+    streaming.tag_file(tagger, source_file, target_file, resume=resume)
+
+    print(f'Tagging complete. {tagger.report()}')
+    print(bucketer.report())
@@ -2,47 +2,75 @@
 This script tags a CoNLL-U corpus file with speech acts using the rule based classifier. The tagged
 sentences are written to a new corpus file.
 
-The corpus needs to be tagged with sentiment labels (sent_label).
+The classifier needs the sentiment labels (sentiment_label) and the dependency relations of the
+sentences. If the corpus is not tagged with these, they are computed only for the sentences that
+need them.
 
-Usage: python tag_speech_acts_rulebased.py <source corpus> <target corpus> <ruleset file>
+The sentences are classified in parallel worker processes if jobs > 1. The sentiment model runs
+on the device (e.g. cpu, cuda or mps), which defaults to the available device of the machine.
+
+If the address of a running classification daemon is given (see run_classification_daemon.py),
+the sentences are classified by the daemon instead, and no models are loaded by this script. The
+ruleset file and the jobs are then those of the daemon.
+
+Usage: python tag_speech_acts_rulebased.py <source corpus> <target corpus> [ruleset file] [jobs] [daemon address] [device]
 """
-# Example: python scripts/tag_speech_acts_rulebased.py 'data/for-testing/dir2/dev-set-test-sentiment.conllu.bz2' 'data/for-testing/dir2/speech-acts.conllu.bz2'
+# Example: python scripts/tag_speech_acts_rulebased.py 'data/for-testing/dir2/dev-set-test-sentiment.conllu.bz2' 'data/for-testing/dir2/speech-acts.conllu.bz2' 'models/rule-based.json' 4
+# Example: python scripts/tag_speech_acts_rulebased.py 'data/for-testing/dir2/dev-set-test-sentiment.conllu.bz2' 'data/for-testing/dir2/speech-acts.conllu.bz2' 'models/rule-based.json' 1 'None' 'cpu'
+# Example: python scripts/tag_speech_acts_rulebased.py 'data/for-testing/dir2/dev-set-test-sentiment.conllu.bz2' 'data/for-testing/dir2/speech-acts.conllu.bz2' 'None' 1 'localhost:8765'
 
 from context import speechact
-import speechact.classifier.rulebased as rb
+import speechact.client as client
 import speechact.corpus as corp
 import speechact.preprocess as pre
-from stanza.utils.conll import CoNLL
+import speechact.conllu as conllu
 import sys
+import time
 
 if __name__ == '__main__':
     # Check the number of arguments passed
-    if len(sys.argv) != 3 and len(sys.argv) != 4:
-        print('Usage: python tag_speech_acts_rulebased.py <source corpus> <target corpus> <ruleset file>')
+    if len(sys.argv) < 3 or len(sys.argv) > 7:
+        print('Usage: python tag_speech_acts_rulebased.py <source corpus> <target corpus> [ruleset file] [jobs] [daemon address] [device]')
         sys.exit(1)
 
     source_file = sys.argv[1]
     target_file = sys.argv[2]
 
-    if len(sys.argv) > 3:
+    if len(sys.argv) > 3 and sys.argv[3] != 'None':
         rule_file = sys.argv[3]
     else:
         rule_file = 'models/rule-based.json'
 
-    classifier = rb.TrainableSentimentClassifierV2(ruleset_file=rule_file)
+    jobs = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+    daemon_address = sys.argv[5] if len(sys.argv) > 5 and sys.argv[5] != 'None' else None
+    device = sys.argv[6] if len(sys.argv) > 6 and sys.argv[6] != 'None' else None
+
+    if daemon_address != None:
+        classifier = client.DaemonClient(daemon_address)
+        print(f'Classifying with the daemon on {daemon_address}: {classifier.health()}')
+    else:
+        import speechact.classifier.features as features
+        import speechact.classifier.rulebased as rb
+        classifier = features.LazyFeatureClassifier(rb.TrainableSentimentClassifierV2(ruleset_file=rule_file),
+                                                    [features.SentimentProvider(device=device), features.DependencyProvider()])
     source_corpus = corp.Corpus(source_file)
     
-    with pre.open_write(target_file) as target:
+    with pre.open_write(target_file) as target, conllu.ConlluWriter(target) as writer:
 
-        # Tag the corpus in batches.
-        batch_count = 0
+        # Tag the corpus sentences, and write them with their original lines.
+        start = time.perf_counter()
         sentence_count = 0
-        for batch in source_corpus.batched_docs(1000):
-            classifier.classify_document(batch)
-            CoNLL.write_doc2conll(batch, target)
+        for sentence, speech_act in classifier.classify_sentences(source_corpus.sentences(), jobs):
+            writer.write_lines(sentence.sentence_lines, properties={'speech_act': speech_act})
+
+            sentence_count += 1
+            if sentence_count % 1000 == 0:
+                print(f'sentences: {sentence_count}')
 
-            batch_count += 1
-            sentence_count += len(batch.sentences)
-            print(f'batch: {batch_count}, sentences: {sentence_count}')
+    print(f'Parsing complete. Parsed {sentence_count} sentences in {time.perf_counter() - start:.1f} s')
 
-    print(f'Parsing complete. Parsed {sentence_count} sentences')
\ No newline at end of file
+    # The features are computed by the worker processes if jobs > 1.
+    if daemon_address != None:
+        print(classifier.metrics().get('report', ''))  # type: ignore
+    elif jobs <= 1:
+        print(classifier.report())  # type: ignore
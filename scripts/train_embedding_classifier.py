@@ -1,10 +1,14 @@
 """
 Train an embedding-based classifier. 
 
-Usage: python train_embedding_classifier.py <train corpus> <save model to file> <device> <batch size> <epochs> <use class weights> <load pre-existing model>
+The embeddings can be stored in an embedding store directory, so that they are only computed in
+the first epoch (and not at all if they are already stored).
+
+Usage: python train_embedding_classifier.py <train corpus> <save model to file> <device> <batch size> <epochs> <use class weights> <load pre-existing model> [embedding store]
 """
 # Example: python scripts/train_embedding_classifier.py 'data/train-set.conllu.bz2' 'models/neural/no-hidden/test-model.pth' cuda 32 10 True False
 # Example: python scripts/train_embedding_classifier.py 'data/train-set.conllu.bz2' 'models/neural/no-hidden/test-model.pth' mps 32 10 True False
+# Example: python scripts/train_embedding_classifier.py 'data/train-set.conllu.bz2' 'models/neural/no-hidden/test-model.pth' cuda 32 10 True False 'embeddings'
 
 from context import speechact
 import speechact.classifier.embedding as emb
@@ -14,8 +18,8 @@ import sys
 if __name__ == '__main__':
 
     # Check the number of arguments passed
-    if len(sys.argv) != 8:
-        print('Usage: python train_embedding_classifier.py <train corpus> <save model to file> <device> <batch size> <epochs> <use class weights> <load pre-existing model>')
+    if len(sys.argv) != 8 and len(sys.argv) != 9:
+        print('Usage: python train_embedding_classifier.py <train corpus> <save model to file> <device> <batch size> <epochs> <use class weights> <load pre-existing model> [embedding store]')
         sys.exit(1)
     
     train_corpus_file = sys.argv[1]
@@ -25,12 +29,13 @@ if __name__ == '__main__':
     num_epochs = int(sys.argv[5])
     use_class_weights = bool(sys.argv[6])
     load_pre_existing = sys.argv[7] == 'True'
+    embedding_store = sys.argv[8] if len(sys.argv) > 8 else None
 
     print('Loading data...')
     train_corpus = corp.Corpus(train_corpus_file)
     train_data = emb.CorpusDataset(train_corpus)
 
-    classifier = emb.EmbeddingClassifier(device=device)
+    classifier = emb.EmbeddingClassifier(device=device, embedding_store=embedding_store)
 
     if load_pre_existing:
         print('Loading model.')
@@ -45,5 +50,8 @@ if __name__ == '__main__':
                      save_each_epoch=model_name)
     classifier.save(model_name)
 
+    if classifier.embedding_store != None:
+        print(classifier.embedding_store.report())
+
     print('Training complete.')
 
@@ -0,0 +1,55 @@
+"""
+Train the classification network of an embedding-based classifier on precomputed embeddings.
+The sentences are encoded once, and the network is then trained on the in-memory embeddings,
+with early stopping on the dev loss.
+
+The embeddings can be stored in an embedding store directory, so that they are not computed
+again by later runs.
+
+Usage: python train_embedding_head.py <train corpus> <dev corpus> <save model to file> <device> <batch size> <max epochs> <patience> <use class weights> [embedding store]
+"""
+# Example: python scripts/train_embedding_head.py 'data/train-set.conllu.bz2' 'data/dev-set.conllu.bz2' 'models/neural/no-hidden/test-model.pth' cpu 32 100 5 True 'embeddings'
+
+from context import speechact
+import speechact.classifier.embedding as emb
+import speechact.corpus as corp
+import sys
+import time
+
+if __name__ == '__main__':
+
+    # Check the number of arguments passed
+    if len(sys.argv) != 9 and len(sys.argv) != 10:
+        print('Usage: python train_embedding_head.py <train corpus> <dev corpus> <save model to file> <device> <batch size> <max epochs> <patience> <use class weights> [embedding store]')
+        sys.exit(1)
+
+    train_corpus_file = sys.argv[1]
+    dev_corpus_file = sys.argv[2]
+    model_name = sys.argv[3]
+    device = sys.argv[4]
+    batch_size = int(sys.argv[5])
+    num_epochs = int(sys.argv[6])
+    patience = int(sys.argv[7])
+    use_class_weights = sys.argv[8] == 'True'
+    embedding_store = sys.argv[9] if len(sys.argv) > 9 else None
+
+    print('Loading data...')
+    train_data = emb.CorpusDataset(corp.Corpus(train_corpus_file))
+    dev_data = emb.CorpusDataset(corp.Corpus(dev_corpus_file))
+
+    classifier = emb.EmbeddingClassifier(device=device, embedding_store=embedding_store)
+
+    print('Training network...')
+    start = time.perf_counter()
+    classifier.train_precomputed(train_data,
+                                 batch_size=batch_size,
+                                 num_epochs=num_epochs,
+                                 dev_data=dev_data,
+                                 patience=patience,
+                                 use_class_weights=use_class_weights)
+    classifier.save(model_name)
+
+    if classifier.embedding_store != None:
+        print(classifier.embedding_store.report())
+
+    print(f'Training complete in {time.perf_counter() - start:.1f} s.')
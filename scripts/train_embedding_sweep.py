@@ -0,0 +1,64 @@
+"""
+Train several classification networks for the embedding-based classifier in one run. The
+sentences are encoded once, and all the networks are trained on the same embeddings, with
+early stopping on the dev loss. The dev metrics of each network are reported, and each network
+is saved to '<save directory>/<name>.pth'.
+
+The embeddings can be stored in an embedding store directory, so that they are not computed
+again by later runs.
+
+Usage: python train_embedding_sweep.py <train corpus> <dev corpus> <save directory> <device> <batch size> <max epochs> <patience> <use class weights> [embedding store]
+"""
+# Example: python scripts/train_embedding_sweep.py 'data/train-set.conllu.bz2' 'data/dev-set.conllu.bz2' 'models/neural/sweep' cpu 32 100 5 True 'embeddings'
+
+from context import speechact
+import speechact.classifier.embedding as emb
+import speechact.classifier.sweep as sweep
+import speechact.corpus as corp
+import sys
+
+NETWORKS = {
+    'no-hidden': emb.linear_perceptron,
+    'softmax_perceptron': emb.softmax_perceptron,
+    'hidden-sigmoid': emb.sigmoid_hidden_layer,
+    'hidden_64': emb.hidden_layer(64),
+    'hidden_256': emb.hidden_layer(256, dropout=0.5)
+}
+LEARNING_RATES = [0.001, 0.0001]
+
+if __name__ == '__main__':
+
+    # Check the number of arguments passed
+    if len(sys.argv) != 9 and len(sys.argv) != 10:
+        print('Usage: python train_embedding_sweep.py <train corpus> <dev corpus> <save directory> <device> <batch size> <max epochs> <patience> <use class weights> [embedding store]')
+        sys.exit(1)
+
+    train_corpus_file = sys.argv[1]
+    dev_corpus_file = sys.argv[2]
+    save_directory = sys.argv[3]
+    device = sys.argv[4]
+    batch_size = int(sys.argv[5])
+    num_epochs = int(sys.argv[6])
+    patience = int(sys.argv[7])
+    use_class_weights = sys.argv[8] == 'True'
+    embedding_store = sys.argv[9] if len(sys.argv) > 9 else None
+
+    print('Loading data...')
+    train_data = emb.CorpusDataset(corp.Corpus(train_corpus_file))
+    dev_data = emb.CorpusDataset(corp.Corpus(dev_corpus_file))
+
+    classifier = emb.EmbeddingClassifier(device=device, embedding_store=embedding_store)
+
+    heads = [sweep.Head(f'{name}-lr{learning_rate:g}', network_factory,
+                        learning_rate=learning_rate, use_class_weights=use_class_weights)
+             for name, network_factory in NETWORKS.items() 
+             for learning_rate in LEARNING_RATES]
+    trainer = sweep.SweepTrainer(classifier, heads)
+
+    print(f'Training {len(heads)} networks...')
+    trainer.train(train_data, batch_size, num_epochs=num_epochs, dev_data=dev_data, patience=patience)
+    trainer.save(save_directory)
+
+    print(trainer.report())
+    if classifier.embedding_store != None:
+        print(classifier.embedding_store.report())
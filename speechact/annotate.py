@@ -7,7 +7,6 @@ code for analyzing the then annotated sentences, i.e. computing Cohen's kappa.
 import bz2
 import os
 import random
-import sklearn.metrics as metrics
 from typing import TextIO
 import speechact.corpus as corp
 import enum
@@ -295,6 +294,7 @@ def compute_cohens_kappa(corpus_pairs: list[AnnotatedCorpusPair]) -> float:
     assert len(labels_a) == len(labels_b), f'Number of labels do not match. A: {len(labels_a)}, B: {len(labels_b)}'
     
     # Compute Cohen's kappa.
+    import sklearn.metrics as metrics
     return metrics.cohen_kappa_score(labels_a, labels_b)
 
 
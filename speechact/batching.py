@@ -0,0 +1,136 @@
+"""
+Length-bucketed batching for models that pad the sentences of a batch to the longest one (e.g.
+the SBERT encoder and the stanza dependency parser). Instead of batching a fixed number of
+sentences in corpus order, the sentences of a look-ahead window are sorted by length and packed
+into batches of at most a token budget, where the tokens of a batch are its padded size, i.e. the
+number of sentences times the longest length. Short sentences then end up in large batches, and
+little compute is spent on padding.
+
+The batches are lists of indices, so the results can be put back in the original order.
+"""
+
+import numpy as np
+import time
+from typing import Any
+from typing import Callable
+
+class LengthBucketer:
+    """
+    Packs sentences into batches by their token lengths.
+
+    Args:
+        token_budget: the maximum padded size (number of sentences * longest length) of a
+            batch. A sentence that is longer than the budget gets a batch of its own.
+        window: the number of sentences that are sorted together. A larger window gives less
+            padding, but the results of a window are only available when it is done.
+        max_batch_size: the maximum number of sentences in a batch, or None for no maximum.
+    """
+
+    def __init__(self, token_budget=4096, window=1024, max_batch_size: int|None = None) -> None:
+        self.token_budget = token_budget
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.reset_stats()
+
+
+    def batches(self, lengths: list[int]|np.ndarray) -> list[np.ndarray]:
+        """
+        Get the batches of the sentences with the lengths, as arrays of the indices of the
+        sentences. Each window of sentences is packed separately, and the batches of a window
+        are ordered from the shortest sentences to the longest.
+        """
+        lengths = np.asarray(lengths, dtype=np.int64)
+        batches = []
+        for window_start in range(0, len(lengths), self.window):
+            window_lengths = lengths[window_start:window_start + self.window]
+            order = np.argsort(window_lengths, kind='stable')
+
+            start = 0
+            for end in range(1, len(order) + 1):
+                # The longest sentence of a batch is the last one, since it is sorted.
+                size = end - start
+                too_large = (size * window_lengths[order[end - 1]] > self.token_budget or
+                             (self.max_batch_size != None and size > self.max_batch_size))
+                if too_large and size > 1:
+                    batches.append(window_start + order[start:end - 1])
+                    start = end - 1
+
+            if start < len(order):
+                batches.append(window_start + order[start:])
+
+        self.sentences += len(lengths)
+        self.batch_count += len(batches)
+        self.tokens += int(lengths.sum())
+        self.padded_tokens += padded_tokens(lengths, batches)
+        return batches
+
+
+    def map(self, func: Callable[[list], list], items: list, lengths: list[int]|np.ndarray) -> list:
+        """
+        Map func over the batches of the items, and get the results in the same order as the
+        items. The func gets a list of items, and needs to return one result per item.
+        """
+        results = [None] * len(items)  # type: list[Any]
+        for batch in self.batches(lengths):
+            start = time.perf_counter()
+            batch_results = func([items[index] for index in batch])
+            self.time += time.perf_counter() - start
+
+            assert len(batch_results) == len(batch), f'{len(batch_results)} results for {len(batch)} items'
+            for index, result in zip(batch, batch_results):
+                results[index] = result
+
+        return results
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the time.
+        """
+        self.sentences = 0
+        self.batch_count = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.time = 0.0
+
+
+    @property
+    def padding_waste(self) -> float:
+        """
+        The fraction of the padded tokens that are padding.
+        """
+        return 1 - self.tokens / self.padded_tokens if self.padded_tokens > 0 else 0.0
+
+
+    def report(self) -> str:
+        """
+        Get a summary of the batches and how much padding they had.
+        """
+        mean_size = self.sentences / self.batch_count if self.batch_count > 0 else 0.0
+        return (f'{self.sentences} sentences in {self.batch_count} batches ({mean_size:.1f} sentences/batch), '
+                f'{self.tokens} tokens, {self.padded_tokens} padded tokens, '
+                f'padding waste {100 * self.padding_waste:.1f}%')
+
+
+def fixed_batches(count: int, batch_size: int) -> list[np.ndarray]:
+    """
+    Get batches of batch_size sentences in their original order, as arrays of indices.
+    """
+    return [np.arange(start, min(start + batch_size, count)) for start in range(0, count, batch_size)]
+
+
+def padded_tokens(lengths: list[int]|np.ndarray, batches: list[np.ndarray]) -> int:
+    """
+    Get the total padded size of the batches, when each sentence of a batch is padded to the
+    longest one.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    return int(sum(len(batch) * lengths[batch].max() for batch in batches if len(batch) > 0))
+
+
+def padding_waste(lengths: list[int]|np.ndarray, batches: list[np.ndarray]) -> float:
+    """
+    Get the fraction of the padded tokens of the batches that are padding.
+    """
+    padded = padded_tokens(lengths, batches)
+    return 1 - int(np.sum(lengths)) / padded if padded > 0 else 0.0
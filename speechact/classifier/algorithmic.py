@@ -4,15 +4,27 @@ with speech acts.
 """
 
 
-import stanza.models.common.doc as doc
+from __future__ import annotations
+import typing
 import speechact.preprocess as preprocess
 from . import base
 import speechact.annotate as annotate
+from . import docarrays
+from . import features
+from . import rulebased as rb
+import numpy as np
 import enum
+import itertools
 import re
+import time
+from typing import Callable
+from typing import Iterable
 import dateutil.parser as dt_parser
 import speechact as sa
 
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
 SUBJECT_RELS = {
     'csubj', 
     'csubj:outer', 
@@ -89,6 +101,26 @@ class Punctuation(enum.StrEnum):
     QUESTION = '?'
     NONE = 'none'
 
+CLAUSE_TYPES = list(ClauseType)
+"""The clause types. The code of a clause type is its index in this list."""
+
+PUNCTUATIONS = list(Punctuation)
+"""The punctuations. The code of a punctuation is its index in this list."""
+
+PUNCTUATION_CODES = {punctuation.value: code for code, punctuation in enumerate(PUNCTUATIONS)
+                     if punctuation != Punctuation.NONE}
+"""The code of each punctuation character."""
+
+CLAUSE_TYPE_SPEECH_ACTS = np.array([clause_type_to_speech_acts[clause_type].value 
+                                    for clause_type in CLAUSE_TYPES])
+"""The speech act of each clause type code."""
+
+PUNCTUATION_SPEECH_ACTS = np.array([annotate.SpeechActLabels.ASSERTION.value,
+                                    annotate.SpeechActLabels.EXPRESSIVE.value,
+                                    annotate.SpeechActLabels.QUESTION.value,
+                                    annotate.SpeechActLabels.NONE.value])
+"""The speech act of each punctuation code (see classify_from_punctation)."""
+
 
     
 
@@ -97,14 +129,30 @@ class PunctuationClassifier(base.Classifier):
     Classify speech acts purely from punctuation.
     """
 
-    def classify_sentence(self, sentence: doc.Sentence):
+    def predict_sentence(self, sentence: doc.Sentence) -> str:
         speech_act = classify_from_punctation(sentence).value
 
         # Default is an assertion.
         if speech_act == annotate.SpeechActLabels.NONE:
             speech_act = annotate.SpeechActLabels.ASSERTION
 
-        sentence.speech_act = speech_act    # type: ignore
+        return speech_act
+
+    
+    def get_speech_acts(self, arrays: docarrays.DocumentArrays) -> np.ndarray:
+        """
+        Get the speech acts of all the sentences in the document arrays. This gives the same
+        speech acts as predict_sentence.
+        """
+        speech_acts = PUNCTUATION_SPEECH_ACTS[get_punctuations(arrays)]
+
+        # Default is an assertion.
+        speech_acts[speech_acts == annotate.SpeechActLabels.NONE] = annotate.SpeechActLabels.ASSERTION
+        return speech_acts
+
+
+    def predict_lines(self, sentence_lines: list[list[str]]) -> np.ndarray:
+        return predict_lines(self, sentence_lines)
 
 
 class ClauseClassifier(base.Classifier):
@@ -112,22 +160,72 @@ class ClauseClassifier(base.Classifier):
     Classify speech acts purely from the clause type of the sentence.
     """
 
-    def classify_sentence(self, sentence: doc.Sentence):
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        return {features.DEPENDENCIES}
+
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str:
         clause_type = get_clause_type(sentence)
-        speech_act = clause_type_to_speech_acts[clause_type].value
-        sentence.speech_act = speech_act  # type: ignore
+        return clause_type_to_speech_acts[clause_type].value
+
+    
+    def get_speech_acts(self, arrays: docarrays.DocumentArrays) -> np.ndarray:
+        """
+        Get the speech acts of all the sentences in the document arrays. This gives the same
+        speech acts as predict_sentence.
+        """
+        return CLAUSE_TYPE_SPEECH_ACTS[get_clause_types(arrays)]
+
+
+    def predict_lines(self, sentence_lines: list[list[str]]) -> np.ndarray:
+        return predict_lines(self, sentence_lines)
+
+
+def predict_lines(classifier: PunctuationClassifier|ClauseClassifier, sentence_lines: list[list[str]]) -> np.ndarray:
+    """
+    Predict the label codes of CoNLL-U sentences, given by their lines, with the
+    get_speech_acts() of the classifier. The lines are encoded as column arrays, without
+    parsing them as a Stanza document, and all the sentences are classified at once. This gives
+    the same speech acts as predict_batch(), and is much faster from lines, e.g. in
+    classify_sentences(). From Stanza sentences, predict_batch() is faster, since encoding
+    their words costs more than classifying them one at a time.
+    """
+    if len(sentence_lines) == 0:
+        return np.zeros(0, dtype=np.int8)
+
+    lines = []
+    for sentence in sentence_lines:
+        lines += sentence
+        lines.append('\n')
+
+    arrays = docarrays.DocumentArrays.from_lines(lines)
+    assert arrays.sentence_count == len(sentence_lines), 'sentences without words cannot be classified'
+    return base.to_codes(classifier.get_speech_acts(arrays))
 
 
 class RuleBasedClassifier(base.Classifier):
 
-    def classify_document(self, document: doc.Document):
-        for sentence in document.sentences:
-            self.classify_sentence(sentence)
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        """
+        The sentiment is only needed for periods and declaratives, and the dependencies are
+        not needed for periods and questions. This follows the branches of get_speech_act.
+        """
+        punctuation = get_punctation(sentence)
+        if punctuation == Punctuation.PERIOD:
+            return {features.SENTIMENT}
+        if punctuation == Punctuation.QUESTION:
+            return set()
+        
+        # The clause type needs the dependencies.
+        if not features.has_dependencies(sentence):
+            return {features.DEPENDENCIES}
+        if get_clause_type(sentence) == ClauseType.DECLARATIVE and punctuation != Punctuation.EXCLAMATION:
+            return {features.DEPENDENCIES, features.SENTIMENT}
+        return {features.DEPENDENCIES}
 
 
-    def classify_sentence(self, sentence: doc.Sentence):
-        speech_act = self.get_speech_act(sentence).value
-        sentence.speech_act = speech_act  # type: ignore
+    def predict_sentence(self, sentence: doc.Sentence) -> str:
+        return self.get_speech_act(sentence).value
 
 
     def get_speech_act(self, sentence: doc.Sentence) -> annotate.SpeechActLabels:
@@ -185,6 +283,182 @@ class RuleBasedClassifier(base.Classifier):
         return sentiment  # type: ignore
 
 
+class SentenceAnalysis:
+    """
+    The syntactical features of a sentence that the algorithmic classifiers use: the head, 
+    finite verb, subject, clause base, the first word and the punctuation. The dependency 
+    features (head, finite verb and subject) are all computed in a single pass over the words
+    the first time one of them is used. Use analyze() to get the memoized analysis of a 
+    sentence.
+    """
+
+    def __init__(self, sentence: doc.Sentence):
+        self.sentence = sentence
+        words = sentence.words
+
+        # The first word.
+        first_word = words[0]
+        self.first_text = first_word.text.lower()  # type: str
+        self.first_pos = first_word.pos  # type: str
+
+        # The major delimiting punctuation.
+        last_char = words[-1].text[-1]
+        if last_char == '.':
+            self.punctuation = Punctuation.PERIOD
+        elif last_char == '!':
+            self.punctuation = Punctuation.EXCLAMATION
+        elif last_char == '?':
+            self.punctuation = Punctuation.QUESTION
+        else:
+            self.punctuation = Punctuation.NONE
+
+        # The dependency features are computed by analyze_dependencies().
+        self.has_dependencies = False
+        self.head = None  # type: doc.Word|None
+        self.head_index = -1
+        self.finite_verb = None  # type: doc.Word|None
+        self.subject = None  # type: doc.Word|None
+
+        self.clause_type = None  # type: ClauseType|None
+    
+
+    def analyze_dependencies(self):
+        """
+        Find the head, the finite verb and the subject.
+        """
+        words = self.sentence.words
+        heads = [word.head for word in words]
+        self.has_dependencies = True
+
+        # Find the head.
+        if 0 not in heads:
+            return
+        self.head_index = heads.index(0)
+        self.head = head = words[self.head_index]
+
+        # The finite verb is the head, if it is a verb in finite form.
+        if head.pos != 'VERB' or head.feats == None or 'VerbForm=Fin' not in head.feats:
+            return
+        self.finite_verb = head
+
+        # The subject is the first subject dependent of the finite verb.
+        index = -1
+        try:
+            while True:
+                index = heads.index(head.id, index + 1)
+                if words[index].deprel in SUBJECT_RELS:
+                    self.subject = words[index]
+                    return
+        except ValueError:
+            return
+    
+
+    def get_head(self) -> doc.Word:
+        if not self.has_dependencies:
+            self.analyze_dependencies()
+        if self.head is None:
+            raise ValueError('Sentence lacks a head.')
+        return self.head
+    
+
+    def get_finite_verb(self) -> doc.Word|None:
+        self.get_head()
+        return self.finite_verb
+    
+
+    def get_subject(self) -> doc.Word|None:
+        self.get_head()
+        return self.subject
+    
+
+    def get_clause_base_length(self) -> int:
+        """
+        Get the number of words in the clause base, i.e. the words before the finite verb.
+        """
+        if self.get_finite_verb() is None:
+            raise ValueError('Sentence does not have a finite verb')
+        return self.head_index
+    
+
+    def get_clause_base(self) -> list[doc.Word]:
+        """
+        Get the clause base, i.e. the words before the finite verb.
+        """
+        return self.sentence.words[:self.get_clause_base_length()]
+    
+
+    def is_in_clause_base(self, word: doc.Word|None) -> bool:
+        """
+        Check if the word is part of the clause base.
+        """
+        words = self.sentence.words
+        return any(words[index] is word for index in range(self.get_clause_base_length()))
+    
+
+    def get_clause_type(self) -> ClauseType:
+        """
+        Get the clause type of the sentence. This is the same as get_clause_type(), but reads 
+        all the features from the analysis.
+        """
+        if self.clause_type is None:
+            self.clause_type = self.compute_clause_type()
+        return self.clause_type
+    
+
+    def compute_clause_type(self) -> ClauseType:
+        finite_verb = self.get_finite_verb()
+        if finite_verb is None:
+            return ClauseType.NONE
+
+        # Check whether the clause is AF (subject before the finite verb) or FA.
+        subject = self.get_subject()
+        if subject == None or subject.id > finite_verb.id:
+            is_AF = False
+        else:
+            is_AF = not self.is_in_clause_base(subject)
+
+        if is_AF:
+            if self.head_index > 0 and self.first_text in ('vad', 'så'):
+                return ClauseType.EXPRESSIVE
+            elif self.first_text in ('att', 'så') and self.first_pos == 'SCONJ':
+                return ClauseType.EXPRESSIVE
+            elif self.first_text == 'bara':
+                return ClauseType.DESIDERATIVE
+            elif self.first_text == 'om' or starts_with(self.sentence, ['tänk', 'om']):
+                return ClauseType.SUPPOSITIVE
+        
+        else:
+            if self.head_index > 0:
+                if self.first_text in INTERROGATIVE_ADVERBS or self.first_text in INTERROGATIVE_PRONOUNS:
+                    return ClauseType.QUESITIVE
+                else:
+                    return ClauseType.DECLARATIVE
+            else:
+                if finite_verb.id == 1:
+                    if subject != None:
+                        return ClauseType.ROGATIVE
+                    else:
+                        return ClauseType.DIRECTIVE
+                else:
+                    return ClauseType.DESIDERATIVE
+
+        # Sentence does not have any known clause type.
+        return ClauseType.NONE
+
+
+def analyze(sentence: doc.Sentence) -> SentenceAnalysis:
+    """
+    Get the analysis of the sentence. This is computed once, and stored on the sentence. If
+    the words of the sentence are changed afterwards, delete sentence._sentence_analysis.
+    """
+    analysis = getattr(sentence, '_sentence_analysis', None)
+    if analysis is None:
+        analysis = SentenceAnalysis(sentence)
+        sentence._sentence_analysis = analysis  # type: ignore
+    
+    return analysis
+
+
 def classify_from_punctation(sentence: doc.Sentence) -> annotate.SpeechActLabels:
     """
     Classify the sentence based on the punctation.
@@ -206,59 +480,143 @@ def get_punctation(sentence: doc.Sentence) -> Punctuation:
     Get the major delimiting punctation of the sentence, e.g. '.', '?', '!',
     or nothing.
     """
-    last_word = sentence.words[-1]
-    if last_word.text[-1] == '.':
-        return Punctuation.PERIOD
-    elif last_word.text[-1] == '!':
-        return Punctuation.EXCLAMATION
-    elif last_word.text[-1] == '?':
-        return Punctuation.QUESTION
-    else:
-        return Punctuation.NONE
+    return analyze(sentence).punctuation
 
 
 def get_clause_type(sentence: doc.Sentence) -> ClauseType:
     """
     Compute the clause type of the sentence.
     """
-
-    if is_AF_clause(sentence):
-        if has_expressive_in_base(sentence):
-            return ClauseType.EXPRESSIVE
-        elif starts_with_subjunctive(sentence, 'att'):
-            return ClauseType.EXPRESSIVE
-        elif starts_with_subjunctive(sentence, 'så'):
-            return ClauseType.EXPRESSIVE
-        elif starts_with(sentence, 'bara'):
-            return ClauseType.DESIDERATIVE
-        elif starts_with(sentence, 'om') or starts_with(sentence, ['tänk', 'om']):
-            return ClauseType.SUPPOSITIVE
-    
-    elif is_FA_clause(sentence):
-        if has_clause_base(sentence):
-            if has_interrogative_base(sentence):
-                return ClauseType.QUESITIVE
-            else:
-                return ClauseType.DECLARATIVE
-        else:
-            if starts_with_finite_verb(sentence):
-                if get_subject(sentence) != None:
-                    return ClauseType.ROGATIVE
-                else:
-                    return ClauseType.DIRECTIVE
-            else:
-                return ClauseType.DESIDERATIVE
-
-    # Sentence does not have any known clause type.
-    return ClauseType.NONE
+    # The clause type is decided as follows:
+    # AF clause (subject before the finite verb):
+    #   expressive base ('vad', 'så'), or starts with subjunctive 'att' or 'så' -> expressive
+    #   starts with 'bara' -> desiderative
+    #   starts with 'om' or 'tänk om' -> suppositive
+    # FA clause:
+    #   with a clause base: interrogative base -> quesitive, otherwise declarative
+    #   starts with the finite verb: with a subject -> rogative, otherwise directive
+    #   otherwise -> desiderative
+    return analyze(sentence).get_clause_type()
+
+
+def get_clause_types(arrays: docarrays.DocumentArrays) -> np.ndarray:
+    """
+    Compute the clause types of all the sentences in the document arrays at once. The same
+    features as in SentenceAnalysis are computed with array operations, and the clause type
+    codes (see CLAUSE_TYPES) are returned.
+    """
+    sentence_starts = arrays.sentence_offsets[:-1]
+    word_sentences = arrays.word_sentences
+
+    # Find the head (the first word with head 0) of each sentence.
+    root_positions = np.flatnonzero(arrays.heads == 0)
+    root_sentences, first_roots = np.unique(word_sentences[root_positions], return_index=True)
+    if len(root_sentences) < arrays.sentence_count:
+        raise ValueError('Sentence lacks a head.')
+    head_positions = root_positions[first_roots]
+    head_ids = arrays.ids[head_positions]
+    clause_base_lengths = head_positions - sentence_starts
+
+    # The head is the finite verb if it is a verb in finite form.
+    has_finite_verb = ((arrays.upos[head_positions] == arrays.upos_code('VERB')) &
+                       (arrays.feats_flags[head_positions] & rb.FEATS_VERB_FIN != 0))
+
+    # Find the first subject dependent of each finite verb.
+    is_subject_deprel = np.array([deprel in SUBJECT_RELS for deprel in arrays.deprel_vocab], dtype=bool)
+    is_subject = (is_subject_deprel[arrays.deprels] &
+                  has_finite_verb[word_sentences] &
+                  (arrays.heads == head_ids[word_sentences]))
+    subject_candidates = np.flatnonzero(is_subject)
+    subject_sentences, first_subjects = np.unique(word_sentences[subject_candidates], return_index=True)
+    subject_positions = np.full(arrays.sentence_count, -1)
+    subject_positions[subject_sentences] = subject_candidates[first_subjects]
+    has_subject = subject_positions >= 0
+    subject_ids = arrays.ids[subject_positions]
+
+    # AF clause: the subject is before the finite verb, but not the entire clause base.
+    is_AF = (has_finite_verb & has_subject & ~(subject_ids > head_ids) & 
+             ~(subject_positions < head_positions))
+    is_FA = has_finite_verb & ~is_AF
+
+    # The first two words.
+    lengths = arrays.sentence_lengths
+    first_words = get_first_word_codes(arrays.texts[sentence_starts])
+    second_words = get_first_word_codes(arrays.texts[np.minimum(sentence_starts + 1, arrays.word_count - 1)])
+    second_words[lengths < 2] = -1
+    first_is_sconj = arrays.upos[sentence_starts] == arrays.upos_code('SCONJ')
+    has_clause_base = clause_base_lengths > 0
+
+    conditions = [
+        is_AF & has_clause_base & is_any_of(first_words, ['vad', 'så']),
+        is_AF & is_any_of(first_words, ['att', 'så']) & first_is_sconj,
+        is_AF & is_any_of(first_words, ['bara']),
+        is_AF & (is_any_of(first_words, ['om']) | (is_any_of(first_words, ['tänk']) & is_any_of(second_words, ['om']))),
+        is_FA & has_clause_base & is_any_of(first_words, INTERROGATIVE_ADVERBS | INTERROGATIVE_PRONOUNS),
+        is_FA & has_clause_base,
+        is_FA & (head_ids == 1) & has_subject,
+        is_FA & (head_ids == 1),
+        is_FA
+    ]
+    clause_types = [
+        ClauseType.EXPRESSIVE,
+        ClauseType.EXPRESSIVE,
+        ClauseType.DESIDERATIVE,
+        ClauseType.SUPPOSITIVE,
+        ClauseType.QUESITIVE,
+        ClauseType.DECLARATIVE,
+        ClauseType.ROGATIVE,
+        ClauseType.DIRECTIVE,
+        ClauseType.DESIDERATIVE
+    ]
+    return np.select(conditions, [CLAUSE_TYPES.index(clause_type) for clause_type in clause_types],
+                     default=CLAUSE_TYPES.index(ClauseType.NONE))
+
+
+FIRST_WORDS = list(dict.fromkeys(['vad', 'så', 'att', 'bara', 'om', 'tänk'] + 
+                                 sorted(INTERROGATIVE_ADVERBS | INTERROGATIVE_PRONOUNS)))
+"""The (lower-cased) first words that the clause type depends on."""
+
+FIRST_WORD_CODES = {word: code for code, word in enumerate(FIRST_WORDS)}
+"""The code of each first word, i.e. its index in FIRST_WORDS."""
+
+
+def get_first_word_codes(texts: np.ndarray) -> np.ndarray:
+    """
+    Get the first word codes of the texts (see FIRST_WORDS), or -1 for other words.
+    """
+    # Lower-case all the texts in one go. The texts of words do not contain newlines.
+    lower_texts = '\n'.join(texts).lower().split('\n')
+    return np.fromiter(map(FIRST_WORD_CODES.get, lower_texts, itertools.repeat(-1)),
+                       dtype=np.int32, count=len(lower_texts))
+
+
+def is_any_of(word_codes: np.ndarray, words: Iterable[str]) -> np.ndarray:
+    """
+    Check which of the first word codes are any of the words.
+    """
+    matches = np.zeros(len(word_codes), dtype=bool)
+    for word in words:
+        matches |= word_codes == FIRST_WORD_CODES[word]
+    return matches
+
+
+def get_punctuations(arrays: docarrays.DocumentArrays) -> np.ndarray:
+    """
+    Get the major delimiting punctuations of all the sentences in the document arrays at once.
+    The punctuation codes (see PUNCTUATIONS) are returned.
+    """
+    last_texts = arrays.texts[arrays.sentence_offsets[1:] - 1]
+    none_code = PUNCTUATIONS.index(Punctuation.NONE)
+    return np.array([PUNCTUATION_CODES.get(text[-1], none_code) for text in last_texts], dtype=np.int32)
 
 
 def is_FA_clause(sentence : doc.Sentence) -> bool:
-    finite_verb = get_finite_verb(sentence)
+    analysis = analyze(sentence)
+    finite_verb = analysis.get_finite_verb()
     if finite_verb is None:
         return False
 
-    subject = get_subject(sentence)
+    subject = analysis.get_subject()
     if subject == None:
         return True # To make this work, we assume a subject-less sentence is AF.
 
@@ -274,12 +632,13 @@ def is_FA_clause(sentence : doc.Sentence) -> bool:
 
 
 def is_AF_clause(sentence : doc.Sentence) -> bool:
-    finite_verb = get_finite_verb(sentence)
+    analysis = analyze(sentence)
+    finite_verb = analysis.get_finite_verb()
     if finite_verb is None:
         return False
 
     # There needs to be a subject.
-    subject = get_subject(sentence)
+    subject = analysis.get_subject()
     if subject == None:
         return False
 
@@ -298,11 +657,7 @@ def get_head(sentence : doc.Sentence) -> doc.Word:
     """
     Retrieve the head word in the sentence.
     """
-    for word in sentence.words:
-        if word.head == 0:
-            return word
-    
-    raise ValueError('Sentence lacks a head.')
+    return analyze(sentence).get_head()
 
 
 def get_finite_verb(sentence : doc.Sentence) -> doc.Word|None:
@@ -310,17 +665,7 @@ def get_finite_verb(sentence : doc.Sentence) -> doc.Word|None:
     Retrieve the finite verb in the sentence. The finite verb must be the head in the 
     sentence.
     """
-    head = get_head(sentence)
-
-    # Make sure head is a verb.
-    if head.pos != 'VERB':
-        return None
-    
-    # Make sure finite verb.
-    if head.feats == None or 'VerbForm=Fin' not in head.feats:
-        return None
-
-    return head
+    return analyze(sentence).get_finite_verb()
 
 
 def starts_with_finite_verb(sentence: doc.Sentence) -> bool:
@@ -348,27 +693,14 @@ def get_subject(sentence: doc.Sentence) -> doc.Word|None:
     """
     Retrieve the subject of the sentence. This is a dependent of the sentence's head. 
     """
-
-    # Find finite verb.
-    finite_verb = get_finite_verb(sentence)
-    if finite_verb == None:
-        return None
-
-    # Find the subject of the finite verb.
-    for word in sentence.words:
-        if word.head == finite_verb.id and word.deprel in SUBJECT_RELS:
-            return word
-    
     # Todo: fix subject relation for copular verbs.
-    
-    # No subject found.
-    return None
+    return analyze(sentence).get_subject()
 
 def has_clause_base(sentence: doc.Sentence) -> bool:
     """
     Check if the sentence has a clause base. 
     """
-    return len(get_clause_base(sentence)) > 0
+    return analyze(sentence).get_clause_base_length() > 0
 
 
 def get_clause_base(sentence: doc.Sentence) -> list[doc.Word]:
@@ -376,28 +708,19 @@ def get_clause_base(sentence: doc.Sentence) -> list[doc.Word]:
     Retrieve the clause base (swe: satsbas) of the sentence, i.e. the words before the 
     finite verb.
     """
-    finite_verb = get_finite_verb(sentence)
-    if finite_verb is None:
-        raise ValueError('Sentence does not have a finite verb')
-    
-    clause_base = []
-    for word in sentence.words:
-        if word.id < finite_verb.id:
-            clause_base.append(word)
-    
-    return clause_base
+    return analyze(sentence).get_clause_base()
 
 
 def has_expressive_in_base(sentence: doc.Sentence) -> bool:
     """
     Check if there is an expressive clause part in the clause base of the sentence.
     """
-    clause_base = get_clause_base(sentence)
-    if len(clause_base) == 0:
+    analysis = analyze(sentence)
+    if analysis.get_clause_base_length() == 0:
         return False
 
     # Check if base starts with adverbial phrase.
-    if clause_base[0].text.lower() in ('vad', 'så'):
+    if analysis.first_text in ('vad', 'så'):
         return True
 
     # Todo: fix remaining variations of an expressive part.
@@ -409,7 +732,7 @@ def has_interrogative_base(sentence: doc.Sentence) -> bool:
     """
     Check if the clause base in the sentence is on interrogative form.
     """
-    first_word_text = sentence.words[0].text.lower()
+    first_word_text = analyze(sentence).first_text
     return first_word_text in INTERROGATIVE_ADVERBS or first_word_text in INTERROGATIVE_PRONOUNS
 
 
@@ -419,14 +742,14 @@ def starts_with_subjunctive(sentence: doc.Sentence, word: str) -> bool:
     """
     # See https://universaldependencies.org/sv/pos/SCONJ.html
 
-    first_word = sentence.words[0]
+    analysis = analyze(sentence)
 
     # Check that the word matches.
-    if first_word.text.lower() != word:
+    if analysis.first_text != word:
         return False
     
     # Check that it is subjunctive.
-    return first_word.pos == 'SCONJ'
+    return analysis.first_pos == 'SCONJ'
 
 
 def starts_with(sentence: doc.Sentence, words: str|list[str]) -> bool:
@@ -438,8 +761,7 @@ def starts_with(sentence: doc.Sentence, words: str|list[str]) -> bool:
 
     # Check single word.
     if type(words) == str:
-        first_word_text = sentence.words[0].text.lower()
-        return first_word_text == words
+        return analyze(sentence).first_text == words
     
     # Check several words.
     else:
@@ -471,25 +793,155 @@ def is_clause_base_the_subject(sentence: doc.Sentence, subject: doc.Word|None) -
     # Note: we assume that the entire base is a subject if the "subject word" is part
     # of it.
 
-    clause_base = get_clause_base(sentence)
-    return subject in clause_base
+    return analyze(sentence).is_in_clause_base(subject)
 
 
-def is_link(sentence: doc.Sentence) -> bool:
+class Detector:
     """
-    Check if the sentence is a URL link.
+    A lexical detector, which checks if the text of a sentence is of some kind, e.g. a link or
+    a date. A cheap pre-filter can rule out most texts before the (slower) detection function
+    runs, and the results can be cached by text. The detector counts how often it fires and 
+    how much time it takes.
+
+    Args:
+        name: the name of the detector.
+        detect: the detection function.
+        prefilter: returns False for texts that can not be detected. None to not pre-filter.
+        cache_size: the maximum number of cached results. 0 to not cache.
     """
-    pattern = re.compile(r'^(http|https|ftp)://[^\s/$.?#].[^\s]*$')
-    return pattern.match(sentence.text) is not None  # type: ignore
 
+    def __init__(self, name: str, detect: Callable[[str], bool], 
+                 prefilter: Callable[[str], bool]|None = None, cache_size = 0):
+        self.name = name
+        self.detect = detect
+        self.prefilter = prefilter
+        self.cache_size = cache_size
+        self.cache = {}  # type: dict[str, bool]
+        self.reset_stats()
 
-def is_date(sentence: doc.Sentence) -> bool:
+
+    def __call__(self, text: str) -> bool:
+        start = time.perf_counter()
+        self.calls += 1
+
+        if self.prefilter is not None and not self.prefilter(text):
+            self.filtered += 1
+            result = False
+
+        elif text in self.cache:
+            self.cache_hits += 1
+            result = self.cache[text]
+
+        else:
+            self.detections += 1
+            result = self.detect(text)
+
+            if self.cache_size > 0:
+                if len(self.cache) >= self.cache_size:
+                    self.cache.clear()
+                self.cache[text] = result
+
+        if result:
+            self.fires += 1
+        self.time += time.perf_counter() - start
+        return result
+    
+
+    def reset_stats(self):
+        """
+        Reset the counts and the time.
+        """
+        self.calls = 0
+        self.fires = 0
+        self.filtered = 0
+        self.cache_hits = 0
+        self.detections = 0
+        self.time = 0.0
+
+
+    def report(self) -> str:
+        """
+        Get a summary of the counts and the time of the detector.
+        """
+        time_per_call = 1e6 * self.time / self.calls if self.calls > 0 else 0.0
+        return (f'{self.name}: {self.calls} calls, {self.fires} fires, {self.filtered} filtered, '
+                f'{self.cache_hits} cache hits, {self.detections} detections, '
+                f'{1000 * self.time:.1f} ms ({time_per_call:.2f} us/call)')
+
+
+LINK_PATTERN = re.compile(r'^(http|https|ftp)://[^\s/$.?#].[^\s]*$')
+
+
+def detect_link(text: str) -> bool:
+    return LINK_PATTERN.match(text) is not None
+
+
+def may_be_link(text: str) -> bool:
+    return '://' in text
+
+
+def get_date_words() -> set[str]:
     """
-    Check if sentence is a date.
+    Get the (lower-cased) words that the date parser recognizes, e.g. names of months and 
+    weekdays.
     """
+    info = dt_parser.parserinfo
+    words = set()
+    for names in info.MONTHS + info.WEEKDAYS + info.HMS + info.AMPM + info.UTCZONE + info.PERTAIN:
+        if isinstance(names, str):
+            words.add(names.lower())
+        else:
+            words.update(name.lower() for name in names)
+    return words
+
+
+DATE_WORDS = get_date_words()
+
+DATE_WORD_PATTERN = re.compile(r'[^\W\d_]+')
+"""Matches the words of a text the same way as the date parser splits them."""
+
+
+def detect_date(text: str) -> bool:
     try:
-        dt_parser.parse(sentence.text)  # type: ignore
+        dt_parser.parse(text)
         return True
     except ValueError:
         return False
 
+
+def may_be_date(text: str) -> bool:
+    """
+    Check if the text can be parsed as a date. The date parser only accepts texts with a digit
+    or a word that it recognizes.
+    """
+    if any(char.isdigit() for char in text):
+        return True
+    return any(word.lower() in DATE_WORDS for word in DATE_WORD_PATTERN.findall(text))
+
+
+LINK_DETECTOR = Detector('link', detect_link, prefilter=may_be_link)
+DATE_DETECTOR = Detector('date', detect_date, prefilter=may_be_date)
+
+DETECTORS = [LINK_DETECTOR, DATE_DETECTOR]
+"""The detectors used by the classifiers."""
+
+
+def report_detectors() -> str:
+    """
+    Get a summary of the counts and the times of all the detectors.
+    """
+    return '\n'.join(detector.report() for detector in DETECTORS)
+
+
+def is_link(sentence: doc.Sentence) -> bool:
+    """
+    Check if the sentence is a URL link.
+    """
+    return LINK_DETECTOR(sentence.text)  # type: ignore
+
+
+def is_date(sentence: doc.Sentence) -> bool:
+    """
+    Check if sentence is a date.
+    """
+    return DATE_DETECTOR(sentence.text)  # type: ignore
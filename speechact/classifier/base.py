@@ -2,31 +2,199 @@
 Base code for the classifier modules.
 """
 
-import stanza.models.common.doc as doc
+from __future__ import annotations
+import typing
 import abc
+import numpy as np
+import speechact.annotate as anno
+import speechact.conllu as conllu
 import speechact.corpus as corp
+import speechact.parallel as parallel
+import speechact.preprocess as pre
 import collections as coll
+from typing import Generator
+from typing import Iterable
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+LABELS = anno.SpeechActLabels.get_labels()
+"""The speech act labels. The label code of a label is its index in this list."""
+
+NO_LABEL = -1
+"""The label code for a missing label (None)."""
+
+LABEL_CODES = {label: code for code, label in enumerate(LABELS)}
+
+
+def to_codes(labels: Iterable[str|None]) -> np.ndarray:
+    """
+    Convert speech act labels to label codes. Missing labels get the code NO_LABEL.
+    """
+    return np.array([NO_LABEL if label == None else LABEL_CODES[label] for label in labels], 
+                    dtype=np.int8)
+
+
+def to_labels(codes: Iterable[int]) -> list[str|None]:
+    """
+    Convert label codes to speech act labels. The code NO_LABEL is converted to None.
+    """
+    return [None if code == NO_LABEL else LABELS[code] for code in codes]
+
+
+def one_hot(codes: np.ndarray) -> np.ndarray:
+    """
+    Get per-class scores that are 1 for the label code and 0 otherwise. A missing label has
+    all scores 0.
+    """
+    scores = np.zeros((len(codes), len(LABELS)), dtype=np.float32)
+    has_label = codes != NO_LABEL
+    scores[np.flatnonzero(has_label), codes[has_label]] = 1
+    return scores
+
 
 class Classifier(abc.ABC):
     """
     Base class for the speech act classifiers.
+
+    The predictions are computed by predict_sentence() or predict_batch(), which do not 
+    modify the sentences. The classify methods also write the predictions to the 
+    'speech_act' property of the sentences, which is stored as a comment.
+
+    Subclasses implement predict_sentence(). Older subclasses that only implement
+    classify_sentence() still work, since predict_sentence() then calls it.
     """
 
-    def classify_document(self, document: doc.Document):
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
+        """
+        Predict the speech act label of a single sentence, without assigning it
+        to the sentence.
+
+        By default, the classify_sentence() of a subclass that overrides it is
+        called, and the speech act it assigns is read back. The comments of the
+        sentence are then restored.
+        """
+        if type(self).classify_sentence is Classifier.classify_sentence:
+            raise NotImplementedError(f'{type(self).__name__} must implement predict_sentence()')
+
+        comments = list(sentence.comments)
+        self.classify_sentence(sentence)
+        speech_act = sentence.speech_act  # type: ignore
+        while len(sentence.comments) > 0:
+            del sentence.comments[-1]
+        for comment in comments:
+            sentence.comments.append(comment)
+        return speech_act
+
+
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        """
+        Get the features (see features.py) that are needed for classifying the
+        sentence, as far as can be told from the features that it already has.
+        By default, no features are needed.
+        """
+        return set()
+
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes (see LABELS), 
+        without assigning them to the sentences. If return_scores, the per-class
+        scores are also returned, as an array with one column per label. 
+        Classifiers without scores give 1 for the predicted label.
+        """
+        codes = to_codes([self.predict_sentence(sentence) for sentence in sentences])
+        if return_scores:
+            return codes, one_hot(codes)
+        return codes
+
+
+    def classify_document(self, document: doc.Document, jobs=1):
         """
         Classify all the sentences in the document. This assigns each
         sentence with a value to the 'speech_act' property.
+
+        If jobs > 1, the sentences are classified in parallel worker processes.
+        The classifier is sent to each worker once per call, so for a whole 
+        corpus, classify_sentences() is faster.
+        """
+        if jobs <= 1:
+            codes = self.predict_batch(document.sentences)
+        else:
+            sentence_lines = [sentence_to_lines(sentence) for sentence in document.sentences]
+            codes = np.fromiter(parallel.adaptive_map(predict_lines, self, sentence_lines, jobs,
+                                                      sizer=parallel.ChunkSizer(min_size=10)),
+                                dtype=np.int8, count=len(sentence_lines))
+
+        for sentence, speech_act in zip(document.sentences, to_labels(codes)):  # type: ignore
+            sentence.speech_act = speech_act  # type: ignore
+
+
+    def classify_sentences(self, sentences: Iterable[corp.Sentence],
+                           jobs=1) -> Generator[tuple[corp.Sentence, str|None], None, None]:
+        """
+        Classify the CoNLL-U sentences, e.g. from Corpus.sentences(), and yield 
+        each sentence with its speech act, in the same order as the sentences.
+        The sentences themselves are not modified.
+
+        The sentences are parsed and classified in chunks. If jobs > 1, this is 
+        done in parallel worker processes, and the classifier is only sent to 
+        each worker once.
         """
-        for sentence in document.sentences:
-            self.classify_sentence(sentence)
+        pending = coll.deque()  # type: coll.deque[corp.Sentence]
+
+        def sentence_lines() -> Generator[list[str], None, None]:
+            for sentence in sentences:
+                pending.append(sentence)
+                yield sentence.sentence_lines
+
+        for code in parallel.adaptive_map(predict_lines, self, sentence_lines(), jobs,
+                                          sizer=parallel.ChunkSizer(min_size=10)):
+            yield pending.popleft(), None if code == NO_LABEL else LABELS[code]
+
 
-    @abc.abstractmethod
     def classify_sentence(self, sentence: doc.Sentence):
         """
         Classify a single sentences. This assigns the sentence with a
         value to the 'speech_act' property.
         """
-        pass
+        sentence.speech_act = self.predict_sentence(sentence)  # type: ignore
+
+
+    def predict_lines(self, sentence_lines: list[list[str]]) -> np.ndarray:
+        """
+        Predict the label codes of CoNLL-U sentences, given by their lines (without the
+        empty line after each sentence). By default, the lines are parsed as a Stanza
+        document, which is classified with predict_batch(). Classifiers that can classify
+        the lines without parsing them override this.
+        """
+        lines = []
+        for sentence in sentence_lines:
+            lines += sentence
+            lines.append('\n')
+
+        document = pre.parse_doc(lines)
+        assert len(document.sentences) == len(sentence_lines), 'sentences without words cannot be classified'
+        return self.predict_batch(document.sentences)  # type: ignore
+
+
+def predict_lines(classifier: Classifier, sentence_lines: list[list[str]]) -> np.ndarray:
+    """
+    Predict the label code of each CoNLL-U sentence, given by its lines (see
+    Classifier.predict_lines()). This is run by the worker processes of
+    Classifier.classify_sentences().
+    """
+    return classifier.predict_lines(sentence_lines)
+
+
+def sentence_to_lines(sentence: doc.Sentence) -> list[str]:
+    """
+    Get the CoNLL-U lines of a Stanza Sentence, including its comments, with 
+    trailing newlines.
+    """
+    return ([comment + '\n' for comment in sentence.comments] + 
+            [line + '\n' for line in conllu.sentence_to_lines(sentence)])
 
 
 class MostFrequentClassifier(Classifier):
@@ -57,8 +225,8 @@ class MostFrequentClassifier(Classifier):
         self.most_common = self.class_frequencies.most_common()[0][0]
     
 
-    def classify_sentence(self, sentence: doc.Sentence):
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
         """
-        Classify the sentence with the most frequent speech act.
+        Predict the most frequent speech act.
         """
-        sentence.speech_act = self.most_common  # type: ignore
+        return self.most_common
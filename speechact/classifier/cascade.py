@@ -0,0 +1,198 @@
+"""
+A cascade of classifiers, where cheap classifiers (e.g. the punctuation and rule-based
+classifiers) are tried first, and only the sentences that they are not confident about are
+forwarded to an expensive classifier (e.g. the embedding classifier).
+
+The confidence of a prediction is its score from predict_batch(return_scores=True). For the
+trained rule-based classifiers, this is the fraction of the training sentences of the matching
+rule that had the predicted speech act. Sentences that match no rule have no confidence, and
+are forwarded.
+"""
+
+from __future__ import annotations
+import typing
+from . import base
+import numpy as np
+import time
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+class Stage:
+    """
+    A cheap classifier in a cascade, and when to accept its predictions.
+
+    Args:
+        classifier: the classifier.
+        threshold: the minimum confidence for accepting a prediction.
+        labels: the speech acts that can be accepted, or None to accept all. E.g. only the
+            questions of a punctuation classifier are reliable.
+        name: the name of the stage in reports. The name of the classifier class by default.
+    """
+
+    def __init__(self, classifier: base.Classifier, threshold=0.9, labels: list[str]|None = None,
+                 name: str|None = None) -> None:
+        self.classifier = classifier
+        self.threshold = threshold
+        self.labels = labels
+        self.name = name if name != None else type(classifier).__name__
+        self.reset_stats()
+
+
+    def accept(self, codes: np.ndarray, scores: np.ndarray, threshold: float|None = None) -> np.ndarray:
+        """
+        Check which predictions are confident enough to be accepted, with the threshold of
+        the stage or the given threshold. Missing predictions (NO_LABEL) are never accepted, so
+        those sentences go on to the next stage.
+        """
+        if threshold == None:
+            threshold = self.threshold
+
+        accepted = (scores.max(axis=1) >= threshold) & (codes != base.NO_LABEL)
+        if self.labels != None:
+            accepted &= np.isin(codes, base.to_codes(self.labels))
+        return accepted
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the time.
+        """
+        self.sentences = 0
+        self.accepted = 0
+        self.time = 0.0
+
+
+class CascadeClassifier(base.Classifier):
+    """
+    Classify the sentences with each stage in turn. A sentence gets the speech act of the
+    first stage that is confident about it. The remaining sentences are classified by the
+    fallback classifier, all at once, so it can classify them in batches. The cascade counts
+    how many sentences each stage accepts and how much time it takes.
+
+    Args:
+        stages: the cheap classifiers, in the order they are tried.
+        fallback: the expensive classifier.
+    """
+
+    def __init__(self, stages: list[Stage], fallback: base.Classifier) -> None:
+        super().__init__()
+        self.stages = stages
+        self.fallback = Stage(fallback, threshold=0.0, name=f'{type(fallback).__name__} (fallback)')
+
+
+    def set_thresholds(self, thresholds: float|list[float]):
+        """
+        Set the confidence threshold of all stages, or of each stage.
+        """
+        if isinstance(thresholds, (int, float)):
+            thresholds = [thresholds] * len(self.stages)
+
+        for stage, threshold in zip(self.stages, thresholds, strict=True):
+            stage.threshold = threshold
+
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
+        return base.to_labels(self.predict_batch([sentence]))[0]  # type: ignore
+
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes. The scores are those of the
+        stage that classified each sentence.
+        """
+        codes = np.full(len(sentences), base.NO_LABEL, dtype=np.int8)
+        scores = np.zeros((len(sentences), len(base.LABELS)), dtype=np.float32)
+        remaining = np.arange(len(sentences))
+
+        for stage in self.stages + [self.fallback]:
+            if len(remaining) == 0:
+                break
+
+            # The fallback accepts all the predictions, since its threshold is 0.
+            start = time.perf_counter()
+            stage_sentences = [sentences[index] for index in remaining]
+            stage_codes, stage_scores = stage.classifier.predict_batch(stage_sentences, return_scores=True)  # type: ignore
+            accepted = stage.accept(stage_codes, stage_scores)
+
+            codes[remaining[accepted]] = stage_codes[accepted]
+            scores[remaining[accepted]] = stage_scores[accepted]
+
+            stage.sentences += len(remaining)
+            stage.accepted += int(accepted.sum())
+            stage.time += time.perf_counter() - start
+            remaining = remaining[~accepted]
+
+        if return_scores:
+            return codes, scores
+        return codes
+
+
+    def evaluate_thresholds(self, sentences: list[doc.Sentence], correct_codes: np.ndarray,
+                            thresholds: list[float]) -> list[dict[str, float]]:
+        """
+        Evaluate the accuracy/throughput trade-off of the thresholds, where each threshold is
+        used for all the stages. Each stage and the fallback are run once on all the sentences,
+        and the cascade is then simulated for each threshold. The time of the cascade is 
+        estimated from the time per sentence of each stage and the number of sentences that
+        reach it.
+
+        For each threshold, the accuracy, the fraction of sentences forwarded to the fallback,
+        the estimated time and the estimated throughput (sentences/sec) are returned.
+        """
+        stage_results = []
+        for stage in self.stages + [self.fallback]:
+            start = time.perf_counter()
+            codes, scores = stage.classifier.predict_batch(sentences, return_scores=True)  # type: ignore
+            time_per_sentence = (time.perf_counter() - start) / max(len(sentences), 1)
+            stage_results.append((stage, codes, scores, time_per_sentence))
+
+        fallback_codes = stage_results[-1][1]
+        fallback_time = stage_results[-1][3]
+
+        evaluations = []
+        for threshold in thresholds:
+            predicted = np.full(len(sentences), base.NO_LABEL, dtype=np.int8)
+            remaining = np.ones(len(sentences), dtype=bool)
+            total_time = 0.0
+            for stage, codes, scores, time_per_sentence in stage_results[:-1]:
+                total_time += time_per_sentence * remaining.sum()
+                accepted = remaining & stage.accept(codes, scores, threshold)
+                predicted[accepted] = codes[accepted]
+                remaining &= ~accepted
+
+            total_time += fallback_time * remaining.sum()
+            predicted[remaining] = fallback_codes[remaining]
+
+            evaluations.append({
+                'threshold': threshold,
+                'accuracy': float(np.mean(predicted == correct_codes)),
+                'forwarded': float(np.mean(remaining)),
+                'time': float(total_time),
+                'throughput': float(len(sentences) / total_time) if total_time > 0 else float('inf')
+            })
+        
+        return evaluations
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the times of all the stages.
+        """
+        for stage in self.stages + [self.fallback]:
+            stage.reset_stats()
+
+
+    def report(self) -> str:
+        """
+        Get a summary of how many sentences each stage classified, and how long it took.
+        """
+        total = self.stages[0].sentences if len(self.stages) > 0 else self.fallback.sentences
+        lines = []
+        for stage in self.stages + [self.fallback]:
+            share = 100 * stage.accepted / total if total > 0 else 0.0
+            time_per_sentence = 1e6 * stage.time / stage.sentences if stage.sentences > 0 else 0.0
+            lines.append(f'{stage.name}: {stage.sentences} sentences, {stage.accepted} accepted ({share:.1f}%), '
+                         f'{1000 * stage.time:.1f} ms ({time_per_sentence:.1f} us/sentence)')
+        return '\n'.join(lines)
@@ -0,0 +1,183 @@
+"""
+Documents encoded as NumPy column arrays, for classifying all the sentences of a document at
+once with array operations instead of one stanza Sentence at a time. The words of all the
+sentences are stored in flat arrays, and the sentences are given by their offsets in these.
+
+A document can be encoded from a stanza Document, or directly from its CoNLL-U lines, which
+skips building the stanza objects entirely.
+"""
+
+from __future__ import annotations
+import typing
+import itertools
+import numpy as np
+from . import rulebased as rb
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+class DocumentArrays:
+    """
+    The words of a document as column arrays. Word i belongs to the sentence s for which
+    sentence_offsets[s] <= i < sentence_offsets[s + 1].
+
+    Args:
+        sentence_offsets: the index of the first word of each sentence, followed by the number
+            of words.
+        ids: the id of each word.
+        texts: the text of each word (an object array of str).
+        upos: the code of the UPOS-tag of each word, i.e. its index in upos_vocab.
+        upos_vocab: the UPOS-tags.
+        feats_flags: the feats of each word as bit flags (see rulebased.get_feats_flags).
+        heads: the head id of each word, or -1 for words without a head.
+        deprels: the code of the dependency relation of each word, i.e. its index in
+            deprel_vocab.
+        deprel_vocab: the dependency relations.
+    """
+
+    def __init__(self, sentence_offsets: np.ndarray, ids: np.ndarray, texts: np.ndarray,
+                 upos: np.ndarray, upos_vocab: list[str], feats_flags: np.ndarray,
+                 heads: np.ndarray, deprels: np.ndarray, deprel_vocab: list[str]) -> None:
+        self.sentence_offsets = sentence_offsets
+        self.ids = ids
+        self.texts = texts
+        self.upos = upos
+        self.upos_vocab = upos_vocab
+        self.feats_flags = feats_flags
+        self.heads = heads
+        self.deprels = deprels
+        self.deprel_vocab = deprel_vocab
+
+
+    @staticmethod
+    def from_columns(sentence_lengths: list[int]|np.ndarray, ids: list, texts: list[str],
+                     upos: list[str], feats: list[str], heads: list,
+                     deprels: list[str]) -> 'DocumentArrays':
+        """
+        Encode the column values of all the words. The ids and heads can be given as ints or
+        strings, and missing values as '_'.
+        """
+        sentence_offsets = np.zeros(len(sentence_lengths) + 1, dtype=np.int64)
+        np.cumsum(sentence_lengths, out=sentence_offsets[1:])
+
+        # The feats only have a few distinct values, so the flags are computed once for each.
+        feats_codes, feats_vocab = encode(feats)
+        feats_values = np.array([rb.get_feats_flags(feats) for feats in feats_vocab], dtype=np.uint8)
+
+        upos_codes, upos_vocab = encode(upos)
+        deprel_codes, deprel_vocab = encode(deprels)
+
+        texts_array = np.empty(len(texts), dtype=object)
+        texts_array[:] = texts
+
+        return DocumentArrays(sentence_offsets,
+                              to_ints(ids),
+                              texts_array,
+                              upos_codes,
+                              upos_vocab,
+                              feats_values[feats_codes],
+                              to_ints(heads),
+                              deprel_codes,
+                              deprel_vocab)
+
+
+    @staticmethod
+    def from_document(document: doc.Document) -> 'DocumentArrays':
+        """
+        Encode the words of a stanza Document.
+        """
+        sentence_lengths = []
+        ids, texts, upos, feats, heads, deprels = [], [], [], [], [], []
+        for sentence in document.sentences:
+            sentence_lengths.append(len(sentence.words))
+            for word in sentence.words:
+                ids.append(word.id)
+                texts.append(word.text)
+                upos.append(word.upos or '_')
+                feats.append(word.feats or '_')
+                heads.append('_' if word.head is None else word.head)
+                deprels.append(word.deprel or '_')
+
+        return DocumentArrays.from_columns(sentence_lengths, ids, texts, upos, feats, heads, deprels)
+
+
+    @staticmethod
+    def from_lines(lines: list[str]) -> 'DocumentArrays':
+        """
+        Encode the words of a document from its CoNLL-U lines, as given by
+        Corpus.batched_lines. Multi-word tokens and empty words are skipped, the same way as
+        they are by stanza.
+        """
+        # Find the word lines, and the empty lines that end the sentences.
+        lines = [line for line in lines if line[0] != '#']
+        is_empty = np.array(lines, dtype=object) == '\n'
+        empty_positions = np.flatnonzero(np.append(is_empty, True))
+        sentence_lengths = np.diff(empty_positions, prepend=-1) - 1
+        sentence_lengths = sentence_lengths[sentence_lengths > 0]
+
+        # Split all the word lines into fields in one go.
+        text = ''.join(itertools.compress(lines, ~is_empty))
+        fields = text.replace('\n', '\t').split('\t')
+        del fields[-1]  # After the newline of the last line.
+        columns = [fields[index::10] for index in range(10)]
+
+        # Skip the multi-word tokens (e.g. '1-2') and empty words (e.g. '1.1').
+        if not ''.join(columns[0]).isdigit():
+            is_word = np.array([id.isdigit() for id in columns[0]], dtype=bool)
+            sentence_index = np.repeat(np.arange(len(sentence_lengths)), sentence_lengths)
+            sentence_lengths = np.bincount(sentence_index[is_word], minlength=len(sentence_lengths))
+            columns = [list(itertools.compress(column, is_word)) for column in columns]
+
+        return DocumentArrays.from_columns(sentence_lengths, columns[0], columns[1], columns[3], 
+                                           columns[5], columns[6], columns[7])
+
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_offsets) - 1
+
+
+    @property
+    def word_count(self) -> int:
+        return len(self.ids)
+
+
+    @property
+    def sentence_lengths(self) -> np.ndarray:
+        return np.diff(self.sentence_offsets)
+
+
+    @property
+    def word_sentences(self) -> np.ndarray:
+        """
+        The index of the sentence of each word.
+        """
+        return np.repeat(np.arange(self.sentence_count), self.sentence_lengths)
+
+
+    def upos_code(self, upos: str) -> int:
+        """
+        Get the code of the UPOS-tag, or -1 if no word has it.
+        """
+        return self.upos_vocab.index(upos) if upos in self.upos_vocab else -1
+
+
+def encode(values: list) -> tuple[np.ndarray, list]:
+    """
+    Encode the values as codes. The code of a value is its index in the returned vocabulary,
+    which has the distinct values in the order they first occur.
+    """
+    vocab = list(dict.fromkeys(values))
+    codes = {value: code for code, value in enumerate(vocab)}
+    return np.fromiter(map(codes.__getitem__, values), dtype=np.int32, count=len(values)), vocab
+
+
+def to_ints(values: list) -> np.ndarray:
+    """
+    Convert ints, or strings of ints, to an int array. Missing values ('_') are converted to -1.
+    """
+    if len(values) > 0 and isinstance(values[0], str) and '_' not in values:
+        # Parse all the strings in one go.
+        return np.fromstring(' '.join(values), dtype=np.int32, sep=' ')
+
+    return np.array([-1 if value == '_' else int(value) for value in values], dtype=np.int32)
@@ -2,21 +2,31 @@
 Classify speech acts from SBERT sentence embeddings.
 """
 
+from __future__ import annotations
+import typing
 from . import base
-import stanza.models.common.doc as doc
+from . import embstore
+import speechact.batching as batching
+import hashlib
+import os
 import speechact.annotate as anno
 import speechact.corpus as corp
 import speechact.preprocess as pre
-import pandas as pd
+import speechact.registry as registry
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
 import torch.utils.data as tdat
-import sentence_transformers as stf
 from typing import Generator
 import collections as col
+from typing import Any
 from typing import Callable
 
+if typing.TYPE_CHECKING:
+    import sentence_transformers as stf
+    import stanza.models.common.doc as doc
+
 NetworkFactory = Callable[[int, int], nn.Module]
 
 SPEECH_ACTS = [
@@ -29,6 +39,25 @@ SPEECH_ACTS = [
 The speech act labels to classify. Note that the HYPOTHESIS is not included.
 """
 
+SPEECH_ACT_CODES = base.to_codes(SPEECH_ACTS)
+"""The label code (see base.LABELS) of each class of the network."""
+
+EMBEDDING_MODEL = 'KBLab/sentence-bert-swedish-cased'
+"""The SBERT model that computes the sentence embeddings."""
+
+PRECISIONS = ['float32', 'int8', 'bfloat16', 'auto']
+"""
+The precisions of the embedding model. int8 is dynamic quantization of the linear layers, which
+is CPU only. auto is bfloat16 if the CPU supports it, and int8 otherwise.
+"""
+
+WARM_UP_TEXTS = [
+    'Hej!',
+    'Hur mår du idag?',
+    'Jag tror inte att det kommer att gå, men vi kan försöka igen imorgon om du vill.'
+]
+"""Sentences of different lengths that are classified when the classifier is loaded."""
+
 class CorpusDataset(tdat.Dataset):
     """
     A Pytorch compatible dataset for a speech act labeled Corpus.
@@ -113,6 +142,90 @@ def sigmoid_hidden_layer(input_size: int, output_size: int) -> nn.Module:
         nn.Softmax(dim=1)
     )
 
+
+def hidden_layer(hidden_size: int, dropout=0.0) -> NetworkFactory:
+    """
+    Get a factory for a network with one ReLU hidden layer of the given size, and optionally
+    dropout after it.
+    """
+    def factory(input_size: int, output_size: int) -> nn.Module:
+        layers = [nn.Linear(input_size, hidden_size), nn.ReLU()]  # type: list[nn.Module]
+        if dropout > 0:
+            layers.append(nn.Dropout(dropout))
+        layers.append(nn.Linear(hidden_size, output_size))
+        return nn.Sequential(*layers)
+
+    return factory
+
+
+def model_fingerprint(model: stf.SentenceTransformer, model_name: str) -> str:
+    """
+    Get a fingerprint that identifies the embeddings of an SBERT model. This is a hash of the 
+    name, the configuration and some of the weights of the model, so a different version of a
+    model with the same name gets a different fingerprint.
+    """
+    parameters = list(model.parameters())
+    fingerprint = hashlib.blake2b(digest_size=8)
+    fingerprint.update(model_name.encode('utf-8'))
+    fingerprint.update(f'{model.get_sentence_embedding_dimension()} {model.max_seq_length} '
+                       f'{sum(parameter.numel() for parameter in parameters)}'.encode('utf-8'))
+    for parameter in parameters[:1] + parameters[-1:]:
+        fingerprint.update(parameter.detach().cpu().float().numpy().tobytes())
+
+    return f'{os.path.basename(model_name.rstrip("/"))}-{fingerprint.hexdigest()}'
+
+
+def bfloat16_supported() -> bool:
+    """
+    Check if the CPU has native bfloat16 instructions (AVX-512 BF16 or AMX). Without them,
+    bfloat16 is emulated and slower than float32.
+    """
+    return torch.cpu._is_avx512_bf16_supported() or torch.cpu._is_amx_tile_supported()
+
+
+def quantize_model(model: nn.Module, precision: str) -> nn.Module:
+    """
+    Convert a model to the precision (see PRECISIONS), in place. For int8, the weights of the
+    linear layers are quantized, and their activations are quantized dynamically at each call.
+    """
+    assert precision in PRECISIONS, f'Unknown precision: {precision}'
+    if precision == 'auto':
+        precision = 'bfloat16' if bfloat16_supported() else 'int8'
+
+    if precision == 'int8':
+        import torch.ao.quantization as quant
+        return quant.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    if precision == 'bfloat16':
+        return model.to(torch.bfloat16)
+    return model
+
+
+def sentence_tokenizer(model: stf.SentenceTransformer) -> Any:
+    """
+    Get a copy of the fast tokenizer (of the tokenizers library) of the SBERT model, which
+    truncates to the maximum sequence length and does not pad, for tokenizing single sentences.
+    None if the model does not have a fast tokenizer.
+    """
+    backend = getattr(model.tokenizer, 'backend_tokenizer', None)
+    if backend == None:
+        return None
+
+    import tokenizers
+    tokenizer = tokenizers.Tokenizer.from_str(backend.to_str())
+    tokenizer.enable_truncation(model.max_seq_length)
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def ends_with_softmax(network: nn.Module) -> bool:
+    """
+    Check if the outputs of the network are already softmax probabilities.
+    """
+    if isinstance(network, nn.Sequential) and len(network) > 0:
+        return isinstance(network[-1], nn.Softmax)
+    return isinstance(network, nn.Softmax)
+
+
 class EmbeddingClassifier (base.Classifier):
     """
     Classifies sentences based on their embeddings. The sentence embeddings are computed using a Swedish
@@ -121,14 +234,46 @@ class EmbeddingClassifier (base.Classifier):
     Args: 
         device: The name of the device to run the models on.
         network_factory: a callable function that creates the classification network. 
+        model_name: the name or path of the SBERT model.
+        embedding_store: a directory for storing the computed embeddings (see embstore.py), 
+            so that the embeddings of a text are only computed once. None to not store them.
+        bucketer: batches the sentences of predict_batch() by their token lengths (see 
+            batching.py). None to batch a fixed number of sentences in their original order.
+        precision: the precision of the embedding model (see PRECISIONS). int8 is for CPU
+            inference only. The classification network is always float32.
+        warm_up: classify WARM_UP_TEXTS when the classifier is created, since the first calls
+            of the models are slow (memory allocation and the selection of the kernels).
+
+    Single sentences (get_speech_act_for() and predict_sentence()) are classified on a path
+    that is optimized for latency: the text is tokenized by the fast tokenizer directly into
+    reused buffers, and the modules of the SBERT model are called without the batching of
+    SentenceTransformer.encode(). This path is not thread-safe, since the buffers are shared.
     """
 
-    def __init__(self, device='mps', network_factory: NetworkFactory|None = None) -> None:  # mps is the macbook's GPU.
+    def __init__(self, device='mps', network_factory: NetworkFactory|None = None,  # mps is the macbook's GPU.
+                 model_name=EMBEDDING_MODEL, embedding_store: str|None = None,
+                 bucketer: batching.LengthBucketer|None = None, precision='float32',
+                 warm_up=True) -> None:
         super().__init__()
+        assert precision in PRECISIONS, f'Unknown precision: {precision}'
+        assert precision not in ['int8', 'auto'] or device == 'cpu', f'{precision} is only supported on the CPU'
         self.device = device
-
-        # Load embedding model.
-        self.emb_model = stf.SentenceTransformer('KBLab/sentence-bert-swedish-cased', device=device)
+        self.bucketer = bucketer
+        self.precision = precision
+
+        # Get the embedding model in the precision. It is shared with the other classifiers
+        # that use the same model (see registry.py), and must not be changed.
+        self.emb_model = registry.sbert(model_name, device=device, precision=precision)
+
+        # Create the embedding store for this model. The embeddings of each precision are
+        # stored separately.
+        self.embedding_store = None  # type: embstore.EmbeddingStore|None
+        if embedding_store != None:
+            fingerprint = model_fingerprint(self.emb_model, model_name)
+            if precision != 'float32':
+                fingerprint += f'-{precision}'
+            self.embedding_store = embstore.EmbeddingStore(embedding_store, fingerprint,
+                                                           self.emb_model.get_sentence_embedding_dimension())  # type: ignore
 
         # Create the neural network.
         input_size: int = self.emb_model.get_sentence_embedding_dimension() # type: ignore
@@ -142,30 +287,118 @@ class EmbeddingClassifier (base.Classifier):
         
         # Run on device.
         self.cls_model = self.cls_model.to(device)
+        self.cls_model.eval()
+
+        # The buffers of the single-sentence path, for the longest sentence. The token ids are
+        # written to the buffer through a numpy view, so no tensors are created per sentence.
+        max_length = self.emb_model.max_seq_length
+        self.sentence_tokenizer = sentence_tokenizer(self.emb_model)
+        self.input_ids = torch.zeros((1, max_length), dtype=torch.long)
+        self.attention_mask = torch.ones((1, max_length), dtype=torch.long).to(device)
+        self.token_type_ids = torch.zeros((1, max_length), dtype=torch.long).to(device)
+
+        if warm_up:
+            for text in WARM_UP_TEXTS:
+                self.get_speech_act_for(text)
+
 
+    def predict_sentence(self, sentence: doc.Sentence) -> str:
+        return self.get_speech_act_for(sentence)
 
-    def classify_document(self, document: doc.Document):
-        doc_dataset = DocumentDataset(document)
+
+    def predict_batch(self, sentences: list[doc.Sentence], return_scores=False,
+                      batch_size=32) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes, embedding batch_size sentences
+        at a time, or the batches of the bucketer if there is one. The scores are the class 
+        probabilities of the network. The labels that are not classified (see SPEECH_ACTS) have
+        the probability 0.
+        """
+        codes = np.empty(len(sentences), dtype=np.int8)
+        scores = np.zeros((len(sentences), len(base.LABELS)), dtype=np.float32) if return_scores else None
+        texts = [sentence.text for sentence in sentences]
+
+        if self.bucketer != None:
+            batches = self.bucketer.batches(self.token_lengths(texts))
+        else:
+            batches = batching.fixed_batches(len(texts), batch_size)
 
         self.cls_model.eval()
         with torch.no_grad():
-            for batch in doc_dataset.batched(32):
-                texts = [sent.text for sent in batch]
-
-                embeddings = self.emb_model.encode(texts, convert_to_numpy=False,  # type: ignore
-                                                   convert_to_tensor=True)
+            for batch in batches:
+                embeddings = self.encode([texts[index] for index in batch])
                 outputs = self.cls_model(embeddings)
+                codes[batch] = SPEECH_ACT_CODES[torch.argmax(outputs, dim=1).cpu().numpy()]
 
-                # Assign outputs to sentences.
-                for output, sentence in zip(outputs, batch):
-                    class_index = torch.argmax(output)
-                    speech_act = SPEECH_ACTS[class_index]
-                    sentence.speech_act = speech_act  # type: ignore
-                
+                if scores is not None:
+                    if not ends_with_softmax(self.cls_model):
+                        outputs = torch.softmax(outputs, dim=1)
+                    scores[batch[:, None], SPEECH_ACT_CODES] = outputs.cpu().numpy()
 
-    def classify_sentence(self, sentence: doc.Sentence):
-        speech_act = self.get_speech_act_for(sentence)
-        sentence.speech_act = speech_act  # type: ignore
+        if scores is not None:
+            return codes, scores
+        return codes
+
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        """
+        Get the number of tokens of each text for the embedding model, including the special
+        tokens, and at most the maximum sequence length of the model.
+        """
+        max_length = self.emb_model.max_seq_length
+        return [min(len(ids), max_length) for ids in self.emb_model.tokenizer(texts)['input_ids']]  # type: ignore
+
+
+    def encode(self, texts: list[str]) -> torch.Tensor:
+        """
+        Compute the embeddings of the texts, as a tensor on the device. The texts are encoded
+        as one batch. If there is an embedding store, the stored embeddings are used, and only 
+        the new texts are encoded.
+        """
+        batch_size = max(len(texts), 1)
+        if self.embedding_store == None:
+            # Newer versions of sentence-transformers encode in inference mode, and inference
+            # tensors cannot be used for training the network, so they are cloned.
+            embeddings = self.emb_model.encode(texts, batch_size=batch_size, convert_to_numpy=False,  # type: ignore
+                                               convert_to_tensor=True)
+            if embeddings.dtype != torch.float32:
+                return embeddings.float()
+            return embeddings.clone() if embeddings.is_inference() else embeddings
+
+        embeddings = self.embedding_store.encode(texts, lambda new_texts: self.emb_model.encode(new_texts, batch_size=batch_size))  # type: ignore
+        return torch.from_numpy(embeddings).to(self.device)
+
+
+    def tokenize(self, texts: list[str]) -> dict[str, Any]:
+        """
+        Tokenize the texts for the embedding model, as one padded batch. The tokens can be
+        classified with predict_tokens(), e.g. so that the tokenization runs on another thread.
+        The embedding store is not used.
+        """
+        # The tokenize method is called preprocess in newer versions of sentence-transformers.
+        preprocess = getattr(self.emb_model, 'preprocess', None) or self.emb_model.tokenize
+        return preprocess(texts)
+
+
+    def predict_tokens(self, tokens: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of a batch of tokens from tokenize(). The label codes and the 
+        scores are returned, as in predict_batch().
+        """
+        features = {key: value.to(self.device) if isinstance(value, torch.Tensor) else value 
+                    for key, value in tokens.items()}
+
+        self.cls_model.eval()
+        with torch.inference_mode():
+            embeddings = self.emb_model(features)['sentence_embedding'].float()
+            outputs = self.cls_model(embeddings)
+            if not ends_with_softmax(self.cls_model):
+                outputs = torch.softmax(outputs, dim=1)
+            outputs = outputs.cpu().numpy()
+
+        scores = np.zeros((len(outputs), len(base.LABELS)), dtype=np.float32)
+        scores[:, SPEECH_ACT_CODES] = outputs
+        return SPEECH_ACT_CODES[outputs.argmax(axis=1)], scores
 
 
     def get_speech_act_for(self, sentence: doc.Sentence|str) -> anno.SpeechActLabels:
@@ -175,22 +408,49 @@ class EmbeddingClassifier (base.Classifier):
         """
 
         # Get sentence text from input.
-        if isinstance(sentence, doc.Sentence):
+        if isinstance(sentence, str):
+            text = sentence
+        else:
             assert sentence.text != None, f'sentence.text == None for {sentence.sent_id}'
             text = sentence.text
-        else:
-            text = sentence
 
-        self.cls_model.eval()
-        
+        # The network is only switched to evaluation mode if training has left it in
+        # training mode, since eval() visits every module.
+        if self.cls_model.training:
+            self.cls_model.eval()
+
         # Create embedding and classify.
-        embedding = self.emb_model.encode(text, convert_to_numpy=False)
-        with torch.no_grad():
-            output = self.cls_model.forward(embedding)  # type: ignore
-        class_index = torch.argmax(output)
-        return SPEECH_ACTS[class_index]
-        
-    
+        with torch.inference_mode():
+            if self.sentence_tokenizer == None or self.embedding_store != None:
+                embedding = self.encode([text])
+            else:
+                embedding = self.emb_model(self.sentence_features(text))['sentence_embedding'].float()
+            output = self.cls_model(embedding)
+        return SPEECH_ACTS[int(output[0].argmax())]
+
+
+    def sentence_features(self, text: str) -> dict[str, Any]:
+        """
+        Tokenize a single text into the reused buffers, and get the features for the SBERT
+        model. The features are views of the buffers, so they are only valid until the next
+        text is tokenized.
+        """
+        text = text.strip()
+        if getattr(self.emb_model[0], 'do_lower_case', False):
+            text = text.lower()
+
+        ids = self.sentence_tokenizer.encode(text).ids  # type: ignore
+        length = len(ids)
+        self.input_ids.numpy()[0, :length] = ids
+
+        features = {
+            'input_ids': self.input_ids[:, :length].to(self.device),
+            'attention_mask': self.attention_mask[:, :length]
+        }
+        if 'token_type_ids' in self.emb_model.tokenizer.model_input_names:
+            features['token_type_ids'] = self.token_type_ids[:, :length]
+        return features
+
 
     def train(self, data: CorpusDataset, batch_size: int, num_epochs = 10,
               save_each_epoch: None|str = None, use_class_weights=False,
@@ -232,9 +492,7 @@ class EmbeddingClassifier (base.Classifier):
                 optimizer.zero_grad()
 
                 # Do forward pass.
-                embeddings = self.emb_model.encode(inputs, 
-                                                   convert_to_numpy=False, 
-                                                   convert_to_tensor=True)
+                embeddings = self.encode(list(inputs))
                 outputs = self.cls_model(embeddings)
 
                 # Compute loss and backpropagate.
@@ -270,9 +528,7 @@ class EmbeddingClassifier (base.Classifier):
                 self.cls_model.eval()
                 for inputs, labels in tqdm.tqdm(dev_loader, desc=f'Eval on dev data: epoch {epoch+1}/{num_epochs}", unit="batch'):
                     labels = labels.to(self.device)
-                    embeddings = self.emb_model.encode(inputs, 
-                                                       convert_to_numpy=False, 
-                                                       convert_to_tensor=True)
+                    embeddings = self.encode(list(inputs))
                     outputs = self.cls_model(embeddings)
                     loss = criterion(outputs, labels)
                     running_dev_loss += loss.item()
@@ -288,6 +544,122 @@ class EmbeddingClassifier (base.Classifier):
         print('Training complete')
     
 
+    def encode_dataset(self, data: CorpusDataset, batch_size=64) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Encode all the sentences of the dataset. The embeddings and the class indices are 
+        returned as tensors on the device.
+        """
+        import tqdm  # For progress bar.
+
+        texts = [sentence.text for sentence in data.sentences]
+        labels = torch.tensor([SPEECH_ACTS.index(sentence.label) for sentence in data.sentences],  # type: ignore
+                              dtype=torch.long, device=self.device)
+
+        embeddings = [self.encode(texts[start:start + batch_size]) 
+                      for start in tqdm.trange(0, len(texts), batch_size, desc='Encoding', unit='batch')]
+        if len(embeddings) == 0:
+            return torch.empty((0, self.emb_model.get_sentence_embedding_dimension()), device=self.device), labels  # type: ignore
+        return torch.cat(embeddings), labels
+
+
+    def train_precomputed(self, data: CorpusDataset, batch_size: int, num_epochs = 100,
+                          dev_data: CorpusDataset|None = None, patience = 5, 
+                          use_class_weights=False, learning_rate=0.001,
+                          loss_history: list[float]|None = None, 
+                          dev_loss_history: list[float]|None = None,
+                          seed: int|None = None):
+        """
+        Train the classification network on precomputed embeddings. Since the embedding model 
+        is frozen, the sentences are only encoded once, and the network is then trained on
+        minibatches of the in-memory embeddings. The embeddings are shuffled each epoch by a
+        permutation of their indices.
+
+        If there is dev data, the training stops early when the dev loss has not improved for
+        patience epochs, and the network with the best dev loss is kept.
+        """
+        print('Encoding training data...')
+        train_embeddings, train_labels = self.encode_dataset(data)
+        if dev_data != None:
+            print('Encoding dev data...')
+            dev_embeddings, dev_labels = self.encode_dataset(dev_data)
+
+        optimizer = optim.Adam(self.cls_model.parameters(), lr=learning_rate)
+        criterion = nn.CrossEntropyLoss().to(self.device)
+
+        # Use class weights.
+        if use_class_weights:
+            class_weights = [1.0 / data.get_class_frequency(i) for i in range(len(SPEECH_ACTS))]
+            criterion.weight = torch.tensor(class_weights, dtype=torch.float32).to(self.device)
+
+        generator = torch.Generator()
+        if seed != None:
+            generator.manual_seed(seed)
+
+        best_dev_loss = float('inf')
+        best_state = None
+        epochs_without_improvement = 0
+        for epoch in range(num_epochs):
+
+            # Train on the shuffled minibatches.
+            self.cls_model.train()
+            running_loss = 0.0
+            permutation = torch.randperm(len(train_labels), generator=generator).to(self.device)
+            for start in range(0, len(permutation), batch_size):
+                indices = permutation[start:start + batch_size]
+
+                optimizer.zero_grad()
+                outputs = self.cls_model(train_embeddings[indices])
+                loss = criterion(outputs, train_labels[indices])
+                loss.backward()
+                optimizer.step()
+                running_loss += loss.item() * len(indices)
+
+            epoch_loss = running_loss / max(len(permutation), 1)
+            print(f'Epoch {epoch+1}/{num_epochs}, Loss: {epoch_loss}')
+            if loss_history != None:
+                loss_history.append(epoch_loss)
+
+            if dev_data == None:
+                continue
+
+            # Compute loss on dev data.
+            dev_loss = self.compute_loss(dev_embeddings, dev_labels, criterion, batch_size)  # type: ignore
+            print(f'Epoch {epoch+1}/{num_epochs}, Dev loss: {dev_loss}')
+            if dev_loss_history != None:
+                dev_loss_history.append(dev_loss)
+
+            # Keep the best network, and stop when it no longer improves.
+            if dev_loss < best_dev_loss:
+                best_dev_loss = dev_loss
+                best_state = {key: value.detach().clone() for key, value in self.cls_model.state_dict().items()}
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= patience:
+                    print(f'Stopping early: the dev loss has not improved for {patience} epochs.')
+                    break
+
+        if best_state != None:
+            self.cls_model.load_state_dict(best_state)
+            print(f'Best dev loss: {best_dev_loss}')
+
+        print('Training complete')
+
+
+    def compute_loss(self, embeddings: torch.Tensor, labels: torch.Tensor, criterion: nn.Module,
+                     batch_size=1024) -> float:
+        """
+        Compute the mean loss of the network on the embeddings.
+        """
+        self.cls_model.eval()
+        total_loss = 0.0
+        with torch.no_grad():
+            for start in range(0, len(labels), batch_size):
+                outputs = self.cls_model(embeddings[start:start + batch_size])
+                total_loss += criterion(outputs, labels[start:start + batch_size]).item() * len(outputs)
+        return total_loss / max(len(labels), 1)
+
+
     def save(self, file_name: str):
         """
         Save the model to a file. This is only saves the classification network and not the 
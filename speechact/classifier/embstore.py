@@ -0,0 +1,207 @@
+"""
+A persistent store of sentence embeddings, so that the embeddings of the same texts are only
+computed once by the (frozen) embedding model, across training epochs, dev evaluation and
+classification, and across runs.
+
+The embeddings are stored per model, in a directory named by the fingerprint of the model. The
+vectors are stored as float16 in a file that is memory-mapped for reading, and each row is keyed
+by a 64-bit hash of its text. Both files are only appended to.
+
+Several stores (e.g. in the worker processes of a classifier, or in trainers that share the
+store directory) can write to the same directory. The rows are appended under an exclusive lock
+of the lock file, and the rows that the other writers appended are read first, so that each
+store knows the real row of each key.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import numpy as np
+from typing import Callable
+
+VECTORS_FILE = 'vectors.f16'
+KEYS_FILE = 'keys.u64'
+LOCK_FILE = 'lock'
+
+
+def text_key(text: str) -> int:
+    """
+    Get the key of a text, which is a 64-bit hash of it.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class EmbeddingStore:
+    """
+    The embeddings of one model, stored on disk.
+
+    Args:
+        directory: the directory of all the stores. The embeddings are stored in the
+            subdirectory named by the fingerprint.
+        fingerprint: the fingerprint of the model, which identifies its embeddings.
+        dimension: the number of dimensions of the embeddings.
+    """
+
+    def __init__(self, directory: str, fingerprint: str, dimension: int) -> None:
+        self.directory = os.path.join(directory, fingerprint)
+        self.fingerprint = fingerprint
+        self.dimension = dimension
+        self._vectors = None  # type: np.memmap|None
+        self.rows = 0
+        self.index = {}  # type: dict[int, int]
+        os.makedirs(self.directory, exist_ok=True)
+
+        with self._locked():
+            self._read_new_rows()
+        self.reset_stats()
+
+
+    @property
+    def vectors_file(self) -> str:
+        return os.path.join(self.directory, VECTORS_FILE)
+
+
+    @property
+    def keys_file(self) -> str:
+        return os.path.join(self.directory, KEYS_FILE)
+
+
+    @property
+    def lock_file(self) -> str:
+        return os.path.join(self.directory, LOCK_FILE)
+
+
+    @property
+    def row_size(self) -> int:
+        return 2 * self.dimension
+
+
+    def __len__(self) -> int:
+        return self.rows
+
+
+    def __getstate__(self) -> dict:
+        # The memory map is opened again when needed.
+        state = self.__dict__.copy()
+        state['_vectors'] = None
+        return state
+
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """
+        Hold the exclusive lock of the store directory, which is shared by all the stores (also
+        in other processes) that write to it.
+        """
+        with open(self.lock_file, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+    def _read_new_rows(self):
+        """
+        Read the keys of the rows that were appended after the rows of this store, e.g. by
+        another store, and add them to the index. This must be called under the lock. Rows that
+        were only partially written (e.g. if a run was killed) are dropped.
+        """
+        key_rows = os.path.getsize(self.keys_file) // 8 if os.path.isfile(self.keys_file) else 0
+        vector_rows = os.path.getsize(self.vectors_file) // self.row_size if os.path.isfile(self.vectors_file) else 0
+        rows = min(key_rows, vector_rows)
+        self._truncate(self.vectors_file, rows * self.row_size)
+        self._truncate(self.keys_file, rows * 8)
+
+        if rows > self.rows:
+            keys = np.fromfile(self.keys_file, dtype=np.uint64, count=rows - self.rows, offset=self.rows * 8)
+            self.index.update(zip(keys.tolist(), range(self.rows, rows)))
+        self.rows = rows
+
+
+    def _truncate(self, file_name: str, size: int):
+        if os.path.isfile(file_name) and os.path.getsize(file_name) > size:
+            with open(file_name, 'r+b') as file:
+                file.truncate(size)
+
+
+    def vectors(self) -> np.ndarray:
+        """
+        Get all the stored vectors, as a read-only memory-mapped array.
+        """
+        if self.rows == 0:
+            return np.empty((0, self.dimension), dtype=np.float16)
+
+        # Map the file again if rows have been added.
+        if self._vectors is None or len(self._vectors) != self.rows:
+            self._vectors = np.memmap(self.vectors_file, dtype=np.float16, mode='r',
+                                      shape=(self.rows, self.dimension))
+        return self._vectors
+
+
+    def add(self, keys: list[int], vectors: np.ndarray):
+        """
+        Append the vectors of the keys. The vectors are written before the keys, so a key is
+        never stored without its vector. The rows are appended under the lock, after the rows
+        that other stores have appended, and the keys that they have already stored are skipped.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float16).reshape(len(keys), self.dimension)
+        with self._locked():
+            self._read_new_rows()
+            new = [index for index, key in enumerate(keys) if key not in self.index]
+            if len(new) == 0:
+                return
+
+            with open(self.vectors_file, 'ab') as file:
+                file.write(vectors[new].tobytes())
+            with open(self.keys_file, 'ab') as file:
+                file.write(np.array([keys[index] for index in new], dtype=np.uint64).tobytes())
+
+            for index in new:
+                self.index[keys[index]] = self.rows
+                self.rows += 1
+
+
+    def encode(self, texts: list[str], encode: Callable[[list[str]], np.ndarray]) -> np.ndarray:
+        """
+        Get the embeddings of the texts as a float32 array. Only the texts that are not stored
+        are encoded, with the encode function, and each distinct text is only encoded once.
+        The new embeddings are then stored.
+        """
+        keys = [text_key(text) for text in texts]
+        distinct = dict(zip(keys, texts))
+        missing = [key for key in distinct if key not in self.index]
+
+        self.requested += len(texts)
+        self.duplicates += len(texts) - len(distinct)
+        self.hits += len(distinct) - len(missing)
+
+        if len(missing) > 0:
+            self.add(missing, encode([distinct[key] for key in missing]))
+            self.encoded += len(missing)
+            self.encode_calls += 1
+
+        rows = np.fromiter(map(self.index.__getitem__, keys), dtype=np.int64, count=len(keys))
+        return np.asarray(self.vectors()[rows], dtype=np.float32)
+
+
+    def reset_stats(self):
+        """
+        Reset the counts.
+        """
+        self.requested = 0
+        self.duplicates = 0
+        self.hits = 0
+        self.encoded = 0
+        self.encode_calls = 0
+
+
+    def report(self) -> str:
+        """
+        Get a summary of how many embeddings were found in the store, and how many were
+        encoded.
+        """
+        return (f'embedding store {self.fingerprint}: {self.rows} stored, {self.requested} requested, '
+                f'{self.duplicates} duplicates, {self.hits} hits, {self.encoded} encoded in '
+                f'{self.encode_calls} calls')
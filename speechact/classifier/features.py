@@ -0,0 +1,255 @@
+"""
+Lazy, demand-driven computation of the sentence features that some classifiers need, i.e. the
+sentiment and the dependency parse. Instead of tagging the whole corpus first, each classifier
+declares which features it needs for a sentence (see Classifier.required_features), and a
+FeatureProvider computes a feature only for the sentences that need it and do not already have
+it. The sentences of a batch are sent to the model together.
+
+A classifier declares its features from what it can compute without them. E.g. a classifier
+that only needs the sentiment of declarative sentences first needs the dependencies, to find
+the clause type. The features are therefore provided in rounds, until no more are needed.
+"""
+
+from __future__ import annotations
+import typing
+import abc
+from . import base
+import speechact as sa
+import speechact.preprocess as pre
+import speechact.registry as registry
+import numpy as np
+import time
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+SENTIMENT = 'sentiment'
+"""The sentiment of a sentence (the sentiment_label and sentiment_score properties)."""
+
+DEPENDENCIES = 'dependencies'
+"""The dependency parse of a sentence (the head and deprel of each word)."""
+
+
+def has_sentiment(sentence: doc.Sentence) -> bool:
+    return sa.get_sentence_property(sentence, 'sentiment_label') != None
+
+
+def has_dependencies(sentence: doc.Sentence) -> bool:
+    return all(word.head != None and word.deprel != None for word in sentence.words)
+
+
+class FeatureProvider(abc.ABC):
+    """
+    Computes a feature for the sentences that do not already have it. The provider counts how
+    many sentences it has seen, how many already had the feature, and for how many it was
+    computed. The sentences it has seen but never computed are model inference avoided.
+
+    Args:
+        feature: the name of the feature.
+        batch_size: the number of sentences sent to the model at a time.
+    """
+
+    def __init__(self, feature: str, batch_size=32) -> None:
+        self.feature = feature
+        self.batch_size = batch_size
+        self.reset_stats()
+
+
+    @abc.abstractmethod
+    def has_feature(self, sentence: doc.Sentence) -> bool:
+        """
+        Check if the sentence already has the feature.
+        """
+        pass
+
+
+    @abc.abstractmethod
+    def compute(self, sentences: list[doc.Sentence]):
+        """
+        Compute the feature for a batch of sentences, and store it in the sentences.
+        """
+        pass
+
+
+    def provide(self, sentences: list[doc.Sentence]):
+        """
+        Compute the feature for the sentences that do not already have it, in batches.
+        """
+        missing = [sentence for sentence in sentences if not self.has_feature(sentence)]
+        self.requested += len(sentences)
+        self.present += len(sentences) - len(missing)
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            start_time = time.perf_counter()
+            self.compute(batch)
+            self.time += time.perf_counter() - start_time
+            self.computed += len(batch)
+            self.batches += 1
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the time.
+        """
+        self.seen = 0
+        self.requested = 0
+        self.present = 0
+        self.computed = 0
+        self.batches = 0
+        self.time = 0.0
+
+
+    def report(self) -> str:
+        """
+        Get a summary of how many sentences the feature was computed for, and how much model
+        inference was avoided.
+        """
+        avoided = self.seen - self.computed
+        avoided_share = 100 * avoided / self.seen if self.seen > 0 else 0.0
+        return (f'{self.feature}: {self.seen} sentences, {self.requested} needed it, '
+                f'{self.present} already had it, {self.computed} computed in {self.batches} batches '
+                f'({1000 * self.time:.1f} ms), {avoided} avoided ({avoided_share:.1f}%)')
+
+
+class SentimentProvider(FeatureProvider):
+    """
+    Computes the sentiment with the same model as preprocess.tag_sentiment(). The model is
+    loaded when it is first needed, on the device, or on the available device of the machine
+    (see registry.available_device()) if the device is None.
+    """
+
+    def __init__(self, batch_size=32, device: str|None = None) -> None:
+        super().__init__(SENTIMENT, batch_size)
+        self.device = device
+        self.pipeline = None
+
+
+    def __getstate__(self) -> dict:
+        # The model is loaded again by each worker process.
+        state = self.__dict__.copy()
+        state['pipeline'] = None
+        return state
+
+
+    def has_feature(self, sentence: doc.Sentence) -> bool:
+        return has_sentiment(sentence)
+
+
+    def compute(self, sentences: list[doc.Sentence]):
+        if self.pipeline == None:
+            device = self.device if self.device != None else registry.available_device()
+            self.pipeline = pre.create_sentiment_pipeline(device=device)
+
+        results = self.pipeline([sentence.text for sentence in sentences], batch_size=self.batch_size)
+        for sentence, result in zip(sentences, results):  # type: ignore
+            sa.set_sentence_property(sentence, 'sentiment_label', pre.to_sentiment(result['label']))
+            sa.set_sentence_property(sentence, 'sentiment_score', result['score'])
+
+
+class DependencyProvider(FeatureProvider):
+    """
+    Computes the dependency parse with the same stanza pipeline as preprocess.tag_dep_rel().
+    The sentences need to be POS-tagged. The pipeline is loaded when it is first needed.
+    """
+
+    def __init__(self, batch_size=1000) -> None:
+        super().__init__(DEPENDENCIES, batch_size)
+        self.pipeline = None
+
+
+    def __getstate__(self) -> dict:
+        # The pipeline is loaded again by each worker process.
+        state = self.__dict__.copy()
+        state['pipeline'] = None
+        return state
+
+
+    def has_feature(self, sentence: doc.Sentence) -> bool:
+        return has_dependencies(sentence)
+
+
+    def compute(self, sentences: list[doc.Sentence]):
+        if self.pipeline == None:
+            self.pipeline = pre.create_dep_pipeline(batch_size=self.batch_size)
+
+        pre.parse_dependencies(self.pipeline, sentences)
+
+        # The syntactical analysis of the sentences is no longer valid.
+        for sentence in sentences:
+            if hasattr(sentence, '_sentence_analysis'):
+                del sentence._sentence_analysis  # type: ignore
+
+
+class LazyFeatureClassifier(base.Classifier):
+    """
+    Provides the features that a classifier needs for each sentence, right before the
+    sentences are classified, and only for the sentences that need them.
+
+    Unlike the other classifiers, predict_sentence() and predict_batch() modify the sentences:
+    the computed features are stored in them (the sentiment_label and sentiment_score
+    properties, and the head and deprel of the words), so that they are not computed again,
+    e.g. when the same sentences are classified by another classifier. The speech act is still
+    only assigned by the classify methods.
+
+    Args:
+        classifier: the classifier.
+        providers: the feature providers. Features without a provider are not computed, so
+            the sentences need to have them already.
+    """
+
+    def __init__(self, classifier: base.Classifier, providers: list[FeatureProvider]) -> None:
+        super().__init__()
+        self.classifier = classifier
+        self.providers = {provider.feature: provider for provider in providers}
+
+
+    def prepare(self, sentences: list[doc.Sentence]):
+        """
+        Provide the features that the classifier needs for the sentences. This is done in
+        rounds, since the features that the classifier needs can depend on the features that
+        have been provided.
+        """
+        for provider in self.providers.values():
+            provider.seen += len(sentences)
+
+        provided = set()  # type: set[tuple[int, str]]
+        while True:
+            requests = {}  # type: dict[str, list[doc.Sentence]]
+            for index, sentence in enumerate(sentences):
+                for feature in self.classifier.required_features(sentence):
+                    if feature in self.providers and (index, feature) not in provided:
+                        provided.add((index, feature))
+                        requests.setdefault(feature, []).append(sentence)
+
+            if len(requests) == 0:
+                return
+
+            for feature, feature_sentences in requests.items():
+                self.providers[feature].provide(feature_sentences)
+
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
+        self.prepare([sentence])
+        return self.classifier.predict_sentence(sentence)
+
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        self.prepare(sentences)
+        return self.classifier.predict_batch(sentences, return_scores)
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the times of all the providers.
+        """
+        for provider in self.providers.values():
+            provider.reset_stats()
+
+
+    def report(self) -> str:
+        """
+        Get a summary of how much model inference each provider did and avoided.
+        """
+        return '\n'.join(provider.report() for provider in self.providers.values())
@@ -0,0 +1,217 @@
+"""
+A frozen inference artifact of an embedding classifier. The SBERT encoder, the mean pooling and
+the classification network are traced with TorchScript as one frozen graph, from token ids to
+class probabilities, and the tokenizer is saved as a tokenizers file. The FrozenClassifier loads
+the artifact without importing sentence_transformers, and classifies with a single call of the
+graph per batch.
+
+TorchScript is used rather than torch.export, since a torch.export program takes seconds to load
+(it imports the compiler stack), while a TorchScript graph loads in milliseconds.
+
+The artifact is a directory with the files:
+    model.pt: the TorchScript graph.
+    tokenizer.json: the tokenizer.
+    frozen.json: the maximum sequence length, the padding token and the label codes of the
+        classes.
+"""
+
+from __future__ import annotations
+from . import base
+import speechact.batching as batching
+import json
+import numpy as np
+import os
+import torch
+import torch.nn as nn
+import typing
+import warnings
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+    from . import embedding
+
+MODEL_FILE = 'model.pt'
+TOKENIZER_FILE = 'tokenizer.json'
+CONFIG_FILE = 'frozen.json'
+
+
+class InferenceNetwork(nn.Module):
+    """
+    The encoder, mean pooling and classification network of an embedding classifier, as one
+    network from token ids and attention masks to class probabilities.
+    """
+
+    def __init__(self, encoder: nn.Module, network: nn.Module, softmax: bool) -> None:
+        super().__init__()
+        self.encoder = encoder
+        self.network = network
+        self.softmax = softmax
+
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        token_embeddings = self.encoder(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+        # Mean pooling over the tokens that are not padding.
+        mask = attention_mask.unsqueeze(-1).to(token_embeddings.dtype)
+        embeddings = (token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+
+        outputs = self.network(embeddings.float())
+        if self.softmax:
+            outputs = torch.softmax(outputs, dim=1)
+        return outputs
+
+
+def export(classifier: 'embedding.EmbeddingClassifier', directory: str):
+    """
+    Export the embedding classifier as a frozen inference artifact in the directory. The
+    SBERT model needs to be a transformer with mean pooling. Int8 quantized models can not be
+    exported.
+
+    The graph is traced with a padded example, and then checked against the network on
+    examples with other batch sizes and lengths, since tracing only records the operations of
+    the example.
+    """
+    from . import embedding
+
+    assert classifier.precision != 'int8', 'Int8 quantized models can not be exported'
+    sbert = classifier.emb_model
+    assert len(sbert) == 2, f'Expected a transformer and a pooling module: {sbert}'
+    pooling = sbert[1].get_config_dict()
+    assert pooling.get('pooling_mode') == 'mean' or pooling.get('pooling_mode_mean_tokens'), f'Expected mean pooling: {pooling}'
+
+    network = InferenceNetwork(sbert[0].auto_model, classifier.cls_model,
+                               softmax=not embedding.ends_with_softmax(classifier.cls_model))
+    network = network.to('cpu').eval()
+
+    # Trace with a padded example, so that the padding is handled by the graph.
+    example = sbert.tokenizer(['Hej!', 'Det här är ett exempel.'], padding=True, return_tensors='pt')
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # TorchScript is deprecated, and the trace is checked below.
+        graph = torch.jit.freeze(torch.jit.trace(network, (example['input_ids'], example['attention_mask']),
+                                                 strict=False))
+
+        for texts in [['Hej!'], ['Ja.', 'Vad tycker du om det här?', 'Nej, det gör jag inte alls, tyvärr.']]:
+            tokens = sbert.tokenizer(texts, padding=True, return_tensors='pt')
+            expected = network(tokens['input_ids'], tokens['attention_mask'])
+            actual = graph(tokens['input_ids'], tokens['attention_mask'])
+            assert torch.allclose(expected, actual, atol=1e-5), f'The traced graph differs from the network for {texts}'
+
+    os.makedirs(directory, exist_ok=True)
+    print(f'Exporting model to "{directory}"')
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        torch.jit.save(graph, os.path.join(directory, MODEL_FILE))
+    sbert.tokenizer.backend_tokenizer.save(os.path.join(directory, TOKENIZER_FILE))
+    with open(os.path.join(directory, CONFIG_FILE), 'w') as file:
+        json.dump({
+            'max_seq_length': sbert.max_seq_length,
+            'pad_token_id': sbert.tokenizer.pad_token_id,
+            'pad_token': sbert.tokenizer.pad_token,
+            'label_codes': embedding.SPEECH_ACT_CODES.tolist(),
+            'precision': classifier.precision
+        }, file, indent=2)
+
+
+class FrozenClassifier(base.Classifier):
+    """
+    Classifies sentences with a frozen inference artifact from export(). It runs on the CPU.
+
+    Args:
+        directory: the directory of the artifact.
+        batch_size: the number of sentences classified at a time, without a bucketer.
+        bucketer: batches the sentences by their token lengths (see batching.py). None to
+            batch a fixed number of sentences in their original order.
+        warm_up: run the graph when it is loaded, since TorchScript optimizes the graph during
+            its first calls, which makes them slow.
+    """
+
+    thread_safe_tokenizer = True
+    """
+    The padding and truncation of the tokenizer are set when it is loaded, so tokenize() and
+    token_lengths() can be called from several threads at once (see streaming.py).
+    """
+
+    def __init__(self, directory: str, batch_size=32, bucketer: batching.LengthBucketer|None = None,
+                 warm_up=True) -> None:
+        import tokenizers
+        super().__init__()
+        self.batch_size = batch_size
+        self.bucketer = bucketer
+
+        with open(os.path.join(directory, CONFIG_FILE)) as file:
+            config = json.load(file)
+        self.label_codes = np.array(config['label_codes'], dtype=np.int8)
+
+        self.tokenizer = tokenizers.Tokenizer.from_file(os.path.join(directory, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=config['pad_token_id'], pad_token=config['pad_token'])
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)  # TorchScript is deprecated.
+            self.network = torch.jit.load(os.path.join(directory, MODEL_FILE), map_location='cpu')
+
+        if warm_up:
+            with torch.inference_mode():
+                for texts in [['Hej!'], ['Hej!', 'Hur mår du?']]:
+                    self.network(*self.tokenize(texts))
+
+
+    def tokenize(self, texts: list[str]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Get the token ids and attention masks of the texts, padded to the longest text.
+        """
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = torch.tensor([encoding.ids for encoding in encodings], dtype=torch.long)
+        attention_mask = torch.tensor([encoding.attention_mask for encoding in encodings], dtype=torch.long)
+        return input_ids, attention_mask
+
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        """
+        Get the number of tokens of each text, including the special tokens.
+        """
+        return [sum(encoding.attention_mask) for encoding in self.tokenizer.encode_batch(texts)]
+
+
+    def predict_tokens(self, tokens: tuple[torch.Tensor, torch.Tensor]) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of a batch of tokens from tokenize(). The label codes and the
+        scores are returned, as in predict_batch().
+        """
+        with torch.inference_mode():
+            outputs = self.network(*tokens).numpy()
+
+        scores = np.zeros((len(outputs), len(base.LABELS)), dtype=np.float32)
+        scores[:, self.label_codes] = outputs
+        return self.label_codes[outputs.argmax(axis=1)], scores
+
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
+        return base.to_labels(self.predict_batch([sentence]))[0]  # type: ignore
+
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes. The scores are the class
+        probabilities of the network. The labels that are not classified have the probability 0.
+        """
+        codes = np.empty(len(sentences), dtype=np.int8)
+        scores = np.zeros((len(sentences), len(base.LABELS)), dtype=np.float32) if return_scores else None
+        texts = [sentence.text for sentence in sentences]
+
+        if self.bucketer != None:
+            batches = self.bucketer.batches(self.token_lengths(texts))
+        else:
+            batches = batching.fixed_batches(len(texts), self.batch_size)
+
+        with torch.inference_mode():
+            for batch in batches:
+                outputs = self.network(*self.tokenize([texts[index] for index in batch])).numpy()
+                codes[batch] = self.label_codes[outputs.argmax(axis=1)]
+                if scores is not None:
+                    scores[batch[:, None], self.label_codes] = outputs
+
+        if scores is not None:
+            return codes, scores
+        return codes
@@ -0,0 +1,188 @@
+"""
+An asyncio front end that classifies single sentences in batches. Concurrent calls of
+classify() are queued, and merged into one batch, which is classified when it has max_batch_size
+sentences, or when the oldest sentence has waited max_wait seconds. The model runs on a thread,
+so the event loop keeps taking requests while a batch is classified, and those requests form the
+next batch.
+
+The queueing delay of each request (from the call to the start of its batch) and the size of
+each batch are recorded, so that max_batch_size and max_wait can be tuned for the traffic.
+"""
+
+from . import base
+from . import pool
+import asyncio
+import collections as coll
+import concurrent.futures as cf
+import numpy as np
+import time
+
+
+class MicroBatcher:
+    """
+    Merges concurrent classification requests into batches.
+
+    Use it as an async context manager, or call start() and close():
+
+        async with MicroBatcher(classifier) as batcher:
+            speech_act = await batcher.classify('Hur mår du?')
+
+    Args:
+        classifier: the classifier, which needs token_lengths(), tokenize() and
+            predict_tokens() (e.g. an EmbeddingClassifier or a FrozenClassifier).
+        max_batch_size: the maximum number of sentences of a batch.
+        max_wait: the maximum number of seconds that a request waits for a batch to fill up.
+    """
+
+    def __init__(self, classifier: base.Classifier, max_batch_size=32, max_wait=0.005) -> None:
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None  # type: asyncio.Queue|None
+        self.task = None  # type: asyncio.Task|None
+        self.executor = None  # type: cf.ThreadPoolExecutor|None
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        """
+        Reset the recorded queueing delays and batch sizes.
+        """
+        self.delays = []  # type: list[float]
+        self.batch_sizes = coll.Counter()  # type: coll.Counter[int]
+        self.inference_time = 0.0
+
+
+    async def start(self):
+        """
+        Start the batching task on the running event loop.
+        """
+        assert self.task == None, 'The batcher is already started'
+        self.queue = asyncio.Queue()
+        self.executor = cf.ThreadPoolExecutor(max_workers=1)
+        self.task = asyncio.create_task(self._run())
+
+
+    async def close(self):
+        """
+        Stop the batching task. The requests that are still queued, and those of the batch that
+        is being collected or classified, are cancelled.
+        """
+        if self.task == None:
+            return
+
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown()  # type: ignore
+
+        while not self.queue.empty():  # type: ignore
+            _, future, _ = self.queue.get_nowait()  # type: ignore
+            future.cancel()
+        self.task = None
+
+
+    async def __aenter__(self) -> 'MicroBatcher':
+        await self.start()
+        return self
+
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+    async def classify(self, text: str) -> str|None:
+        """
+        Classify the text, in a batch with the other concurrent requests, and get its speech act.
+        """
+        code, _ = await self.predict(text)
+        return base.to_labels([code])[0]
+
+
+    async def predict(self, text: str) -> tuple[int, np.ndarray]:
+        """
+        Predict the label code and the scores (see base.LABELS) of the text, in a batch with the
+        other concurrent requests.
+        """
+        assert self.queue != None, 'The batcher is not started'
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future, time.perf_counter()))
+        return await future
+
+
+    async def _run(self):
+        """
+        Take batches from the queue and classify them, until the task is cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.queue  # type: asyncio.Queue
+        batch = []  # type: list[tuple[str, asyncio.Future, float]]
+        try:
+            while True:
+                batch = []
+                batch.append(await queue.get())
+
+                # Wait for more requests until the oldest has waited max_wait.
+                deadline = batch[0][2] + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Take the requests that have already arrived, without waiting.
+                while len(batch) < self.max_batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+
+                # The callers that have given up are not classified.
+                batch = [request for request in batch if not request[1].cancelled()]
+                if len(batch) == 0:
+                    continue
+
+                start = time.perf_counter()
+                self.delays += [start - submitted for _, _, submitted in batch]
+                self.batch_sizes[len(batch)] += 1
+
+                try:
+                    codes, scores = await loop.run_in_executor(self.executor, pool.predict_texts, self.classifier,
+                                                               [text for text, _, _ in batch])
+                except Exception as error:
+                    for _, future, _ in batch:
+                        if not future.done():
+                            future.set_exception(error)
+                    continue
+                finally:
+                    self.inference_time += time.perf_counter() - start
+
+                for (_, future, _), code, text_scores in zip(batch, codes, scores):
+                    if not future.done():
+                        future.set_result((int(code), text_scores))
+        except asyncio.CancelledError:
+            # The requests of the batch that was being collected or classified are cancelled,
+            # so that their callers do not wait forever.
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+
+
+    def report(self) -> str:
+        """
+        Get a summary of the queueing delays and the batch sizes.
+        """
+        if len(self.delays) == 0:
+            return 'No requests'
+
+        delays = 1000 * np.array(self.delays)
+        sizes = np.repeat(list(self.batch_sizes.keys()), list(self.batch_sizes.values()))
+        distribution = ', '.join(f'{size}: {count}' for size, count in sorted(self.batch_sizes.items()))
+        return (f'{len(self.delays)} requests in {len(sizes)} batches, queueing delay ms: '
+                f'p50 {np.percentile(delays, 50):.2f}, p90 {np.percentile(delays, 90):.2f}, '
+                f'p99 {np.percentile(delays, 99):.2f}, max {delays.max():.2f}; batch size: '
+                f'mean {sizes.mean():.1f}, p50 {np.percentile(sizes, 50):.0f}, max {sizes.max()}; '
+                f'inference {self.inference_time:.1f} s\n'
+                f'Batch sizes (size: batches): {distribution}')
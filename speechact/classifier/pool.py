@@ -0,0 +1,200 @@
+"""
+A pool of CPU worker processes that classify with one copy of a classifier's weights. The
+classifier is loaded once, in this process, and its networks are moved to shared memory. The
+workers are then forked, so that they inherit the classifier without it being pickled, and all
+of them use the same weights. Each added worker only costs its own activations and Python
+objects, rather than a copy of the model.
+
+The Python objects of this process are frozen (gc.freeze()) while the workers are forked. The
+garbage collector of a worker would otherwise write to the header of every object that it
+inherited, which copies most of the memory pages of the process into the worker.
+
+Each worker runs the model with a fixed number of torch threads (by default 1), so that the
+workers do not compete for the cores, and the pool scales by adding workers rather than threads.
+torch is imported by the functions that use it, since the classifiers that the pool runs have
+already imported it.
+"""
+
+from __future__ import annotations
+import typing
+from . import base
+import speechact.corpus as corp
+import speechact.parallel as parallel
+import collections as coll
+import functools
+import gc
+import itertools
+import multiprocessing as mp
+import numpy as np
+import os
+from typing import Generator
+from typing import Iterable
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+
+def share_weights(classifier: base.Classifier) -> int:
+    """
+    Move the weights of the networks of the classifier to shared memory, and get their size in
+    bytes. Weights that are not parameters or buffers, such as int8 quantized weights and the
+    constants of a frozen graph, stay where they are, and are shared copy-on-write when the
+    workers are forked.
+    """
+    import torch.nn as nn
+
+    size = 0
+    for value in vars(classifier).values():
+        if isinstance(value, nn.Module):
+            value.share_memory()
+            size += sum(tensor.numel() * tensor.element_size()
+                        for tensor in itertools.chain(value.parameters(), value.buffers()))
+    return size
+
+
+def _set_threads(threads: int):
+    """
+    Set the number of torch threads of a worker process.
+    """
+    import torch
+    torch.set_num_threads(threads)
+
+
+def predict_texts(classifier: base.Classifier, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Predict the label codes and the scores of the texts, with the bucketer of the classifier if
+    it has one, and otherwise as one batch. The classifier needs token_lengths(), tokenize() and
+    predict_tokens(). This is run by the worker processes of the InferencePool.
+    """
+    codes = np.empty(len(texts), dtype=np.int8)
+    scores = np.zeros((len(texts), len(base.LABELS)), dtype=np.float32)
+
+    bucketer = getattr(classifier, 'bucketer', None)
+    if bucketer != None:
+        batches = bucketer.batches(classifier.token_lengths(texts))  # type: ignore
+    else:
+        batches = [np.arange(len(texts))]
+
+    for batch in batches:
+        batch_codes, batch_scores = classifier.predict_tokens(classifier.tokenize([texts[index] for index in batch]))  # type: ignore
+        codes[batch] = batch_codes
+        scores[batch] = batch_scores
+    return codes, scores
+
+
+class InferencePool(base.Classifier):
+    """
+    Classifies sentences with a classifier in a pool of worker processes, which share the
+    weights of the classifier. The sentences are sent to the workers as texts, in chunks, and
+    the results are returned in the original order.
+
+    The pool should be closed when it is no longer used, which stops the workers.
+
+    Args:
+        classifier: the loaded classifier, which needs token_lengths(), tokenize() and
+            predict_tokens() (e.g. an EmbeddingClassifier or a FrozenClassifier). It should not
+            be modified after the pool is created.
+        workers: the number of worker processes. Default: the number of cores divided by the
+            threads per worker.
+        threads_per_worker: the number of torch threads of each worker.
+        chunk_size: the number of sentences sent to a worker at a time.
+        mp_context: the multiprocessing context. Default: fork, if it is available. With other
+            start methods, the classifier is pickled to each worker, but the weights in shared
+            memory are still shared.
+    """
+
+    def __init__(self, classifier: base.Classifier, workers: int|None = None, threads_per_worker=1,
+                 chunk_size=64, mp_context: mp.context.BaseContext|None = None) -> None:
+        super().__init__()
+        if workers == None:
+            workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+        if mp_context == None and 'fork' in mp.get_all_start_methods():
+            mp_context = mp.get_context('fork')
+
+        self.classifier = classifier
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.chunk_size = chunk_size
+        self.weights_size = share_weights(classifier)
+        self.pool = parallel.WorkerPool(classifier, workers,
+                                        setup=functools.partial(_set_threads, threads_per_worker),
+                                        mp_context=mp_context)
+
+        # Fork the workers while the objects are frozen, so that their garbage collectors
+        # leave the inherited objects alone.
+        gc.freeze()
+        try:
+            self.pool.start()
+        finally:
+            gc.unfreeze()
+
+
+    def predict_texts(self, texts: Iterable[str]) -> Generator[tuple[np.ndarray, np.ndarray], None, None]:
+        """
+        Predict the label codes and the scores of the texts, and yield them per chunk of
+        chunk_size texts, in the order of the texts. The texts are read lazily.
+        """
+        chunks = parallel.ChunkSizer(min_size=self.chunk_size, max_size=self.chunk_size).chunks(texts)
+        yield from self.pool.map(predict_texts, chunks)
+
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str|None:
+        return base.to_labels(self.predict_batch([sentence]))[0]  # type: ignore
+
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes, in the workers. The scores are
+        those of the classifier.
+        """
+        results = list(self.predict_texts(sentence.text for sentence in sentences))
+        codes = np.concatenate([chunk_codes for chunk_codes, _ in results] + [np.empty(0, dtype=np.int8)])
+
+        if return_scores:
+            scores = np.concatenate([chunk_scores for _, chunk_scores in results] +
+                                    [np.empty((0, len(base.LABELS)), dtype=np.float32)])
+            return codes, scores
+        return codes
+
+
+    def classify_document(self, document: doc.Document, jobs=1):
+        """
+        Classify all the sentences in the document, in the workers of the pool. The jobs are
+        ignored.
+        """
+        super().classify_document(document)
+
+
+    def classify_sentences(self, sentences: Iterable[corp.Sentence],
+                           jobs=1) -> Generator[tuple[corp.Sentence, str|None], None, None]:
+        """
+        Classify the CoNLL-U sentences, e.g. from Corpus.sentences(), and yield each sentence
+        with its speech act, in the same order as the sentences. The sentences are classified
+        in the workers of the pool, and the jobs are ignored.
+        """
+        pending = coll.deque()  # type: coll.deque[corp.Sentence]
+
+        def texts() -> Generator[str, None, None]:
+            for sentence in sentences:
+                pending.append(sentence)
+                yield sentence.text
+
+        for codes, _ in self.predict_texts(texts()):
+            for speech_act in base.to_labels(codes):
+                yield pending.popleft(), speech_act
+
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self.pool.close()
+
+
+    def __enter__(self) -> 'InferencePool':
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
@@ -7,14 +7,29 @@ These classifiers are shallow in the sense that they only look at the syntactic
 words of the root word. 
 """
 
-import stanza.models.common.doc as doc
+from __future__ import annotations
+import typing
 from . import base
+from . import features
 import speechact.annotate as anno
 import enum
 import speechact.corpus as corp
+import speechact.preprocess as pre
+import speechact.parallel as parallel
 import collections as col
+import bisect
+import numpy as np
 import speechact as sa
 
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+UNTRAINED_RULE_CONFIDENCE = 0.5
+"""
+The score of the speech act of a rule without training counts. How reliable the rule is is not
+known, so it is below the default threshold of a cascade stage (see cascade.py).
+"""
+
 INTERROGATIVE_PRONOUNS = {'vilken', 'vilkendera', 'hurdan', 'vem', 'vad'}
 INTERROGATIVE_ADVERBS = {'var', 'vart', 'när', 'hur'}
 PRON_2ND_PERSON = {'du', 'ni'}
@@ -120,14 +135,187 @@ class Rule:
     
 
 
+NO_RULE = -1
+"""The rule priority returned when no rule matches."""
+
+
+class _RuleTrieNode:
+    """
+    A node in the trie of unstrict rules. Each node stores the priority of the rule ending at
+    the node, and the best (lowest) priority of all the rules below it.
+    """
+
+    def __init__(self):
+        self.children = {}  # type: dict[SyntBlock, _RuleTrieNode]
+        self.priority = None  # type: int|None
+        self.best_priority = None  # type: int|None
+        self.sorted_children = []  # type: list[tuple[SyntBlock, _RuleTrieNode]]
+
+    def insert(self, synt_blocks: tuple[SyntBlock, ...], priority: int):
+        node = self
+        for block in synt_blocks:
+            node = node.children.setdefault(block, _RuleTrieNode())
+
+        # Only the first rule (in priority order) with these blocks can match.
+        if node.priority is None:
+            node.priority = priority
+
+    def append(self, synt_blocks: tuple[SyntBlock, ...], priority: int):
+        """
+        Insert a rule into a finalized trie. The priority must be worse than the priorities of
+        all the rules already in the trie.
+        """
+        node = self
+        path = [node]
+        for block in synt_blocks:
+            child = node.children.get(block)
+            if child is None:
+                child = _RuleTrieNode()
+                node.children[block] = child
+                node.sorted_children.append((block, child))
+            node = child
+            path.append(node)
+
+        if node.priority is None:
+            node.priority = priority
+            for path_node in path:
+                if path_node.best_priority is None:
+                    path_node.best_priority = priority
+
+    def finalize(self) -> int|None:
+        """
+        Compute the best priorities of the subtrees, and sort the children so that the most
+        prioritized subtrees are searched first.
+        """
+        best = self.priority
+        for child in self.children.values():
+            child_best = child.finalize()
+            if child_best is not None and (best is None or child_best < best):
+                best = child_best
+
+        self.best_priority = best
+        self.sorted_children = sorted(self.children.items(), 
+                                      key=lambda item: item[1].best_priority)  # type: ignore
+        return best
+
+
+class CompiledRuleset:
+    """
+    A list of rules compiled to an indexed structure for fast matching. Strict rules are found 
+    with a hash lookup on the synt-block sequence. Unstrict rules are stored in a trie, which is
+    walked over the positions of the blocks in the sentence (a subsequence automaton). The 
+    priority of a rule is its position in the rule list, and the matching rule with the best
+    priority is always returned. This gives the same result as checking each rule in turn.
+
+    The results are cached by synt-block sequence, since many sentences share the same one.
+    """
+
+    def __init__(self, rules: list[Rule], cache_size = 100_000):
+        self.rules = list(rules)
+        self.cache_size = cache_size
+        self.cache = {}  # type: dict[tuple[SyntBlock, ...], int]
+        self.strict_index = {}  # type: dict[tuple[SyntBlock, ...], int]
+        self.trie = _RuleTrieNode()
+
+        for priority, rule in enumerate(self.rules):
+            synt_blocks = tuple(rule.synt_blocks)
+            if rule.strict:
+                self.strict_index.setdefault(synt_blocks, priority)
+            else:
+                self.trie.insert(synt_blocks, priority)
+        
+        self.trie.finalize()
+
+    def add_rule(self, rule: Rule):
+        """
+        Add a rule last in the priority order, without recompiling the other rules.
+        """
+        priority = len(self.rules)
+        self.rules.append(rule)
+        synt_blocks = tuple(rule.synt_blocks)
+        if rule.strict:
+            self.strict_index.setdefault(synt_blocks, priority)
+        else:
+            self.trie.append(synt_blocks, priority)
+        
+        self.cache.clear()
+
+    def find_priority(self, synt_blocks: list[SyntBlock]|tuple[SyntBlock, ...]) -> int:
+        """
+        Find the priority (index) of the first rule matching the synt-blocks. NO_RULE is 
+        returned if no rule matches.
+        """
+        key = tuple(synt_blocks)
+        priority = self.cache.get(key)
+        if priority is not None:
+            return priority
+
+        # Look up the strict rules.
+        best = self.strict_index.get(key, len(self.rules))
+
+        # Search the unstrict rules that have a better priority.
+        if self.trie.best_priority is not None and self.trie.best_priority < best:
+            positions = {}  # type: dict[SyntBlock, list[int]]
+            for index, block in enumerate(key):
+                positions.setdefault(block, []).append(index)
+            best = self._search(self.trie, positions, 0, best)
+        
+        priority = best if best < len(self.rules) else NO_RULE
+
+        # Cache the result.
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[key] = priority
+
+        return priority
+
+    def _search(self, node: _RuleTrieNode, positions: dict[SyntBlock, list[int]], 
+                start: int, best: int) -> int:
+        """
+        Search the trie for the best matching rule, given that the blocks of the node have been
+        matched before the start position.
+        """
+        if node.priority is not None and node.priority < best:
+            best = node.priority
+
+        for block, child in node.sorted_children:
+            if child.best_priority >= best:  # type: ignore
+                break
+
+            # Match the block at its first position after start.
+            block_positions = positions.get(block)
+            if block_positions is None:
+                continue
+            index = bisect.bisect_left(block_positions, start)
+            if index == len(block_positions):
+                continue
+
+            best = self._search(child, positions, block_positions[index] + 1, best)
+
+        return best
+
+    def find_rule(self, synt_blocks: list[SyntBlock]|tuple[SyntBlock, ...]) -> Rule|None:
+        """
+        Find the first rule matching the synt-blocks.
+        """
+        priority = self.find_priority(synt_blocks)
+        if priority == NO_RULE:
+            return None
+        return self.rules[priority]
+
+
 class RuleBasedClassifier(base.Classifier):
     """
     Classify speech acts based on a list of rules.
+
+    The rules are compiled to a CompiledRuleset when first used for classification. If the 
+    rules list is modified directly, compile_rules() needs to be called afterwards.
     """
 
     def __init__(self, ruleset_file: str|None = None) -> None:
         super().__init__()
         self.rules = []  # type: list[Rule]
+        self._compiled_rules = None  # type: CompiledRuleset|None
         
         if ruleset_file != None:
             self.load_rules(ruleset_file)
@@ -153,7 +341,17 @@ class RuleBasedClassifier(base.Classifier):
             # Convert to enum synt-blocks.
             synt_blocks = [SyntBlock(block) for block in json_blocks]
 
-            self.new_rule(anno.SpeechActLabels(speech_act), synt_blocks, strict)
+            # Trained rules also have the speech act counts from the training.
+            json_counts = json_rule.get('counts')
+            if json_counts != None:
+                rule = TrainableRule(synt_blocks)
+                rule.speech_act = anno.SpeechActLabels(speech_act)
+                rule.strict = strict
+                rule.counts = col.Counter({anno.SpeechActLabels(label): count 
+                                           for label, count in json_counts.items()})
+                self.add_rule(rule)
+            else:
+                self.new_rule(anno.SpeechActLabels(speech_act), synt_blocks, strict)
     
     def save_rules(self, ruleset_file: str):
         """
@@ -169,6 +367,9 @@ class RuleBasedClassifier(base.Classifier):
             if rule.strict:
                 json_rule['strict'] = True
 
+            if type(rule) == TrainableRule and len(rule.counts) > 0:
+                json_rule['counts'] = dict(rule.counts)
+
             json_rules.append(json_rule)
 
         json_data = {
@@ -185,13 +386,19 @@ class RuleBasedClassifier(base.Classifier):
         Create and add a new rule to this classifier. 
         """
 
+        self.add_rule(Rule(speech_act, synt_blocks, strict))
+
+    def add_rule(self, rule: Rule):
+        """
+        Add a rule to this classifier.
+        """
+
         # Check for duplicates.
-        for other_rule in self.rules:
-            if other_rule.is_matching(synt_blocks):
-                raise ValueError(f'rule is already taken: {synt_blocks}')
+        if self.compiled_rules.find_rule(rule.synt_blocks) != None:
+            raise ValueError(f'rule is already taken: {rule.synt_blocks}')
 
-        rule = Rule(speech_act, synt_blocks, strict)
         self.rules.append(rule)
+        self.compiled_rules.add_rule(rule)
     
     def find_rule(self, synt_blocks: list[SyntBlock], strict: bool|None = None) -> Rule|None:
         """
@@ -216,6 +423,24 @@ class RuleBasedClassifier(base.Classifier):
         synt-blocks) will be last.
         """
         self.rules.sort(key=lambda rule: -len(rule.synt_blocks))
+        self._compiled_rules = None
+
+    def compile_rules(self) -> CompiledRuleset:
+        """
+        Compile the rules for fast matching. This needs to be called if the rules list has been
+        modified directly.
+        """
+        self._compiled_rules = CompiledRuleset(self.rules)
+        return self._compiled_rules
+
+    @property
+    def compiled_rules(self) -> CompiledRuleset:
+        """
+        The compiled rules. These are compiled when first accessed.
+        """
+        if self._compiled_rules is None:
+            return self.compile_rules()
+        return self._compiled_rules
 
     @property
     def rule_count(self):
@@ -224,12 +449,14 @@ class RuleBasedClassifier(base.Classifier):
         """
         return len(self.rules)
     
-    def classify_sentence(self, sentence: doc.Sentence):
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        return {features.DEPENDENCIES}
+
+    def predict_sentence(self, sentence: doc.Sentence) -> str:
         """
-        Classify the sentence with a speech act based on a list of rules.
+        Predict the speech act of the sentence based on a list of rules.
         """
-        speech_act = self.get_speech_act_for(sentence)
-        sentence.speech_act = speech_act  # type: ignore
+        return self.get_speech_act_for_signature(self.get_signature(sentence))
 
     def get_speech_act_for(self, sentence: doc.Sentence) -> anno.SpeechActLabels:
         """
@@ -240,30 +467,92 @@ class RuleBasedClassifier(base.Classifier):
         synt_blocks = self.to_synt_blocks(sentence)
 
         # Find the rule that matches the blocks.
-        for rule in self.rules:
-            if rule.is_matching(synt_blocks):
-                return rule.speech_act
+        rule = self.compiled_rules.find_rule(synt_blocks)
+        if rule != None:
+            return rule.speech_act
         
         # No matches found.
         return anno.SpeechActLabels.NONE
 
+    def get_signature(self, sentence: doc.Sentence) -> tuple[str, ...]:
+        """
+        Compute the signature of the sentence, i.e. everything that the classification of
+        the sentence depends on. Sentences with the same signature are always classified with
+        the same speech act. For this classifier, it is the synt-block sequence.
+        """
+        return tuple(self.to_synt_blocks(sentence))
+
+    def get_speech_act_for_signature(self, signature: tuple[str, ...]) -> anno.SpeechActLabels:
+        """
+        Classify a sentence signature (see get_signature) with a speech act.
+        """
+        rule = self.compiled_rules.find_rule(signature)  # type: ignore
+        if rule != None:
+            return rule.speech_act
+        
+        return anno.SpeechActLabels.NONE
+
+    def get_scores_for_signature(self, signature: tuple[str, ...]) -> np.ndarray:
+        """
+        Get the per-class scores (see base.LABELS) of a sentence signature. For trained
+        rules, these are the fractions of the speech acts of the rule's training sentences.
+        Rules without counts score UNTRAINED_RULE_CONFIDENCE for their speech act. A signature
+        that matches no rule, or a rule for NONE, has all scores 0, since the classifier does
+        not know the speech act of the sentence.
+        """
+        scores = np.zeros(len(base.LABELS), dtype=np.float32)
+        rule = self.compiled_rules.find_rule(signature)  # type: ignore
+        if rule == None or rule.speech_act == anno.SpeechActLabels.NONE:
+            return scores
+
+        if type(rule) == TrainableRule and len(rule.counts) > 0:
+            for speech_act, count in rule.counts.items():
+                scores[base.LABEL_CODES[speech_act]] = count
+            return scores / scores.sum()
+
+        scores[base.LABEL_CODES[rule.speech_act]] = UNTRAINED_RULE_CONFIDENCE
+        return scores
+
+    def predict_batch(self, sentences: list[doc.Sentence],
+                      return_scores=False) -> np.ndarray|tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the speech acts of the sentences as label codes. The scores are given by
+        get_scores_for_signature.
+        """
+        signatures = [self.get_signature(sentence) for sentence in sentences]
+        codes = base.to_codes(self.get_speech_act_for_signature(signature) for signature in signatures)
+        if return_scores:
+            scores = np.zeros((len(signatures), len(base.LABELS)), dtype=np.float32)
+            for index, signature in enumerate(signatures):
+                scores[index] = self.get_scores_for_signature(signature)
+            return codes, scores
+        return codes
+
     def to_synt_blocks(self, sentence: doc.Sentence) -> list[SyntBlock]:
         """
         Compute the sequence of the synt-blocks for the sentence.
         """
 
         # Retrieve the root word and its dependencies.
-        root = get_root(sentence)
-        root_deps = get_deps(sentence, root)
+        dep_index = DependencyIndex(sentence)
+        root = dep_index.get_root()
+        return self.root_to_synt_blocks(sentence, root, dep_index.get_deps(root))
+
+    def root_to_synt_blocks(self, sentence: doc.Sentence, root: doc.Word, 
+                            root_deps: list[doc.Word]) -> list[SyntBlock]:
+        """
+        Compute the sequence of the synt-blocks from the root word and its dependencies.
+        """
         words = root_deps + [root]
         words.sort(key=lambda word: word.id)
 
         # Convert each word to a block.
+        last_word = sentence.words[-1]
         synt_blocks = []
         for word in words:
 
             # Ignore punctuations if there is no block for it.
-            if word.pos == 'PUNCT' and word != sentence.words[-1]:
+            if word.pos == 'PUNCT' and word is not last_word:
                 continue
 
             synt_block = self.get_synt_block(word)
@@ -282,39 +571,105 @@ class RuleBasedClassifier(base.Classifier):
         Get the synt-block for the word.
         """
 
-        if word.text == '?': return SyntBlock.QUESTION_MARK
-        if word.text == '.': return SyntBlock.PERIOD
-        if word.text == '!': return SyntBlock.EXCLAMATION_MARK
+        text = word.text
+        if text == '?': return SyntBlock.QUESTION_MARK
+        if text == '.': return SyntBlock.PERIOD
+        if text == '!': return SyntBlock.EXCLAMATION_MARK
 
+        pos = word.pos
         if word.deprel == 'root':
-            if word.pos == 'VERB' and word.feats != None:
-                if 'VerbForm=Fin' in word.feats:
-                    if 'Mood=Imp' in word.feats: return SyntBlock.FIN_VERB_IMP
+            if pos == 'VERB' and word.feats != None:
+                feats_flags = get_feats_flags(word.feats)
+                if feats_flags & FEATS_VERB_FIN:
+                    if feats_flags & FEATS_MOOD_IMP: return SyntBlock.FIN_VERB_IMP
                     else: return SyntBlock.FIN_VERB
                 
-                elif 'VerbForm=Part' in word.feats:
+                elif feats_flags & FEATS_VERB_PART:
                     return SyntBlock.PART_VERB
                 
-                elif 'VerbForm=Sup' in word.feats:
+                elif feats_flags & FEATS_VERB_SUP:
                     return SyntBlock.SUP_VERB
 
-            if word.pos == 'ADVERB': return SyntBlock.ADVERB
-            if word.pos == 'NOUN': return SyntBlock.NOUN
-            if word.pos == 'ADJ': return SyntBlock.ADJECTIVE
-            if word.pos == 'NUM': return SyntBlock.NUMBER
-            if word.pos == 'PROPN': return SyntBlock.PROPN
-            else: return SyntBlock.NONE
+            return ROOT_POS_BLOCKS.get(pos, SyntBlock.NONE)
 
-        if word.lemma in INTERROGATIVE_PRONOUNS and word.pos == 'PRON': return SyntBlock.INT_PRON
-        if word.lemma in INTERROGATIVE_ADVERBS and word.pos == 'ADVERB': return SyntBlock.INT_ADV
+        lemma = word.lemma
+        if lemma in INTERROGATIVE_PRONOUNS and pos == 'PRON': return SyntBlock.INT_PRON
+        if lemma in INTERROGATIVE_ADVERBS and pos == 'ADVERB': return SyntBlock.INT_ADV
 
         if word.deprel in SUBJECT_RELS: 
-            if word.lemma in PRON_2ND_PERSON: return SyntBlock.SUBJECT_2ND
+            if lemma in PRON_2ND_PERSON: return SyntBlock.SUBJECT_2ND
             return SyntBlock.SUBJECT
 
         return SyntBlock.NONE
 
 
+class DependencyIndex:
+    """
+    The dependency structure of a sentence, precomputed in a single pass over its words. This
+    consists of the root word, and the dependents (children) of each word.
+    """
+
+    def __init__(self, sentence: doc.Sentence):
+        self.sentence = sentence
+        self.root = None  # type: doc.Word|None
+        self.children = {}  # type: dict[int, list[doc.Word]]
+
+        for word in sentence.words:
+            if self.root is None and word.deprel == 'root':
+                self.root = word
+            self.children.setdefault(word.head, []).append(word)
+
+    def get_root(self) -> doc.Word:
+        """
+        Retrieve the root word of the sentence.
+        """
+        if self.root is None:
+            raise ValueError(f'Sentence lacks a root: {self.sentence.sent_id}')
+        return self.root
+
+    def get_deps(self, head: doc.Word) -> list[doc.Word]:
+        """
+        Retrieve the dependencies of this word, i.e. the words that have this word as a head.
+        """
+        return list(self.children.get(head.id, []))
+
+
+FEATS_VERB_FIN = 1
+"""The feats contain 'VerbForm=Fin'."""
+FEATS_MOOD_IMP = 2
+"""The feats contain 'Mood=Imp'."""
+FEATS_VERB_PART = 4
+"""The feats contain 'VerbForm=Part'."""
+FEATS_VERB_SUP = 8
+"""The feats contain 'VerbForm=Sup'."""
+
+_feats_flags = {}  # type: dict[str, int]
+
+def get_feats_flags(feats: str) -> int:
+    """
+    Get the bit flags (FEATS_*) for a feats string. The flags are only computed once for each
+    distinct feats string.
+    """
+    flags = _feats_flags.get(feats)
+    if flags is None:
+        flags = 0
+        if 'VerbForm=Fin' in feats: flags |= FEATS_VERB_FIN
+        if 'Mood=Imp' in feats: flags |= FEATS_MOOD_IMP
+        if 'VerbForm=Part' in feats: flags |= FEATS_VERB_PART
+        if 'VerbForm=Sup' in feats: flags |= FEATS_VERB_SUP
+        _feats_flags[feats] = flags
+    
+    return flags
+
+
+ROOT_POS_BLOCKS = {
+    'ADVERB': SyntBlock.ADVERB,
+    'NOUN': SyntBlock.NOUN,
+    'ADJ': SyntBlock.ADJECTIVE,
+    'NUM': SyntBlock.NUMBER,
+    'PROPN': SyntBlock.PROPN
+}
+"""The synt-blocks of root words that are not verbs, by their POS-tag."""
 
 
 def get_root(sentence: doc.Sentence) -> doc.Word:
@@ -372,29 +727,46 @@ class TrainableClassifier(RuleBasedClassifier):
     def __init__(self, ruleset_file: str | None = None):
         super().__init__(ruleset_file)
 
-    def train(self, corpus: corp.Corpus):
-        """
-        Train the classifier on the corpus.
+    def train(self, corpus: corp.Corpus, jobs = 1, batch_size = 1000):
         """
-        for sentence in corpus.stanza_sentences():
-            assert sentence.speech_act != None, f'sentence {sentence.sent_id} does not have a speech act'  # type: ignore
-            blocks = self.to_synt_blocks(sentence)
+        Train the classifier on the corpus. 
+        
+        This is done as a map-reduce. The synt-block sequences of the sentences are counted 
+        per speech act for each batch of the corpus. If jobs > 1, the batches are counted in 
+        parallel worker processes. The counts are then merged into the rules, which are looked
+        up by their synt-blocks. The resulting rules are the same regardless of the number of 
+        jobs.
+        """
+        # Count the synt-block sequences. The counts are merged in corpus order.
+        counts = {}  # type: dict[tuple[SyntBlock, ...], col.Counter]
+        batches = corpus.batched_lines(batch_size)
+        for batch_counts in parallel.ordered_map(count_synt_blocks, self, batches, jobs):
+            for synt_blocks, speech_act_counts in batch_counts.items():
+                if synt_blocks in counts:
+                    counts[synt_blocks].update(speech_act_counts)
+                else:
+                    counts[synt_blocks] = speech_act_counts
+
+        # Index the existing rules by their synt-blocks. The first rule takes precedence.
+        rule_index = {}  # type: dict[tuple[SyntBlock, ...], Rule]
+        for rule in self.rules:
+            rule_index.setdefault(tuple(rule.synt_blocks), rule)
+
+        for synt_blocks, speech_act_counts in counts.items():
 
-            if len(blocks) == 0:
-                continue
-            
             # Find matching rule, and increment to it.
-            matching_rule = self.find_rule(blocks, strict=True)
+            matching_rule = rule_index.get(synt_blocks)
             if matching_rule != None:
                 assert type(matching_rule) == TrainableRule, 'rule is not a trainable rule.'
-                matching_rule.increment_for(sentence.speech_act)  # type: ignore
+                matching_rule.counts.update(speech_act_counts)
             
             # No matching rule, create new rule.
             else:
-                new_rule = TrainableRule(blocks)
+                new_rule = TrainableRule(list(synt_blocks))
                 new_rule.strict = False
-                new_rule.increment_for(sentence.speech_act)  # type: ignore
+                new_rule.counts = speech_act_counts
                 self.rules.append(new_rule)
+                rule_index[synt_blocks] = new_rule
         
         # Refresh the labels for all rules.
         for rule in self.rules:
@@ -404,6 +776,27 @@ class TrainableClassifier(RuleBasedClassifier):
         self.sort_rules()
 
 
+def count_synt_blocks(classifier: RuleBasedClassifier, 
+                      lines: list[str]) -> dict[tuple[SyntBlock, ...], col.Counter]:
+    """
+    Count the speech acts of each synt-block sequence in a batch of CoNLL-U lines. The 
+    sequences are in the order they first occur. Empty sequences are not counted.
+    """
+    counts = {}  # type: dict[tuple[SyntBlock, ...], col.Counter]
+    for sentence in pre.parse_doc(lines).sentences:
+        assert sentence.speech_act != None, f'sentence {sentence.sent_id} does not have a speech act'  # type: ignore
+        synt_blocks = tuple(classifier.to_synt_blocks(sentence))
+
+        if len(synt_blocks) == 0:
+            continue
+
+        if synt_blocks not in counts:
+            counts[synt_blocks] = col.Counter()
+        counts[synt_blocks][sentence.speech_act] += 1  # type: ignore
+    
+    return counts
+
+
 
 class TrainableSentimentClassifier(TrainableClassifier):
     """
@@ -411,6 +804,9 @@ class TrainableSentimentClassifier(TrainableClassifier):
     the rules. This requires the sentences to be annotated with a sentiment_label.
     """
 
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        return {features.DEPENDENCIES, features.SENTIMENT}
+
     def to_synt_blocks(self, sentence: doc.Sentence) -> list[SyntBlock]: 
         synt_blocks = super().to_synt_blocks(sentence)
 
@@ -431,14 +827,57 @@ class TrainableSentimentClassifierV2(TrainableClassifier):
     This requires the sentences to be annotated with a sentiment_label.
     """
 
+    def required_features(self, sentence: doc.Sentence) -> set[str]:
+        """
+        The sentiment is only needed if the rules classify the sentence as an assertion.
+        """
+        if not features.has_dependencies(sentence):
+            return {features.DEPENDENCIES}
+        
+        speech_act = super().get_speech_act_for_signature(tuple(self.to_synt_blocks(sentence)))
+        if speech_act == anno.SpeechActLabels.ASSERTION:
+            return {features.DEPENDENCIES, features.SENTIMENT}
+        return {features.DEPENDENCIES}
+
+    def get_signature(self, sentence: doc.Sentence) -> tuple[str, ...]:
+        """
+        Compute the signature of the sentence. This is the synt-block sequence, followed by a
+        SENTIMENT block if the sentence has a non-neutral sentiment. Note that the SENTIMENT
+        block is not matched against the rules.
+        """
+        signature = super().get_signature(sentence)
+
+        sentiment = sa.get_sentence_property(sentence, 'sentiment_label')
+        if sentiment != sa.Sentiment.NEUTRAL:
+            signature += (SyntBlock.SENTIMENT,)
+
+        return signature
 
-    def classify_sentence(self, sentence: doc.Sentence):
-        speech_act = self.get_speech_act_for(sentence)
+    def get_speech_act_for_signature(self, signature: tuple[str, ...]) -> anno.SpeechActLabels:
+        has_sentiment = len(signature) > 0 and signature[-1] == SyntBlock.SENTIMENT
+        if has_sentiment:
+            signature = signature[:-1]
+
+        speech_act = super().get_speech_act_for_signature(signature)
 
         # Assertions with sentiment should be expressives.
-        if speech_act == anno.SpeechActLabels.ASSERTION:
-            sentiment = sa.get_sentence_property(sentence, 'sentiment_label')
-            if sentiment != sa.Sentiment.NEUTRAL:
-                speech_act = anno.SpeechActLabels.EXPRESSIVE
+        if speech_act == anno.SpeechActLabels.ASSERTION and has_sentiment:
+            speech_act = anno.SpeechActLabels.EXPRESSIVE
+
+        return speech_act
+
+    def get_scores_for_signature(self, signature: tuple[str, ...]) -> np.ndarray:
+        has_sentiment = len(signature) > 0 and signature[-1] == SyntBlock.SENTIMENT
+        if has_sentiment:
+            signature = signature[:-1]
+
+        scores = super().get_scores_for_signature(signature)
+
+        # The assertion score goes to the expressives, as for the speech act.
+        if has_sentiment and super().get_speech_act_for_signature(signature) == anno.SpeechActLabels.ASSERTION:
+            assertion = base.LABEL_CODES[anno.SpeechActLabels.ASSERTION]
+            expressive = base.LABEL_CODES[anno.SpeechActLabels.EXPRESSIVE]
+            scores[expressive] += scores[assertion]
+            scores[assertion] = 0
 
-        sentence.speech_act = speech_act  # type: ignore
+        return scores
@@ -0,0 +1,158 @@
+"""
+Signature-compressed evaluation of rule-based classifiers. The signature of a sentence is
+everything that its classification depends on, e.g. its synt-block sequence. Most sentences in
+a corpus share one of only a few thousand distinct signatures.
+
+A SignatureCorpus computes the signature of each sentence once and stores it. A ruleset can
+then be evaluated once per unique signature, instead of once per sentence, and the results are
+expanded to per-sentence predictions and metrics using counts.
+"""
+
+import json
+import numpy as np
+import speechact.corpus as corp
+import speechact.parallel as parallel
+import speechact.preprocess as pre
+from . import base
+from . import rulebased as rb
+
+LABELS = base.LABELS
+"""The speech act labels. The label code of a label is its index in this list."""
+
+
+def signature_kind(classifier: rb.RuleBasedClassifier) -> str:
+    """
+    Get the kind of signatures computed by the classifier. Classifiers with the same kind of
+    signatures can be evaluated on the same SignatureCorpus.
+    """
+    get_signature = type(classifier).get_signature.__qualname__
+    to_synt_blocks = type(classifier).to_synt_blocks.__qualname__
+    return f'{get_signature}/{to_synt_blocks}'
+
+
+def compute_signatures(classifier: rb.RuleBasedClassifier,
+                       lines: list[str]) -> list[tuple[tuple[str, ...], str]]:
+    """
+    Compute the signature and the labeled speech act of each sentence in a batch of CoNLL-U
+    lines.
+    """
+    results = []
+    for sentence in pre.parse_doc(lines).sentences:
+        assert sentence.speech_act != None, f'sentence {sentence.sent_id} does not have a speech act'  # type: ignore
+        signature = tuple(str(block) for block in classifier.get_signature(sentence))
+        results.append((signature, sentence.speech_act))  # type: ignore
+
+    return results
+
+
+class SignatureCorpus:
+    """
+    The signatures and labeled speech acts of all the sentences in a corpus.
+
+    Args:
+        signatures: the unique signatures.
+        sentence_signatures: the index of the signature of each sentence.
+        sentence_labels: the code of the labeled speech act of each sentence.
+        kind: the kind of signatures (see signature_kind).
+    """
+
+    def __init__(self, signatures: list[tuple[str, ...]], sentence_signatures: np.ndarray,
+                 sentence_labels: np.ndarray, kind: str) -> None:
+        self.signatures = signatures
+        self.sentence_signatures = sentence_signatures
+        self.sentence_labels = sentence_labels
+        self.kind = kind
+
+        # Count the labels for each signature.
+        self.counts = np.zeros((len(signatures), len(LABELS)), dtype=np.int64)
+        np.add.at(self.counts, (sentence_signatures, sentence_labels), 1)
+
+
+    @staticmethod
+    def compute(corpus: corp.Corpus, classifier: rb.RuleBasedClassifier, jobs=1,
+                batch_size=1000, print_progress=False) -> 'SignatureCorpus':
+        """
+        Compute the signatures of all the sentences in the corpus. If jobs > 1, this is done in
+        parallel worker processes.
+        """
+        signature_index = {}  # type: dict[tuple[str, ...], int]
+        sentence_signatures = []
+        sentence_labels = []
+
+        batches = corpus.batched_lines(batch_size)
+        for results in parallel.ordered_map(compute_signatures, classifier, batches, jobs):
+            for signature, label in results:
+                index = signature_index.setdefault(signature, len(signature_index))
+                sentence_signatures.append(index)
+                sentence_labels.append(base.LABEL_CODES[label])
+
+            if print_progress:
+                print(f'Computed {len(sentence_signatures)} signatures ({len(signature_index)} unique)...')
+
+        return SignatureCorpus(list(signature_index.keys()),
+                               np.array(sentence_signatures, dtype=np.int32),
+                               np.array(sentence_labels, dtype=np.int8),
+                               signature_kind(classifier))
+
+
+    def save(self, file_name: str):
+        """
+        Save the signatures to a numpy .npz file.
+        """
+        np.savez_compressed(file_name,
+                            signatures=np.array([json.dumps(s) for s in self.signatures], dtype=str),
+                            sentence_signatures=self.sentence_signatures,
+                            sentence_labels=self.sentence_labels,
+                            kind=np.array(self.kind))
+
+
+    @staticmethod
+    def load(file_name: str) -> 'SignatureCorpus':
+        """
+        Load the signatures from a numpy .npz file.
+        """
+        with np.load(file_name, allow_pickle=False) as data:
+            signatures = [tuple(json.loads(s)) for s in data['signatures']]
+            return SignatureCorpus(signatures,
+                                   data['sentence_signatures'],
+                                   data['sentence_labels'],
+                                   str(data['kind']))
+
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_signatures)
+
+
+    def predict_signatures(self, classifier: rb.RuleBasedClassifier) -> np.ndarray:
+        """
+        Classify each unique signature with the classifier. The label codes are returned.
+        """
+        if signature_kind(classifier) != self.kind:
+            raise ValueError(f'classifier computes signatures of kind "{signature_kind(classifier)}", not "{self.kind}"')
+
+        return base.to_codes(classifier.get_speech_act_for_signature(signature)
+                             for signature in self.signatures)
+
+
+    def predict(self, classifier: rb.RuleBasedClassifier) -> np.ndarray:
+        """
+        Classify each sentence with the classifier. The label codes are returned.
+        """
+        return self.predict_signatures(classifier)[self.sentence_signatures]
+
+
+    def weighted_labels(self, classifier: rb.RuleBasedClassifier) -> tuple[list[str], list[str], np.ndarray]:
+        """
+        Get the labeled and predicted speech acts with counts, for each unique pair of
+        signature and labeled speech act. These can be used for computing metrics with
+        sample weights.
+        """
+        signature_predictions = self.predict_signatures(classifier)
+        signature_indices, label_codes = np.nonzero(self.counts)
+
+        correct_labels = [LABELS[code] for code in label_codes]
+        predicted_labels = [LABELS[code] for code in signature_predictions[signature_indices]]
+        weights = self.counts[signature_indices, label_codes]
+
+        return correct_labels, predicted_labels, weights
@@ -0,0 +1,389 @@
+"""
+Streaming speech act tagging of whole corpora with the embedding classifier (or a frozen
+classifier, see frozen.py). The stages run concurrently: a reader thread reads the sentences,
+tokenizer threads sort windows of them into length-bucketed batches (see batching.py) and
+tokenize them, and the main thread runs the model. The tagged sentences are yielded in their
+original order.
+
+The input can be CoNLL-U, plain text (one sentence per line) or JSONL (one JSON object with a
+'text' per line), optionally bz2 compressed. CoNLL-U sentences are written with their original
+lines and a '# speech_act' comment. Text and JSONL sentences are written as JSONL, with a
+'speech_act' key.
+
+Tagging a file can be resumed. The output is checkpointed regularly, and a resumed run skips
+the sentences that were written by the last checkpoint.
+"""
+
+from . import base
+import speechact.batching as batching
+import speechact.conllu as conllu
+import speechact.corpus as corp
+import bz2
+import contextlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any
+from typing import Generator
+from typing import Iterable
+from typing import TextIO
+
+CONLLU = 'conllu'
+TEXT = 'text'
+JSONL = 'jsonl'
+FORMATS = [CONLLU, TEXT, JSONL]
+
+
+class Record:
+    """
+    A sentence to tag.
+
+    Args:
+        sent_id: the sentence id, or None.
+        text: the text of the sentence.
+        source: the CoNLL-U sentence (corpus.Sentence) or the JSON object it was read from, or
+            None for text.
+    """
+
+    def __init__(self, sent_id: str|None, text: str, source: Any = None) -> None:
+        self.sent_id = sent_id
+        self.text = text
+        self.source = source
+
+
+def detect_format(file_name: str) -> str:
+    """
+    Get the format of a file from its extension (.conllu, .txt or .jsonl, optionally followed
+    by .bz2).
+    """
+    name = file_name.removesuffix('.bz2')
+    if name.endswith('.conllu'):
+        return CONLLU
+    if name.endswith('.jsonl'):
+        return JSONL
+    if name.endswith('.txt'):
+        return TEXT
+    raise ValueError(f'Unknown file format: "{file_name}"')
+
+
+def open_text(file_name: str, mode='rt') -> TextIO:
+    """
+    Open a text file, which is bz2 compressed if the name ends with .bz2.
+    """
+    if file_name.endswith('.bz2'):
+        return bz2.open(file_name, mode=mode, encoding='utf-8')  # type: ignore
+    return open(file_name, mode=mode, encoding='utf-8')
+
+
+def read_records(file_name: str, format: str|None = None) -> Generator[Record, None, None]:
+    """
+    Read the sentences of a file, in the format (detected from the file name by default).
+    """
+    if format == None:
+        format = detect_format(file_name)
+
+    with open_text(file_name) as source:
+        if format == CONLLU:
+            lines = []
+            for line in source:
+                if line == '\n' and len(lines) != 0:
+                    sentence = corp.Sentence(lines)
+                    yield Record(sentence.try_get_meta_date('sent_id'), sentence.text, sentence)
+                    lines = []
+                elif line != '\n':
+                    lines.append(line)
+
+        elif format == JSONL:
+            for line in source:
+                if line.strip() != '':
+                    record = json.loads(line)
+                    yield Record(record.get('sent_id'), record['text'], record)
+
+        elif format == TEXT:
+            for line_number, line in enumerate(source, start=1):
+                if line.strip() != '':
+                    yield Record(str(line_number), line.strip())
+
+        else:
+            raise ValueError(f'Unknown format: {format}')
+
+
+class RecordWriter:
+    """
+    Writes tagged sentences. CoNLL-U sentences are written with a '# speech_act' comment, and
+    the other sentences as JSON objects with a 'speech_act' key.
+
+    The output can be checkpointed, which closes and reopens the file, so that everything
+    written so far is complete on disk (also when it is bz2 compressed, since bz2 files can
+    have many streams).
+    """
+
+    def __init__(self, file_name: str, format: str, append=False) -> None:
+        self.file_name = file_name
+        self.format = format
+        self.open('at' if append else 'wt')
+
+
+    def open(self, mode: str):
+        self.target = open_text(self.file_name, mode)
+        self.writer = conllu.ConlluWriter(self.target) if self.format == CONLLU else None
+
+
+    def write(self, record: Record, speech_act: str|None):
+        if self.writer != None:
+            self.writer.write_lines(record.source.sentence_lines, properties={'speech_act': speech_act})
+        else:
+            values = dict(record.source) if record.source != None else {'sent_id': record.sent_id, 'text': record.text}
+            values['speech_act'] = speech_act
+            self.target.write(json.dumps(values, ensure_ascii=False) + '\n')
+
+
+    def checkpoint(self) -> int:
+        """
+        Write everything to disk, and get the size of the file.
+        """
+        self.close()
+        size = os.path.getsize(self.file_name)
+        self.open('at')
+        return size
+
+
+    def close(self):
+        if self.writer != None:
+            self.writer.close()
+        self.target.close()
+
+
+_DONE = object()
+"""The end of a stream between the threads."""
+
+
+class StreamingTagger:
+    """
+    Tags a stream of sentences, with the reading and tokenization on worker threads and the
+    inference on the calling thread.
+
+    Args:
+        classifier: the classifier, which needs token_lengths(), tokenize() and
+            predict_tokens() (e.g. an EmbeddingClassifier or a FrozenClassifier). Unless its
+            thread_safe_tokenizer is True, the tokenizer threads take turns to use its
+            tokenizer, and only the reading and the inference overlap with the tokenization.
+        bucketer: batches the sentences by their token lengths. Its window is the number of
+            sentences that each tokenizer thread takes at a time.
+        tokenizer_threads: the number of tokenizer threads.
+        queue_size: the maximum number of windows that are read or tokenized ahead of the
+            inference.
+        log_interval: the number of seconds between the throughput logs, or None for no logs.
+    """
+
+    def __init__(self, classifier: base.Classifier, bucketer: batching.LengthBucketer,
+                 tokenizer_threads=1, queue_size=4, log_interval: float|None = 10.0) -> None:
+        self.classifier = classifier
+        self.bucketer = bucketer
+        self.tokenizer_threads = tokenizer_threads
+        self.queue_size = queue_size
+        self.log_interval = log_interval
+        self.bucketer_lock = threading.Lock()
+        self.tokenizer_lock = threading.Lock()
+        self.reset_stats()
+
+
+    def reset_stats(self):
+        """
+        Reset the counts and the times.
+        """
+        self.sentences = 0
+        self.tokenize_time = 0.0
+        self.inference_time = 0.0
+        self.wait_time = 0.0
+        self.time = 0.0
+
+
+    def tag(self, records: Iterable[Record]) -> Generator[tuple[Record, str|None], None, None]:
+        """
+        Tag the records, and yield each record with its speech act, in the original order.
+        """
+        windows = queue.Queue(self.queue_size)
+        batches = queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        # The tokenizers of transformers set their padding and truncation on every call, so
+        # they can not be called from several threads at once.
+        if getattr(self.classifier, 'thread_safe_tokenizer', False):
+            tokenizer_lock = contextlib.nullcontext()  # type: Any
+        else:
+            tokenizer_lock = self.tokenizer_lock
+
+        # The threads give up waiting if the consumer has stopped.
+        def put(target: queue.Queue, item: Any):
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def get(source: queue.Queue) -> Any:
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            return _DONE
+
+        def read():
+            try:
+                for index, window in enumerate(_windows(records, self.bucketer.window)):
+                    put(windows, (index, window))
+            except BaseException as error:
+                put(batches, error)
+            for _ in range(self.tokenizer_threads):
+                put(windows, _DONE)
+
+        def tokenize():
+            try:
+                while True:
+                    item = get(windows)
+                    if item is _DONE:
+                        break
+
+                    index, window = item
+                    start = time.perf_counter()
+                    texts = [record.text for record in window]
+                    with tokenizer_lock:
+                        lengths = self.classifier.token_lengths(texts)  # type: ignore
+                    with self.bucketer_lock:
+                        window_batches = self.bucketer.batches(lengths)
+                    tokens = []
+                    for batch in window_batches:
+                        with tokenizer_lock:
+                            tokens.append(self.classifier.tokenize([texts[i] for i in batch]))  # type: ignore
+                    with self.bucketer_lock:
+                        self.tokenize_time += time.perf_counter() - start
+                    put(batches, (index, window, window_batches, tokens))
+            except BaseException as error:
+                put(batches, error)
+            put(batches, _DONE)
+
+        threads = [threading.Thread(target=read, daemon=True)]
+        threads += [threading.Thread(target=tokenize, daemon=True) for _ in range(self.tokenizer_threads)]
+        for thread in threads:
+            thread.start()
+
+        start = time.perf_counter()
+        last_log = (start, self.sentences)
+        pending = {}  # The tokenized windows that are ahead of the next window, by index.
+        next_index = 0
+        done_threads = 0
+        try:
+            while True:
+                if next_index not in pending:
+                    if done_threads == self.tokenizer_threads:
+                        break
+
+                    wait_start = time.perf_counter()
+                    item = batches.get()
+                    self.wait_time += time.perf_counter() - wait_start
+
+                    if isinstance(item, BaseException):
+                        raise item
+                    if item is _DONE:
+                        done_threads += 1
+                    else:
+                        pending[item[0]] = item[1:]
+                    continue
+
+                # Classify the next window.
+                window, window_batches, tokens = pending.pop(next_index)
+                next_index += 1
+
+                inference_start = time.perf_counter()
+                labels = [None] * len(window)  # type: list[str|None]
+                for batch, batch_tokens in zip(window_batches, tokens):
+                    codes, _ = self.classifier.predict_tokens(batch_tokens)  # type: ignore
+                    for index, label in zip(batch, base.to_labels(codes)):
+                        labels[index] = label
+                self.inference_time += time.perf_counter() - inference_start
+
+                for record, label in zip(window, labels):
+                    yield record, label
+                self.sentences += len(window)
+                self.time = time.perf_counter() - start
+
+                # Log the throughput.
+                now = time.perf_counter()
+                if self.log_interval != None and now - last_log[0] >= self.log_interval:
+                    recent = (self.sentences - last_log[1]) / (now - last_log[0])
+                    print(f'{self.report()}, {recent:.0f} sentences/sec recently, '
+                          f'queued windows: {windows.qsize()} read, {batches.qsize()} tokenized')
+                    last_log = (now, self.sentences)
+
+            assert len(pending) == 0, f'Windows are missing before window {next_index}'
+        finally:
+            stop.set()
+            self.time = time.perf_counter() - start
+
+
+    def report(self) -> str:
+        """
+        Get a summary of the throughput and where the time went.
+        """
+        throughput = self.sentences / self.time if self.time > 0 else 0.0
+        return (f'{self.sentences} sentences, {throughput:.0f} sentences/sec, tokenization {self.tokenize_time:.1f} s, '
+                f'inference {self.inference_time:.1f} s, waiting for tokens {self.wait_time:.1f} s')
+
+
+def _windows(records: Iterable[Record], size: int) -> Generator[list[Record], None, None]:
+    window = []
+    for record in records:
+        window.append(record)
+        if len(window) == size:
+            yield window
+            window = []
+
+    if len(window) > 0:
+        yield window
+
+
+def tag_file(tagger: StreamingTagger, source_file: str, target_file: str, format: str|None = None,
+             resume=False, checkpoint_interval=10000):
+    """
+    Tag the sentences of the source file, and write them to the target file. The progress is
+    checkpointed every checkpoint_interval sentences, in '<target file>.progress'. If resume is
+    True and there is a checkpoint, the target is truncated to the checkpoint, and the tagging
+    continues after the sentences that were written by then.
+    """
+    if format == None:
+        format = detect_format(source_file)
+    progress_file = target_file + '.progress'
+
+    # Find where to resume.
+    written = 0
+    if resume and os.path.isfile(progress_file):
+        with open(progress_file) as file:
+            progress = json.load(file)
+        written = progress['sentences']
+        with open(target_file, 'r+b') as file:
+            file.truncate(progress['size'])
+        print(f'Resuming after {written} sentences')
+
+    output = RecordWriter(target_file, format, append=written > 0)
+    records = itertools.islice(read_records(source_file, format), written, None)
+    try:
+        for record, speech_act in tagger.tag(records):
+            output.write(record, speech_act)
+            written += 1
+
+            if written % checkpoint_interval == 0:
+                size = output.checkpoint()
+                with open(progress_file, 'w') as file:
+                    json.dump({'sentences': written, 'size': size}, file)
+    finally:
+        output.close()
+
+    # The tagging is complete.
+    if os.path.isfile(progress_file):
+        os.remove(progress_file)
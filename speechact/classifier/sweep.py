@@ -0,0 +1,238 @@
+"""
+Train many classification networks (heads) for the embedding classifier at once. Since the
+embedding model is frozen, all the heads can be trained on the same embeddings. The sentences
+are encoded once, and each minibatch of embeddings is fed to every head, so a sweep over
+network architectures and hyperparameters costs one encoding of the corpus instead of one per
+network.
+"""
+
+from . import embedding as emb
+import os
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import time
+
+class Head:
+    """
+    A classification network in a sweep, and its hyperparameters.
+
+    Args:
+        name: the name of the head, which is also the name of its saved model file.
+        network_factory: the function that creates the network.
+        learning_rate: the learning rate of the Adam optimizer.
+        use_class_weights: weight the loss by the inverse class frequencies.
+        weight_decay: the weight decay of the Adam optimizer.
+    """
+
+    def __init__(self, name: str, network_factory: emb.NetworkFactory, learning_rate=0.001,
+                 use_class_weights=False, weight_decay=0.0) -> None:
+        self.name = name
+        self.network_factory = network_factory
+        self.learning_rate = learning_rate
+        self.use_class_weights = use_class_weights
+        self.weight_decay = weight_decay
+        self.network = None  # type: nn.Module|None
+
+
+    def create(self, input_size: int, class_frequencies: list[int], device: str):
+        """
+        Create the network, the optimizer and the loss, and reset the training state.
+        """
+        self.network = self.network_factory(input_size, len(emb.SPEECH_ACTS)).to(device)
+        self.optimizer = optim.Adam(self.network.parameters(), lr=self.learning_rate,
+                                    weight_decay=self.weight_decay)
+        self.criterion = nn.CrossEntropyLoss().to(device)
+        if self.use_class_weights:
+            class_weights = [1.0 / frequency for frequency in class_frequencies]
+            self.criterion.weight = torch.tensor(class_weights, dtype=torch.float32).to(device)
+
+        self.loss_history = []  # type: list[float]
+        self.dev_loss_history = []  # type: list[float]
+        self.best_dev_loss = float('inf')
+        self.best_epoch = 0
+        self.best_state = None  # type: dict|None
+        self.epochs_without_improvement = 0
+        self.stopped = False
+        self.time = 0.0
+        self.metrics = {}  # type: dict[str, float]
+
+
+class SweepTrainer:
+    """
+    Trains the heads on the embeddings of an embedding classifier. Each head stops early on
+    its own, when its dev loss has not improved for a number of epochs, and keeps the network
+    with the best dev loss.
+
+    Args:
+        classifier: the embedding classifier, whose embedding model (and embedding store)
+            computes the embeddings.
+        heads: the heads to train.
+    """
+
+    def __init__(self, classifier: emb.EmbeddingClassifier, heads: list[Head]) -> None:
+        names = [head.name for head in heads]
+        assert len(set(names)) == len(names), f'The names of the heads are not unique: {names}'
+
+        self.classifier = classifier
+        self.heads = heads
+
+
+    def train(self, data: emb.CorpusDataset, batch_size: int, num_epochs=100,
+              dev_data: emb.CorpusDataset|None = None, patience=5, seed: int|None = None):
+        """
+        Train all the heads on the same minibatches of precomputed embeddings. The training
+        stops when all the heads have stopped. After training, the heads are evaluated on the
+        dev data.
+        """
+        device = self.classifier.device
+
+        print('Encoding training data...')
+        train_embeddings, train_labels = self.classifier.encode_dataset(data)
+        if dev_data != None:
+            print('Encoding dev data...')
+            dev_embeddings, dev_labels = self.classifier.encode_dataset(dev_data)
+
+        class_frequencies = [data.get_class_frequency(i) for i in range(len(emb.SPEECH_ACTS))]
+        for head in self.heads:
+            head.create(train_embeddings.shape[1], class_frequencies, device)
+
+        generator = torch.Generator()
+        if seed != None:
+            generator.manual_seed(seed)
+
+        for epoch in range(num_epochs):
+            active = [head for head in self.heads if not head.stopped]
+            if len(active) == 0:
+                break
+
+            # Train each head on the same shuffled minibatches.
+            running_losses = [0.0] * len(active)
+            for head in active:
+                head.network.train()  # type: ignore
+
+            permutation = torch.randperm(len(train_labels), generator=generator).to(device)
+            for start in range(0, len(permutation), batch_size):
+                indices = permutation[start:start + batch_size]
+                embeddings = train_embeddings[indices]
+                labels = train_labels[indices]
+
+                for index, head in enumerate(active):
+                    head_start = time.perf_counter()
+                    head.optimizer.zero_grad()
+                    loss = head.criterion(head.network(embeddings), labels)  # type: ignore
+                    loss.backward()
+                    head.optimizer.step()
+                    running_losses[index] += loss.item() * len(indices)
+                    head.time += time.perf_counter() - head_start
+
+            for head, running_loss in zip(active, running_losses):
+                head.loss_history.append(running_loss / max(len(permutation), 1))
+
+            if dev_data == None:
+                print(f'Epoch {epoch+1}/{num_epochs}: {len(active)} heads trained')
+                continue
+
+            # Compute the dev loss, and stop the heads that no longer improve.
+            for head in active:
+                dev_loss = compute_loss(head, dev_embeddings, dev_labels)  # type: ignore
+                head.dev_loss_history.append(dev_loss)
+
+                if dev_loss < head.best_dev_loss:
+                    head.best_dev_loss = dev_loss
+                    head.best_epoch = epoch + 1
+                    head.best_state = {key: value.detach().clone() for key, value in head.network.state_dict().items()}  # type: ignore
+                    head.epochs_without_improvement = 0
+                else:
+                    head.epochs_without_improvement += 1
+                    if head.epochs_without_improvement >= patience:
+                        head.stopped = True
+                        print(f'Epoch {epoch+1}/{num_epochs}: stopping {head.name}, best dev loss {head.best_dev_loss:.4f} (epoch {head.best_epoch})')
+
+            print(f'Epoch {epoch+1}/{num_epochs}: {len(active)} heads trained')
+
+        for head in self.heads:
+            if head.best_state != None:
+                head.network.load_state_dict(head.best_state)  # type: ignore
+
+        if dev_data != None:
+            self.evaluate(dev_embeddings, dev_labels)  # type: ignore
+
+        print('Training complete')
+
+
+    def evaluate(self, embeddings: torch.Tensor, labels: torch.Tensor):
+        """
+        Compute the loss, accuracy and macro F1 of each head on the embeddings, and store them
+        in the metrics of the head.
+        """
+        import sklearn.metrics as metrics
+
+        correct = labels.cpu().numpy()
+        for head in self.heads:
+            predicted = predict(head, embeddings).cpu().numpy()
+            head.metrics = {
+                'loss': compute_loss(head, embeddings, labels),
+                'accuracy': float(metrics.accuracy_score(correct, predicted)),
+                'macro_f1': float(metrics.f1_score(correct, predicted, average='macro', zero_division=0))  # type: ignore
+            }
+
+
+    def save(self, directory: str):
+        """
+        Save the network of each head to '<directory>/<name>.pth'. A head can be loaded with
+        EmbeddingClassifier.load(), by an embedding classifier with the same network factory.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for head in self.heads:
+            file_name = os.path.join(directory, f'{head.name}.pth')
+            print(f'Saving model to "{file_name}"')
+            torch.save(head.network.state_dict(), file_name)  # type: ignore
+
+
+    def use(self, name: str) -> emb.EmbeddingClassifier:
+        """
+        Use the network of a head as the network of the classifier, and get the classifier.
+        """
+        head = next(head for head in self.heads if head.name == name)
+        self.classifier.cls_model = head.network  # type: ignore
+        return self.classifier
+
+
+    def report(self) -> str:
+        """
+        Get a table of the dev metrics, the best epoch and the training time of each head,
+        best first.
+        """
+        heads = sorted(self.heads, key=lambda head: head.metrics.get('loss', float('inf')))
+        lines = [f'{"head":<30} {"dev loss":>9} {"accuracy":>9} {"macro F1":>9} {"epoch":>6} {"time (s)":>9}']
+        for head in heads:
+            lines.append(f'{head.name:<30} {head.metrics.get("loss", float("nan")):9.4f} '
+                         f'{head.metrics.get("accuracy", float("nan")):9.4f} '
+                         f'{head.metrics.get("macro_f1", float("nan")):9.4f} '
+                         f'{head.best_epoch:6d} {head.time:9.2f}')
+        return '\n'.join(lines)
+
+
+def predict(head: Head, embeddings: torch.Tensor, batch_size=1024) -> torch.Tensor:
+    """
+    Get the class indices that the network of the head predicts for the embeddings.
+    """
+    head.network.eval()  # type: ignore
+    with torch.no_grad():
+        return torch.cat([torch.argmax(head.network(embeddings[start:start + batch_size]), dim=1)  # type: ignore
+                          for start in range(0, len(embeddings), batch_size)] +
+                         [torch.empty(0, dtype=torch.long, device=embeddings.device)])
+
+
+def compute_loss(head: Head, embeddings: torch.Tensor, labels: torch.Tensor, batch_size=1024) -> float:
+    """
+    Compute the mean loss of the network of the head on the embeddings.
+    """
+    head.network.eval()  # type: ignore
+    total_loss = 0.0
+    with torch.no_grad():
+        for start in range(0, len(labels), batch_size):
+            outputs = head.network(embeddings[start:start + batch_size])  # type: ignore
+            total_loss += head.criterion(outputs, labels[start:start + batch_size]).item() * len(outputs)
+    return total_loss / max(len(labels), 1)
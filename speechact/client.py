@@ -0,0 +1,206 @@
+"""
+A thin client of the classification daemon (see daemon.py). It only uses the standard library,
+so a script that offloads its classification to the daemon does not load any models, or even
+import torch or stanza.
+
+The address of a daemon is either 'host:port' for localhost HTTP, or the path of a Unix socket
+(any address with a '/').
+"""
+
+import http.client
+import json
+import socket
+from typing import Any
+from typing import Generator
+from typing import Iterable
+
+DEFAULT_ADDRESS = 'localhost:8765'
+"""The address of the daemon, if no other address is given."""
+
+CONLLU = 'conllu'
+TEXT = 'text'
+FORMATS = [CONLLU, TEXT]
+"""The formats of the sentences sent to the daemon."""
+
+
+def parse_address(address: str) -> tuple[str, int]|str:
+    """
+    Get the (host, port) of a localhost HTTP address, or the path of a Unix socket.
+    """
+    if '/' in address:
+        return address
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    An HTTP connection over a Unix socket.
+    """
+
+    def __init__(self, path: str, timeout: float|None = None) -> None:
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout != None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DaemonError(Exception):
+    """
+    An error that the daemon responded with.
+    """
+    pass
+
+
+class DaemonClient:
+    """
+    Classifies sentences with a running daemon. The sentences are sent in batches of
+    batch_size sentences, and the speech acts are read as the daemon streams them back.
+
+    The client can replace a classifier in the scripts that use classify_sentences().
+
+    Args:
+        address: the address of the daemon.
+        batch_size: the number of sentences sent per request.
+        timeout: the number of seconds to wait for the daemon, or None to wait forever.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, batch_size=1000, timeout: float|None = None) -> None:
+        self.address = address
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.connection = None  # type: http.client.HTTPConnection|None
+
+
+    def connect(self) -> http.client.HTTPConnection:
+        """
+        Get the connection to the daemon, which is kept between the requests.
+        """
+        if self.connection == None:
+            address = parse_address(self.address)
+            if isinstance(address, str):
+                self.connection = UnixHTTPConnection(address, timeout=self.timeout)
+            else:
+                self.connection = http.client.HTTPConnection(*address, timeout=self.timeout)
+        return self.connection
+
+
+    def close(self):
+        if self.connection != None:
+            self.connection.close()
+            self.connection = None
+
+
+    def request(self, method: str, path: str, body: bytes|None = None) -> http.client.HTTPResponse:
+        """
+        Send a request, and get the response. An error response raises a DaemonError.
+        """
+        connection = self.connect()
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            # The daemon may have closed the kept connection. Try once with a new one.
+            self.close()
+            connection = self.connect()
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+
+        if response.status != 200:
+            message = response.read().decode('utf-8')
+            try:
+                message = json.loads(message)['error']
+            except (ValueError, KeyError):
+                pass
+            raise DaemonError(f'{response.status} {response.reason}: {message}')
+        return response
+
+
+    def get_json(self, path: str) -> dict[str, Any]:
+        return json.loads(self.request('GET', path).read())
+
+
+    def health(self) -> dict[str, Any]:
+        """
+        Get the health of the daemon: its status and classifier.
+        """
+        return self.get_json('/health')
+
+
+    def metrics(self) -> dict[str, Any]:
+        """
+        Get the metrics of the daemon: the requests and sentences it has classified, and how
+        long it took.
+        """
+        return self.get_json('/metrics')
+
+
+    def is_running(self) -> bool:
+        """
+        Check if the daemon is running and healthy.
+        """
+        try:
+            return self.health()['status'] == 'ok'
+        except (OSError, DaemonError, http.client.HTTPException):
+            self.close()
+            return False
+
+
+    def classify(self, body: str, format=CONLLU) -> Generator[dict[str, Any], None, None]:
+        """
+        Classify the sentences of one request: CoNLL-U sentences, or texts with one sentence per
+        line. Yield the result of each sentence as the daemon streams it back, as a dict with the
+        speech_act (and the sent_id of CoNLL-U sentences).
+        """
+        response = self.request('POST', f'/classify?format={format}', body.encode('utf-8'))
+        for line in response:
+            result = json.loads(line)
+            if 'error' in result:
+                raise DaemonError(result['error'])
+            yield result
+
+
+    def classify_texts(self, texts: Iterable[str]) -> Generator[str|None, None, None]:
+        """
+        Classify the texts (one sentence each), and yield their speech acts in order.
+        """
+        for batch in _batched(texts, self.batch_size):
+            body = ''.join(' '.join(text.split()) + '\n' for text in batch)
+            classified = 0
+            for result in self.classify(body, TEXT):
+                yield result['speech_act']
+                classified += 1
+            assert classified == len(batch), f'The daemon classified {classified} of {len(batch)} texts'
+
+
+    def classify_sentences(self, sentences: Iterable[Any], jobs=1) -> Generator[tuple[Any, str|None], None, None]:
+        """
+        Classify the CoNLL-U sentences (corpus.Sentence), e.g. from Corpus.sentences(), and
+        yield each sentence with its speech act, in the same order as the sentences, as
+        Classifier.classify_sentences() does. The jobs are ignored, since the daemon decides how
+        the sentences are classified.
+        """
+        for batch in _batched(sentences, self.batch_size):
+            body = ''.join(''.join(sentence.sentence_lines) + '\n' for sentence in batch)
+            classified = 0
+            for result in self.classify(body, CONLLU):
+                yield batch[classified], result['speech_act']
+                classified += 1
+            assert classified == len(batch), f'The daemon classified {classified} of {len(batch)} sentences'
+
+
+def _batched(items: Iterable[Any], size: int) -> Generator[list, None, None]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
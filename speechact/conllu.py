@@ -0,0 +1,358 @@
+"""
+Fast CoNLL-U serialization. This writes CoNLL-U directly from token dictionaries, from compact
+column arrays, or from the original sentence lines with some columns and comments patched,
+without going through Stanza's CoNLL.write_doc2conll. The output is byte-identical to the output
+of CoNLL.write_doc2conll, also for the versions of Stanza that keep the whitespace of a token on
+the token (see token_space_misc()). benchmark_conllu_writer.py checks this for the installed
+version.
+
+Writes are buffered and flushed to the target in large chunks.
+"""
+
+from __future__ import annotations
+import typing
+from typing import TextIO
+from typing import Any
+from typing import Sequence
+from typing import Iterable
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+FIELDS = ('id', 'text', 'lemma', 'upos', 'xpos', 'feats', 'head', 'deprel', 'deps', 'misc')
+"""The ten CoNLL-U fields, in column order."""
+
+FIELD_INDEX = {field: index for index, field in enumerate(FIELDS)}
+"""The column index of each CoNLL-U field."""
+
+MISC_FIELDS = ('start_char', 'end_char', 'ner')
+"""Token fields that Stanza writes as key-value pairs in the misc column."""
+
+WRITE_BUFFER_SIZE = 1 << 20
+"""The number of characters to buffer before writing to the target (1 MiB)."""
+
+SentenceColumns = Sequence[Sequence[Any]]
+"""
+A sentence as column arrays: one sequence per CoNLL-U field (in the order of FIELDS), each with
+one value per token. None values are written as '_'.
+"""
+
+
+def token_dict_to_line(token: dict[str, Any], id_connector='-') -> str:
+    """
+    Convert a token dictionary to a CoNLL-U line (without the trailing newline). This follows
+    the conversion done by Stanza, including the dummy head that is inserted for words lacking
+    a head.
+    """
+    columns = ['_'] * 10
+
+    # Set the regular fields.
+    for field, value in token.items():
+        index = FIELD_INDEX.get(field)
+        if index is None or value is None or field == 'misc':
+            continue
+
+        if field == 'id' and isinstance(value, tuple):
+            columns[0] = id_connector.join([str(x) for x in value])
+        elif field == 'feats':
+            columns[index] = sort_feats(str(value))
+        else:
+            columns[index] = str(value)
+
+    # Collect the misc column.
+    misc = []
+    if token.get('misc'):
+        misc.append(token['misc'])
+    for field in MISC_FIELDS:
+        if token.get(field) is not None:
+            misc.append(f'{field}={token[field]}')
+    if len(misc) != 0:
+        columns[9] = '|'.join(misc)
+
+    # Insert a dummy head for words without a head (not for multi-word tokens or empty words).
+    token_id = columns[0]
+    if 'head' not in token and '-' not in token_id and '.' not in token_id:
+        word_id = token['id'][0] if isinstance(token['id'], tuple) else token['id']
+        columns[6] = str(int(word_id) - 1)
+
+    return '\t'.join(columns)
+
+
+def columns_to_lines(columns: SentenceColumns) -> list[str]:
+    """
+    Convert the column arrays of a sentence to CoNLL-U lines (without trailing newlines).
+    """
+    return ['\t'.join(['_' if value is None else str(value) for value in row])
+            for row in zip(*columns)]
+
+
+def sort_feats(feats: str) -> str:
+    """
+    Sort the features case-insensitively, as Stanza does when it writes them.
+    """
+    if '|' not in feats:
+        return feats
+    return '|'.join(sorted(feats.split('|'), key=str.casefold))
+
+
+def token_space_misc(token: doc.Token) -> list[str]:
+    """
+    Get the misc pieces of the whitespace around a Stanza Token, e.g. 'SpaceAfter=No'. Newer
+    versions of Stanza keep the whitespace on the token instead of in the misc of its words, and
+    write it to the misc column of the token line (the word line of a single-word token). Older
+    versions have no whitespace on the token, and no pieces are returned.
+    """
+    pieces = []
+    spaces_after = getattr(token, 'spaces_after', None)
+    if spaces_after is not None and spaces_after != ' ':
+        from stanza.models.common.doc import space_after_to_misc
+        pieces.append(space_after_to_misc(spaces_after))
+    spaces_before = getattr(token, 'spaces_before', None)
+    if spaces_before is not None and spaces_before != '':
+        from stanza.models.common.doc import space_before_to_misc
+        pieces.append(space_before_to_misc(spaces_before))
+    return pieces
+
+
+def merge_misc(misc: str|None, pieces: list[str]) -> str|None:
+    """
+    Merge misc pieces into a misc value as Stanza does: the pieces are sorted if they are added
+    to another piece.
+    """
+    if len(pieces) == 0:
+        return misc
+    if not misc and len(pieces) == 1:
+        return pieces[0]
+    return '|'.join(sorted((misc.split('|') if misc else []) + pieces))
+
+
+def word_to_line(word: doc.Word, ner: str|None = None, token_misc: list[str]|None = None) -> str:
+    """
+    Convert a Stanza Word to a CoNLL-U line (without the trailing newline). This reads the
+    attributes of the word directly instead of converting it to a dictionary first. The token
+    misc pieces (see token_space_misc()) of a single-word token are merged into its misc.
+    """
+    word_id = word.id
+    head = word.head
+    misc = merge_misc(word.misc, token_misc) if token_misc else word.misc
+
+    # Collect the misc column.
+    misc_pieces = [misc] if misc else []
+    if word.start_char is not None:
+        misc_pieces.append(f'start_char={word.start_char}')
+    if word.end_char is not None:
+        misc_pieces.append(f'end_char={word.end_char}')
+    if ner is not None:
+        misc_pieces.append(f'ner={ner}')
+
+    # Insert a dummy head if the word lacks a head.
+    if head is None:
+        head = word_id - 1
+
+    return '\t'.join((
+        str(word_id),
+        '_' if word.text is None else word.text,
+        '_' if word.lemma is None else word.lemma,
+        '_' if word.upos is None else word.upos,
+        '_' if word.xpos is None else word.xpos,
+        '_' if word.feats is None else sort_feats(word.feats),
+        str(head),
+        '_' if word.deprel is None else word.deprel,
+        '_' if word.deps is None else word.deps,
+        '|'.join(misc_pieces) if misc_pieces else '_'
+    ))
+
+
+def sentence_to_lines(sentence: doc.Sentence) -> list[str]:
+    """
+    Convert a Stanza Sentence to CoNLL-U token lines (without trailing newlines). Multi-word
+    tokens and empty words are handled the same way as in Stanza.
+    """
+    lines = []
+    empty_words = getattr(sentence, 'empty_words', None) or []
+    empty_index = 0
+
+    for token_index, token in enumerate(sentence.tokens):
+
+        # Write the empty words that precede this token.
+        while empty_index < len(empty_words) and empty_words[empty_index].id[0] == token_index:
+            lines.append(token_dict_to_line(empty_words[empty_index].to_dict(), id_connector='.'))
+            empty_index += 1
+
+        # Write the multi-word token line (its dictionary has the token misc).
+        if len(token.id) > 1:
+            lines.append(token_dict_to_line(token.to_dict()[0]))
+            for word in token.words:
+                lines.append(word_to_line(word))
+
+        # Single-word tokens propagate their NER label and token misc to the word.
+        else:
+            lines.append(word_to_line(token.words[0], ner=token.ner, token_misc=token_space_misc(token)))
+
+    # Write the remaining empty words.
+    for empty_word in empty_words[empty_index:]:
+        lines.append(token_dict_to_line(empty_word.to_dict(), id_connector='.'))
+
+    return lines
+
+
+def patch_lines(sentence_lines: list[str],
+                properties: dict[str, Any]|None = None,
+                columns: dict[str, Sequence[Any]]|None = None) -> list[str]:
+    """
+    Patch the original CoNLL-U lines of a sentence (with trailing newlines, as in
+    corpus.Sentence.sentence_lines). Properties are set as '# key = value' comments: an existing
+    comment is replaced in place, otherwise it is added after the last comment. Columns replace
+    entire CoNLL-U fields, with one value per token line. A new list of lines is returned.
+    """
+    lines = list(sentence_lines)
+
+    # Patch the comments.
+    if properties:
+        comment_count = 0
+        while comment_count < len(lines) and lines[comment_count].startswith('#'):
+            comment_count += 1
+
+        for key, value in properties.items():
+            key_str = f'# {key} = '
+            property_line = f'{key_str}{value}\n'
+            for index in range(comment_count):
+                if lines[index].startswith(key_str):
+                    lines[index] = property_line
+                    break
+            else:
+                lines.insert(comment_count, property_line)
+                comment_count += 1
+
+    # Patch the columns of the token lines.
+    if columns:
+        patches = [(FIELD_INDEX[field], values) for field, values in columns.items()]
+        token_index = 0
+        for line_index, line in enumerate(lines):
+            if line.startswith('#') or line == '\n':
+                continue
+
+            fields = line.rstrip('\n').split('\t')
+            for field_index, values in patches:
+                value = values[token_index]
+                fields[field_index] = '_' if value is None else str(value)
+            lines[line_index] = '\t'.join(fields) + '\n'
+            token_index += 1
+
+    return lines
+
+
+class ConlluWriter:
+    """
+    A buffered CoNLL-U writer. The sentences are accumulated in memory and written to the
+    target in chunks of about buffer_size characters. Remember to call flush() or close() (or
+    use the writer as a context manager) when done. Closing the writer does not close the
+    target.
+    """
+
+    def __init__(self, target: TextIO, buffer_size: int = WRITE_BUFFER_SIZE) -> None:
+        self.target = target
+        self.buffer_size = buffer_size
+        self.characters_written = 0
+        self._pieces = []  # type: list[str]
+        self._buffered = 0
+
+
+    def __enter__(self) -> 'ConlluWriter':
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def _append(self, text: str):
+        self._pieces.append(text)
+        self._buffered += len(text)
+        if self._buffered >= self.buffer_size:
+            self.flush()
+
+
+    def _append_sentence(self, comments: Iterable[str], token_lines: Iterable[str]):
+        lines = list(comments)
+        lines.extend(token_lines)
+        lines.append('\n')
+        self._append('\n'.join(lines))
+
+
+    def write_dicts(self, token_dicts: list[dict[str, Any]], comments: Iterable[str] = ()):
+        """
+        Write a sentence given as a list of token dictionaries, e.g. from Sentence.to_dict()
+        or the sentence objects created by the Korp converter. The comments should include the
+        leading '#'.
+        """
+        self._append_sentence(comments, [token_dict_to_line(token) for token in token_dicts])
+
+
+    def write_columns(self, columns: SentenceColumns, comments: Iterable[str] = ()):
+        """
+        Write a sentence given as column arrays. The comments should include the leading '#'.
+        """
+        self._append_sentence(comments, columns_to_lines(columns))
+
+
+    def write_lines(self, sentence_lines: list[str],
+                    properties: dict[str, Any]|None = None,
+                    columns: dict[str, Sequence[Any]]|None = None):
+        """
+        Write the original lines of a sentence (with trailing newlines), optionally with patched
+        properties and columns. See patch_lines().
+        """
+        if properties or columns:
+            sentence_lines = patch_lines(sentence_lines, properties, columns)
+        self._append(''.join(sentence_lines) + '\n')
+
+
+    def write_sentence(self, sentence: doc.Sentence):
+        """
+        Write a Stanza Sentence.
+        """
+        self._append_sentence(sentence.comments, sentence_to_lines(sentence))
+
+
+    def write_document(self, document: doc.Document):
+        """
+        Write all the sentences in a Stanza Document. This produces the same output as
+        CoNLL.write_doc2conll().
+        """
+        if len(document.sentences) == 0:
+            self._append('\n\n')
+            return
+
+        for sentence in document.sentences:
+            self.write_sentence(sentence)
+
+
+    def flush(self):
+        """
+        Write the buffered sentences to the target.
+        """
+        if len(self._pieces) == 0:
+            return
+
+        text = ''.join(self._pieces)
+        self.target.write(text)
+        self.characters_written += len(text)
+        self._pieces = []
+        self._buffered = 0
+
+
+    def close(self):
+        """
+        Flush the remaining buffered sentences. This does not close the target.
+        """
+        self.flush()
+
+
+def write_doc2conll(document: doc.Document, target: TextIO):
+    """
+    Write a Stanza Document as CoNLL-U to the target. This is a faster drop-in replacement for
+    CoNLL.write_doc2conll().
+    """
+    with ConlluWriter(target) as writer:
+        writer.write_document(document)
@@ -1,9 +1,22 @@
 """
 The main python file for this project.
+
+Stanza is not imported here, since it imports torch and transformers, which takes seconds. The
+speech act property is added to the Stanza Sentence class when the Stanza document module is
+first imported, by any module.
 """
 
+from __future__ import annotations
 import enum
-import stanza.models.common.doc as doc
+import importlib.abc
+import importlib.util
+import sys
+import typing
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
+
+STANZA_DOC_MODULE = 'stanza.models.common.doc'
 
 def get_sentence_property(sentence: doc.Sentence, key: str) -> str|None:
     """
@@ -46,13 +59,49 @@ def get_sentence_speech_act(sentence: doc.Sentence):
     """
     pass
 
+def add_sentence_properties(doc_module):
+    """
+    Add the speech act property to the Sentence class of the Stanza document module.
+    """
+    doc_module.Sentence.add_property(
+        'speech_act', 
+        default=None,
+        getter=lambda sentence: get_sentence_property(sentence, 'speech_act'),
+        setter=lambda sentence, value: set_sentence_property(sentence, 'speech_act', value)
+        )
+
+
+class _StanzaDocImportHook(importlib.abc.MetaPathFinder):
+    """
+    Adds the sentence properties when the Stanza document module is imported. The hook finds
+    the module with the other import finders, and wraps the loader of the module, so that the
+    properties are added as soon as the module is executed.
+    """
+
+    def find_spec(self, name, path, target=None):
+        if name != STANZA_DOC_MODULE:
+            return None
+
+        # The hook is only needed once.
+        sys.meta_path.remove(self)
+        spec = importlib.util.find_spec(name)
+        if spec == None or spec.loader == None:
+            return spec
+
+        exec_module = spec.loader.exec_module
+        def exec_and_add_properties(module):
+            exec_module(module)
+            add_sentence_properties(module)
+
+        spec.loader.exec_module = exec_and_add_properties  # type: ignore
+        return spec
+
+
 # Add speech act property to Stanza Sentence class.
-doc.Sentence.add_property(
-    'speech_act', 
-    default=None,
-    getter=lambda sentence: get_sentence_property(sentence, 'speech_act'),
-    setter=lambda sentence, value: set_sentence_property(sentence, 'speech_act', value)
-    )
+if STANZA_DOC_MODULE in sys.modules:
+    add_sentence_properties(sys.modules[STANZA_DOC_MODULE])
+else:
+    sys.meta_path.insert(0, _StanzaDocImportHook())
 
 class SpeechActs(enum.Enum):
     """
@@ -1,8 +1,12 @@
+from __future__ import annotations
+import typing
 import os
 import bz2
 from typing import Generator
 from typing import TextIO
-import stanza.models.common.doc as doc
+
+if typing.TYPE_CHECKING:
+    import stanza.models.common.doc as doc
 
 class Sentence:
 
@@ -130,6 +134,25 @@ class Corpus:
                 yield batch
                 batch = []
 
+    def batched_lines(self, batch_size: int) -> Generator[list[str], None, None]:
+        """
+        Yield batches of the CoNLL-U lines of this corpus. Each batch has the lines of batch_size
+        sentences, including the empty line after each sentence. The last batch may be smaller.
+        """
+        batch = []
+        sent_count = 0
+        for sentence in self.sentences():
+            batch += sentence.sentence_lines
+            batch.append('\n')
+            sent_count += 1
+            if sent_count == batch_size:
+                sent_count = 0
+                yield batch
+                batch = []
+        
+        if sent_count != 0:
+            yield batch
+
     
     @property
     def sentence_count(self) -> int:
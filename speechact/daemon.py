@@ -0,0 +1,361 @@
+"""
+A local daemon that keeps a classifier loaded, and classifies sentences for other processes.
+Loading the models (stanza, the sentiment transformer, SBERT, the rule set) takes a long time, so
+scripts that are run many times can offload their classification to a daemon that loads them
+once. The daemon listens on localhost HTTP or on a Unix socket (see client.py for the addresses,
+and for the client).
+
+The endpoints are:
+    GET /health: the status of the daemon and the name of its classifier, as JSON.
+    GET /metrics: the requests, the sentences, the errors, the classification time and the
+        latencies of the daemon, the report of the classifier (if it has one), and the load
+        time and memory of the models it has loaded (see registry.py), as JSON.
+    POST /classify?format=conllu|text: classify the sentences of the body, which are CoNLL-U
+        sentences, or texts with one sentence per line. The results are streamed back as JSON
+        lines, one per sentence in the order of the sentences, with the speech_act (and the
+        sent_id of the CoNLL-U sentences). The sentences are classified chunk_size at a time,
+        and each chunk is sent as soon as it is classified.
+
+Texts can only be classified by classifiers that classify raw text (the embedding and frozen
+classifiers). The other classifiers need CoNLL-U sentences.
+"""
+
+from speechact import client
+import speechact.classifier.base as base
+import speechact.corpus as corp
+import speechact.preprocess as pre
+import speechact.registry as registry
+import collections as coll
+import http.server
+import json
+import numpy as np
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+import urllib.parse
+from typing import Any
+from typing import Generator
+
+CLASSIFIER_TYPES = ['rulebased', 'embedding', 'frozen']
+"""The types of classifiers that the daemon can load (see load_classifier())."""
+
+WARM_UP_SENTENCE = [
+    '# text = Hur mår du?\n',
+    '1\tHur\thur\tADV\tHA\t_\t_\t_\t_\t_\n',
+    '2\tmår\tmå\tVERB\tVB\tMood=Ind|Tense=Pres|VerbForm=Fin|Voice=Act\t_\t_\t_\t_\n',
+    '3\tdu\tdu\tPRON\tPN\tCase=Nom|Definite=Def|Gender=Com|Number=Sing|PronType=Prs\t_\t_\t_\tSpaceAfter=No\n',
+    '4\t?\t?\tPUNCT\tMAD\t_\t_\t_\t_\t_\n'
+]
+"""
+A POS-tagged sentence without dependencies or sentiment, which is classified when the daemon
+starts, so that all the models that the classifier loads lazily are loaded.
+"""
+
+
+def load_classifier(classifier_type: str, model: str|None = None, device='cpu',
+                    model_name: str|None = None, precision='float32') -> base.Classifier:
+    """
+    Load a classifier of a type in CLASSIFIER_TYPES:
+        rulebased: the trained rule-based classifier, with the rule set file as the model
+            (default: models/rule-based.json). The sentiment and the dependencies are computed
+            for the sentences that need them.
+        embedding: the embedding classifier, with the classification model file as the model
+            (default: models/embedding-based.pth). The SBERT model is model_name (default:
+            embedding.EMBEDDING_MODEL), a name or a local path, in the precision (see
+            embedding.PRECISIONS).
+        frozen: a frozen classifier, with its directory as the model (default: models/frozen).
+            Its precision was chosen when it was frozen.
+    """
+    if classifier_type == 'rulebased':
+        import speechact.classifier.features as features
+        import speechact.classifier.rulebased as rb
+        return features.LazyFeatureClassifier(rb.TrainableSentimentClassifierV2(ruleset_file=model or 'models/rule-based.json'),
+                                              [features.SentimentProvider(device=device), features.DependencyProvider()])
+    elif classifier_type == 'embedding':
+        import speechact.classifier.embedding as emb
+        classifier = emb.EmbeddingClassifier(device=device, model_name=model_name or emb.EMBEDDING_MODEL,
+                                             precision=precision)
+        classifier.load(model or 'models/embedding-based.pth')
+        return classifier
+    elif classifier_type == 'frozen':
+        import speechact.classifier.frozen as frozen
+        return frozen.FrozenClassifier(model or 'models/frozen')
+    raise ValueError(f'Unknown classifier type: {classifier_type}')
+
+
+class ClassificationDaemon:
+    """
+    Serves a loaded classifier. The requests are handled on one thread each, and their chunks
+    are classified one at a time under the lock, since the classifiers are not thread-safe. The
+    metrics are updated by the handler threads at the same time, under a lock of their own, so
+    that reading them does not wait for a chunk to be classified.
+
+    Args:
+        classifier: the classifier.
+        address: the address to listen on (see client.py).
+        name: the name of the classifier in the health and metrics.
+        chunk_size: the number of sentences classified at a time.
+        warm_up: classify WARM_UP_SENTENCE before serving, to load the models of the classifier.
+        verbose: print a line per request.
+    """
+
+    def __init__(self, classifier: base.Classifier, address=client.DEFAULT_ADDRESS, name: str|None = None,
+                 chunk_size=256, warm_up=True, verbose=False) -> None:
+        self.classifier = classifier
+        self.address = address
+        self.name = name if name != None else type(classifier).__name__
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.started = time.time()
+        self.reset_stats()
+
+        if warm_up:
+            start = time.perf_counter()
+            self.classifier.predict_batch(pre.parse_doc(WARM_UP_SENTENCE + ['\n']).sentences)
+            print(f'Warmed up in {time.perf_counter() - start:.1f} s')
+
+        parsed = client.parse_address(address)
+        if isinstance(parsed, str):
+            _remove_stale_socket(parsed)
+            self.server = _UnixHTTPServer(parsed, _Handler)  # type: socketserver.BaseServer
+        else:
+            self.server = _HTTPServer(parsed, _Handler)
+        self.server.classification_daemon = self  # type: ignore
+
+
+    def reset_stats(self):
+        """
+        Reset the metrics.
+        """
+        self.requests = 0
+        self.errors = 0
+        self.sentences = 0
+        self.classify_time = 0.0
+        self.latencies = coll.deque(maxlen=1000)  # type: coll.deque[float]
+
+
+    def serve_forever(self):
+        """
+        Serve the requests until shutdown() is called (from another thread) or the process is
+        interrupted.
+        """
+        print(f'Serving {self.name} on {self.address}')
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if isinstance(client.parse_address(self.address), str) and os.path.exists(self.address):
+                os.remove(self.address)
+
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+    def health(self) -> dict[str, Any]:
+        return {'status': 'ok', 'classifier': self.name, 'pid': os.getpid()}
+
+
+    def count(self, requests=0, errors=0, latency: float|None = None):
+        """
+        Add to the request and error counts, and record the latency of a request.
+        """
+        with self.stats_lock:
+            self.requests += requests
+            self.errors += errors
+            if latency != None:
+                self.latencies.append(latency)
+
+
+    def metrics(self) -> dict[str, Any]:
+        with self.stats_lock:
+            requests, errors, sentences, classify_time = self.requests, self.errors, self.sentences, self.classify_time
+            latencies = 1000 * np.array(self.latencies) if len(self.latencies) > 0 else np.zeros(1)
+        metrics = {
+            'classifier': self.name,
+            'uptime': time.time() - self.started,
+            'requests': requests,
+            'errors': errors,
+            'sentences': sentences,
+            'classify_time': classify_time,
+            'sentences_per_second': sentences / classify_time if classify_time > 0 else 0.0,
+            'latency_ms_p50': float(np.percentile(latencies, 50)),
+            'latency_ms_p99': float(np.percentile(latencies, 99))
+        }
+        if hasattr(self.classifier, 'report'):
+            metrics['report'] = self.classifier.report()  # type: ignore
+        metrics['models'] = [vars(record) for record in registry.REGISTRY.records.values()]
+        return metrics
+
+
+    def classify(self, body: str, format: str) -> Generator[list[dict[str, Any]], None, None]:
+        """
+        Classify the sentences of a request body, and yield the results of each chunk.
+        """
+        if format == client.CONLLU:
+            chunks = _chunked(_conllu_sentences(body), self.chunk_size)
+        else:
+            chunks = _chunked(body.splitlines(), self.chunk_size)
+
+        for chunk in chunks:
+            start = time.perf_counter()
+            with self.lock:
+                if format == client.CONLLU:
+                    codes = base.predict_lines(self.classifier, chunk)
+                else:
+                    import speechact.classifier.pool as pool
+                    codes, _ = pool.predict_texts(self.classifier, chunk)
+            with self.stats_lock:
+                self.classify_time += time.perf_counter() - start
+                self.sentences += len(chunk)
+
+            if format == client.CONLLU:
+                sent_ids = [corp.Sentence(lines).try_get_meta_date('sent_id') for lines in chunk]
+                yield [{'sent_id': sent_id, 'speech_act': speech_act}
+                       for sent_id, speech_act in zip(sent_ids, base.to_labels(codes))]
+            else:
+                yield [{'speech_act': speech_act} for speech_act in base.to_labels(codes)]
+
+
+    def can_classify_text(self) -> bool:
+        return hasattr(self.classifier, 'predict_tokens')
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles the requests of a ClassificationDaemon. The responses are HTTP/1.1, so that the
+    clients can keep their connections, and the classifications are streamed with chunked
+    transfer encoding.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def daemon(self) -> ClassificationDaemon:
+        return self.server.classification_daemon  # type: ignore
+
+
+    def do_GET(self):
+        path = urllib.parse.urlparse(self.path).path
+        if path == '/health':
+            self.send_json(200, self.daemon.health())
+        elif path == '/metrics':
+            self.send_json(200, self.daemon.metrics())
+        else:
+            self.send_json(404, {'error': f'Unknown path: {path}'})
+
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        if url.path != '/classify':
+            self.send_json(404, {'error': f'Unknown path: {url.path}'})
+            return
+
+        format = urllib.parse.parse_qs(url.query).get('format', [client.CONLLU])[0]
+        if format not in client.FORMATS:
+            self.send_json(400, {'error': f'Unknown format: {format}'})
+            return
+        if format == client.TEXT and not self.daemon.can_classify_text():
+            self.send_json(400, {'error': f'{self.daemon.name} needs CoNLL-U sentences'})
+            return
+
+        start = time.perf_counter()
+        self.daemon.count(requests=1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for results in self.daemon.classify(body, format):
+                self.write_chunk(''.join(json.dumps(result, ensure_ascii=False) + '\n' for result in results))
+        except Exception as error:
+            # The status is already sent, so the error is the last line of the response.
+            self.daemon.count(errors=1)
+            self.write_chunk(json.dumps({'error': f'{type(error).__name__}: {error}'}) + '\n')
+        self.write_chunk('')
+        self.daemon.count(latency=time.perf_counter() - start)
+
+
+    def send_json(self, status: int, values: dict[str, Any]):
+        data = json.dumps(values, ensure_ascii=False).encode('utf-8')
+        if status != 200:
+            self.daemon.count(errors=1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def write_chunk(self, text: str):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):X}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+
+    def address_string(self) -> str:
+        # The clients of a Unix socket have no address.
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'local'
+
+
+    def log_message(self, format: str, *args):
+        if self.daemon.verbose:
+            super().log_message(format, *args)
+
+
+class _HTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _remove_stale_socket(path: str):
+    """
+    Remove the Unix socket of a daemon that is no longer running, so that a new daemon can
+    listen on its path. A socket that a daemon still listens on, and a path that is not a
+    socket, are not removed, and the server then fails to bind to the path.
+    """
+    if not os.path.exists(path) or not stat.S_ISSOCK(os.stat(path).st_mode):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(path)
+        except OSError:
+            os.remove(path)
+
+
+def _conllu_sentences(body: str) -> Generator[list[str], None, None]:
+    """
+    Get the lines of each CoNLL-U sentence of a request body, with their newlines.
+    """
+    lines = []
+    for line in body.splitlines(keepends=True):
+        if line.strip() == '':
+            if len(lines) > 0:
+                yield lines
+                lines = []
+        else:
+            lines.append(line if line.endswith('\n') else line + '\n')
+
+    if len(lines) > 0:
+        yield lines
+
+
+def _chunked(items, size: int) -> Generator[list, None, None]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
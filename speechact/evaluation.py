@@ -3,17 +3,18 @@ Evalaute the classifiers.
 """
 
 import speechact.classifier.base as cb
+import speechact.classifier.rulebased as rb
+import speechact.classifier.signatures as sig
 import speechact.corpus as corp
-import sklearn.metrics as metrics
 import numpy as np
-import pandas as pd
 from typing import Any
 
 def evaluate(corpus: corp.Corpus, classifier: cb.Classifier, labels: list[str],
              print_missclassified: tuple[str, str]|None=None,
-             draw_conf_matrix=False) -> dict[str, Any]:
+             draw_conf_matrix=False, jobs=1) -> dict[str, Any]:
     """
-    Evaluate the classifier on the CoNNL-U corpus.
+    Evaluate the classifier on the CoNNL-U corpus. If jobs > 1, the sentences
+    are classified in parallel worker processes.
     """
     evaluation_results = {}
 
@@ -21,58 +22,119 @@ def evaluate(corpus: corp.Corpus, classifier: cb.Classifier, labels: list[str],
     all_correct_labels = []
     all_predicted_labels = []
     misclassified = []
-    for batch in corpus.batched_docs(100):
+    if jobs > 1:
+        for sentence, predicted in classifier.classify_sentences(corpus.sentences(), jobs):
+            correct = sentence.try_get_meta_date('speech_act')
+            all_correct_labels.append(correct)
+            all_predicted_labels.append(predicted)
+
+            # Collect the missclassifed.
+            if print_missclassified:
+                if correct == print_missclassified[0] and predicted == print_missclassified[1]:
+                    misclassified.append(sentence.try_get_meta_date('text'))
+
+    else:
+        for batch in corpus.batched_docs(100):
+
+            # Get the correct labels for batch.
+            correct_labels = [sentence.speech_act for sentence in batch.sentences]
+            all_correct_labels += correct_labels
+
+            # Do prediction.
+            predicted_labels = cb.to_labels(classifier.predict_batch(batch.sentences))  # type: ignore
+            all_predicted_labels += predicted_labels
+
+            # Collect the missclassifed.
+            if print_missclassified:
+                for sentence, correct, predicted in zip(batch.sentences, correct_labels, predicted_labels):
+                    if (correct == print_missclassified[0] and 
+                        predicted == print_missclassified[1]):
+
+                        misclassified.append(sentence.text)
+    
+    evaluation_results['misclassified'] = misclassified
 
-        # Get the correct labels for batch.
-        correct_labels = [sentence.speech_act for sentence in batch.sentences]
-        all_correct_labels += correct_labels
+    compute_metrics(evaluation_results, all_correct_labels, all_predicted_labels, labels,
+                    draw_conf_matrix)
 
-        # Do prediction.
-        classifier.classify_document(batch)
+    # Print missclassified sentences.
+    if print_missclassified:
+        print()
+        print(f'{len(misclassified)} "{print_missclassified[0]}" sentences missclassified as "{print_missclassified[1]}".')
+        print('Printing missclassified sentences:')
+        for sentence_text in misclassified:
+            print(sentence_text)
+    
+    return evaluation_results
 
-        # Get the predicted labels for batch.
-        predicted_labels = [sentence.speech_act for sentence in batch.sentences]
-        all_predicted_labels += predicted_labels
 
-        # Collect the missclassifed.
-        if print_missclassified:
-            for sentence, correct in zip(batch.sentences, correct_labels):
-                if (correct == print_missclassified[0] and 
-                    sentence.speech_act == print_missclassified[1]):
+def evaluate_signatures(signature_corpus: sig.SignatureCorpus, 
+                        classifier: rb.RuleBasedClassifier, 
+                        labels: list[str],
+                        draw_conf_matrix=False) -> dict[str, Any]:
+    """
+    Evaluate a rule-based classifier on the precomputed signatures of a corpus. Each unique
+    signature is only classified once, and the metrics are computed with the signature counts
+    as sample weights. The per-sentence predictions are stored as label codes under 
+    'predictions'.
+    """
+    evaluation_results = {}
+
+    correct_labels, predicted_labels, weights = signature_corpus.weighted_labels(classifier)
+    evaluation_results['predictions'] = signature_corpus.predict(classifier)
 
-                    misclassified.append(sentence.text)
+    compute_metrics(evaluation_results, correct_labels, predicted_labels, labels,
+                    draw_conf_matrix, sample_weight=weights)
     
-    evaluation_results['misclassified'] = misclassified
+    return evaluation_results
 
 
+def compute_metrics(evaluation_results: dict[str, Any], 
+                    correct_labels: list[str], 
+                    predicted_labels: list[str], 
+                    labels: list[str],
+                    draw_conf_matrix=False,
+                    sample_weight=None):
+    """
+    Compute and print the accuracy, classification report and confusion matrix. These are 
+    stored in the evaluation results.
+    """
+
+    import sklearn.metrics as metrics
+    import pandas as pd
+
     # Compute accuracy.
-    accuracy = metrics.accuracy_score(y_true=all_correct_labels, 
-                                      y_pred=all_predicted_labels)
+    accuracy = metrics.accuracy_score(y_true=correct_labels, 
+                                      y_pred=predicted_labels,
+                                      sample_weight=sample_weight)
     evaluation_results['accuracy'] = accuracy
     print(f'Accuracy: {accuracy}')
 
     # Get classification report.
-    report = metrics.classification_report(y_true=all_correct_labels,
-                                           y_pred=all_predicted_labels,
+    report = metrics.classification_report(y_true=correct_labels,
+                                           y_pred=predicted_labels,
                                            zero_division=0,
-                                           labels=labels
+                                           labels=labels,
+                                           sample_weight=sample_weight
                                            )
     print('Classification report:')
     print(report)
 
     # Get classification report as dictionary.
-    report_dict = metrics.classification_report(y_true=all_correct_labels,
-                                                y_pred=all_predicted_labels,
+    report_dict = metrics.classification_report(y_true=correct_labels,
+                                                y_pred=predicted_labels,
                                                 zero_division=0,
                                                 labels=labels,
-                                                output_dict=True
+                                                output_dict=True,
+                                                sample_weight=sample_weight
                                                 )
     evaluation_results['classification_report'] = report_dict
 
     # Compute confusion matrix.
-    conf_matrix = metrics.confusion_matrix(y_true=all_correct_labels,
-                                           y_pred=all_predicted_labels,
-                                           labels=labels)
+    conf_matrix = metrics.confusion_matrix(y_true=correct_labels,
+                                           y_pred=predicted_labels,
+                                           labels=labels,
+                                           sample_weight=sample_weight)
     evaluation_results['conf_matrix'] = conf_matrix
     conf_matrix_dframe = pd.DataFrame(conf_matrix,
                                       index = labels,
@@ -83,16 +145,6 @@ def evaluate(corpus: corp.Corpus, classifier: cb.Classifier, labels: list[str],
     # Plot the confusion matrix.
     if draw_conf_matrix:
         plot_confusion_matrix(conf_matrix, labels)
-
-    # Print missclassified sentences.
-    if print_missclassified:
-        print()
-        print(f'{len(misclassified)} "{print_missclassified[0]}" sentences missclassified as "{print_missclassified[1]}".')
-        print('Printing missclassified sentences:')
-        for sentence_text in misclassified:
-            print(sentence_text)
-    
-    return evaluation_results
     
 
 def plot_confusion_matrix(confusion_matrix, labels: list[str]):
@@ -100,6 +152,7 @@ def plot_confusion_matrix(confusion_matrix, labels: list[str]):
     Plot a confusion matrix and display it in a window. 
     """
     import matplotlib.pyplot as plt
+    import sklearn.metrics as metrics
 
     display = metrics.ConfusionMatrixDisplay(confusion_matrix,
                                              display_labels=labels)
@@ -109,22 +162,18 @@ def plot_confusion_matrix(confusion_matrix, labels: list[str]):
 
 
 def accuracy(corpus: corp.Corpus, classifier: cb.Classifier):
-    all_correct_labels = []
-    all_predicted_labels = []
+    all_correct_codes = []
+    all_predicted_codes = []
     for batch in corpus.batched_docs(1000):
-        # Get the correct labels for batch.
-        correct_labels = [sentence.speech_act for sentence in batch.sentences]
-        all_correct_labels += correct_labels
+        # Get the correct label codes for batch.
+        all_correct_codes.append(cb.to_codes(sentence.speech_act for sentence in batch.sentences))
 
         # Do prediction.
-        classifier.classify_document(batch)
-
-        # Get the predicted labels for batch.
-        predicted_labels = [sentence.speech_act for sentence in batch.sentences]
-        all_predicted_labels += predicted_labels
+        all_predicted_codes.append(classifier.predict_batch(batch.sentences))
     
-    return metrics.accuracy_score(y_true=all_correct_labels, 
-                                  y_pred=all_predicted_labels)
+    import sklearn.metrics as metrics
+    return metrics.accuracy_score(y_true=np.concatenate(all_correct_codes), 
+                                  y_pred=np.concatenate(all_predicted_codes))
 
 
 def get_misclassified(corpus: corp.Corpus, 
@@ -132,17 +181,19 @@ def get_misclassified(corpus: corp.Corpus,
                       expected_label: str,
                       predicted_label) -> list[str]:
     
+    expected_code = cb.LABEL_CODES[expected_label]
+    predicted_code = cb.LABEL_CODES[predicted_label]
+
     misclassified = []
     for batch in corpus.batched_docs(1000):
-        # Get the correct labels for batch.
-        correct_labels = [sentence.speech_act for sentence in batch.sentences]
+        # Get the correct label codes for batch.
+        correct_codes = cb.to_codes(sentence.speech_act for sentence in batch.sentences)
 
         # Do prediction.
-        classifier.classify_document(batch)
+        predicted_codes = classifier.predict_batch(batch.sentences)
 
-        for sentence, correct_label in zip(batch.sentences, correct_labels):
-            if correct_label == expected_label and sentence.speech_act == predicted_label:
-                misclassified.append(sentence.text)
+        for index in np.flatnonzero((correct_codes == expected_code) & (predicted_codes == predicted_code)):
+            misclassified.append(batch.sentences[index].text)
 
     return misclassified
 
@@ -4,15 +4,19 @@ converted to UPOS-tages (https://universaldependencies.org/u/pos/). The original
 assigned to the XPOS field (see https://universaldependencies.org/format.html).
 """
 
+from __future__ import annotations
+import typing
 from typing import TextIO
 from typing import Generator
 from typing import Any
-import stanza
-from stanza.utils.conll import CoNLL
 import xml.etree.ElementTree as ET
 import speechact.core as sac
+import speechact.conllu as conllu
 import bz2
 
+if typing.TYPE_CHECKING:
+    import stanza
+
 SentenceObject = list[dict[str, Any]]
 SentenceComments = list[str]
 
@@ -28,16 +32,19 @@ class Korp_CoNNLU_Converter:
         """
         print('Converting xml corpus to CoNLL-U.')
         
-        # Parse and process the data in batches.
+        # Parse and process the data in batches. The sentence objects are written directly,
+        # without creating stanza Documents.
         batch_count = 0
         sentence_count = 0
-        for batched_doc in self.batched_xml_to_doc(xml_corpus, 1000, max_sentences):
-            
-            CoNLL.write_doc2conll(batched_doc, connlu_target)
+        with conllu.ConlluWriter(connlu_target) as writer:
+            for sentence_objects, sentence_comments in self.batched_xml_to_objects(xml_corpus, 1000, max_sentences):
+                
+                for sentence_object, sentence_comment in zip(sentence_objects, sentence_comments):
+                    writer.write_dicts(sentence_object, sentence_comment)
 
-            batch_count += 1
-            sentence_count += len(batched_doc.sentences)
-            print(f'batch: {batch_count}, sentence: {sentence_count}')
+                batch_count += 1
+                sentence_count += len(sentence_objects)
+                print(f'batch: {batch_count}, sentence: {sentence_count}')
 
         
         print('Conversion complete.')
@@ -48,6 +55,16 @@ class Korp_CoNNLU_Converter:
         Generator function that yields batches of stanza.Documents that are parsed from
         the Språkbanken xml corpus.
         """
+        import stanza
+        for sentence_objects, sentence_comments in self.batched_xml_to_objects(xml_corpus, batch_size, max_sentences):
+            yield stanza.Document(sentences=sentence_objects, comments=sentence_comments)
+
+
+    def batched_xml_to_objects(self, xml_corpus: TextIO, batch_size: int, max_sentences = -1) -> Generator[tuple[list[SentenceObject], list[SentenceComments]], None, None]:
+        """
+        Generator function that yields batches of sentence objects and their comments that are 
+        parsed from the Språkbanken xml corpus.
+        """
 
         # The number of sentences parsed so far.
         sentence_index = 0
@@ -79,9 +96,9 @@ class Korp_CoNNLU_Converter:
             sentence_objects.append(sentence_object)
             sentence_comments.append(sentence_comment)
 
-            # Create document batch and yield it.
+            # Yield the batch.
             if len(sentence_objects) == batch_size:
-                yield stanza.Document(sentences=sentence_objects, comments=sentence_comments)
+                yield sentence_objects, sentence_comments
 
                 # Reset the batch.
                 sentence_objects = []  # type: list[SentenceObject]
@@ -91,12 +108,12 @@ class Korp_CoNNLU_Converter:
 
             # Yield the current batch if we have reached max sentences.
             if max_sentences != -1 and sentence_index == max_sentences:
-                yield stanza.Document(sentences=sentence_objects, comments=sentence_comments)
+                yield sentence_objects, sentence_comments
                 return
         
         # Yield remaining batch that is smaller than batch size.
         if len(sentence_objects) > 0:
-            yield stanza.Document(sentences=sentence_objects, comments=sentence_comments)
+            yield sentence_objects, sentence_comments
 
 
     def xml_sentences(self, xml_corpus: TextIO) -> Generator[tuple[ET.Element, ET.Element], None, None]:
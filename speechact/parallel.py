@@ -0,0 +1,225 @@
+"""
+Code for running work in parallel worker processes. A state object (e.g. a classifier) is sent
+to each worker once, when the worker starts, and the chunks of work are then mapped over the
+workers. The results are always yielded in the same order as the chunks.
+
+With adaptive_map, the items are chunked automatically, and the chunk sizes adapt to how long
+the work takes per item.
+"""
+
+import concurrent.futures as cf
+import collections as col
+import multiprocessing as mp
+import time
+from typing import Any
+from typing import Callable
+from typing import Generator
+from typing import Iterable
+
+_worker_state = None
+"""The state object of the current worker process."""
+
+
+def _init_worker(state: Any, setup: Callable[[], None]|None = None):
+    """
+    Initialize a worker process with the state object, and run the setup function, if any.
+    """
+    global _worker_state
+    _worker_state = state
+    if setup != None:
+        setup()
+
+
+def _run_chunk(func: Callable[[Any, Any], Any], chunk: Any) -> Any:
+    """
+    Run the function on a chunk in a worker process.
+    """
+    return func(_worker_state, chunk)
+
+
+def _no_work(state: Any, chunk: Any) -> None:
+    """
+    Do nothing, to start a worker process.
+    """
+    pass
+
+
+def _run_timed(func_and_state: tuple[Callable[[Any, list], list], Any], chunk: list) -> tuple[list, float]:
+    """
+    Run the function on a chunk, and get the results and the time it took.
+    """
+    func, state = func_and_state
+    start = time.perf_counter()
+    results = func(state, chunk)
+    return results, time.perf_counter() - start
+
+
+class ChunkSizer:
+    """
+    Decides the size of the chunks from the time per item of the finished chunks, so that each
+    chunk takes about target_time seconds. The sizes start at min_size, so that all workers get
+    work quickly, and never exceed max_size.
+    """
+
+    def __init__(self, target_time=0.2, min_size=1, max_size=1000, smoothing=0.5) -> None:
+        self.target_time = target_time
+        self.min_size = min_size
+        self.max_size = max_size
+        self.smoothing = smoothing
+        self.size = min_size
+        self.item_time = None  # type: float|None
+
+
+    def update(self, chunk_size: int, chunk_time: float):
+        """
+        Update the chunk size with the time of a finished chunk.
+        """
+        if chunk_size == 0:
+            return
+
+        item_time = chunk_time / chunk_size
+        if self.item_time == None:
+            self.item_time = item_time
+        else:
+            self.item_time = self.smoothing * self.item_time + (1 - self.smoothing) * item_time
+
+        size = self.target_time / self.item_time if self.item_time > 0 else self.max_size
+        self.size = int(max(self.min_size, min(self.max_size, size)))
+
+
+    def chunks(self, items: Iterable[Any]) -> Generator[list, None, None]:
+        """
+        Chunk the items lazily, using the current chunk size for each new chunk.
+        """
+        chunk = []
+        for item in items:
+            chunk.append(item)
+            if len(chunk) >= self.size:
+                yield chunk
+                chunk = []
+
+        if len(chunk) > 0:
+            yield chunk
+
+
+def adaptive_map(func: Callable[[Any, list], list],
+                 state: Any,
+                 items: Iterable[Any],
+                 jobs: int = 1,
+                 sizer: ChunkSizer|None = None,
+                 mp_context: mp.context.BaseContext|None = None) -> Generator[Any, None, None]:
+    """
+    Map func(state, chunk) over chunks of the items, and yield the results of the items in the
+    same order as the items. The func gets a list of items, and needs to return a list with one
+    result per item. The chunks are sized by the ChunkSizer (default: ChunkSizer()), which
+    adapts the sizes to the time of the finished chunks. See ordered_map() for the other
+    arguments.
+    """
+    if sizer == None:
+        sizer = ChunkSizer()
+
+    chunks = sizer.chunks(items)
+    for results, chunk_time in ordered_map(_run_timed, (func, state), chunks, jobs,
+                                           mp_context=mp_context):
+        sizer.update(len(results), chunk_time)
+        yield from results
+
+
+def ordered_map(func: Callable[[Any, Any], Any],
+                state: Any,
+                chunks: Iterable[Any],
+                jobs: int = 1,
+                max_pending: int|None = None,
+                mp_context: mp.context.BaseContext|None = None) -> Generator[Any, None, None]:
+    """
+    Map func(state, chunk) over the chunks, and yield the results in the order of the chunks.
+    If jobs > 1, the chunks are processed by a pool of worker processes. The state is sent to
+    each worker once. The func needs to be a module-level function so that it can be pickled.
+
+    At most max_pending chunks (default: 2 * jobs) are submitted at the same time, so the
+    chunks are read lazily.
+    """
+    # Run in this process.
+    if jobs <= 1:
+        for chunk in chunks:
+            yield func(state, chunk)
+        return
+
+    with WorkerPool(state, jobs, mp_context=mp_context) as pool:
+        yield from pool.map(func, chunks, max_pending)
+
+
+class WorkerPool:
+    """
+    A pool of worker processes that is kept between maps, so that the state is only sent to
+    the workers once, when they start. With the 'fork' start method, the state is not sent at
+    all: the workers inherit it from this process, and share its memory pages until they are
+    written to (copy-on-write).
+
+    Args:
+        state: the state object of the workers.
+        jobs: the number of worker processes.
+        setup: a module-level function that is run in each worker when it starts, after the
+            state is set, e.g. to configure the threads of the worker.
+        mp_context: the multiprocessing context of the workers.
+    """
+
+    def __init__(self, state: Any, jobs: int, setup: Callable[[], None]|None = None,
+                 mp_context: mp.context.BaseContext|None = None) -> None:
+        self.jobs = jobs
+        self.executor = cf.ProcessPoolExecutor(max_workers=jobs,
+                                               mp_context=mp_context,
+                                               initializer=_init_worker,
+                                               initargs=(state, setup))
+
+
+    def start(self):
+        """
+        Start the worker processes now, rather than when the first chunk is submitted. With the
+        'fork' start method, all the workers are started (forked) at once.
+        """
+        for future in [self.executor.submit(_run_chunk, _no_work, None) for _ in range(self.jobs)]:
+            future.result()
+
+
+    def map(self, func: Callable[[Any, Any], Any],
+            chunks: Iterable[Any],
+            max_pending: int|None = None) -> Generator[Any, None, None]:
+        """
+        Map func(state, chunk) over the chunks, and yield the results in the order of the
+        chunks. At most max_pending chunks (default: 2 * jobs) are submitted at the same time.
+        See ordered_map().
+        """
+        if max_pending == None:
+            max_pending = 2 * self.jobs
+
+        pending = col.deque()  # type: col.deque[cf.Future]
+        try:
+            for chunk in chunks:
+                pending.append(self.executor.submit(_run_chunk, func, chunk))
+
+                # Wait for the oldest chunk before submitting more.
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            # Don't leave work behind if the results are not used.
+            for future in pending:
+                future.cancel()
+
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        self.executor.shutdown()
+
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
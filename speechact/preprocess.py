@@ -1,16 +1,24 @@
 """
 Some functions for handling and preprocessing corpus data files.
+
+Stanza is imported by the functions that use it, since it takes seconds to import.
 """
 
+from __future__ import annotations
 import bz2
+import typing
 from typing import TextIO
 from typing import Generator
-import stanza
-import stanza.models.common.doc as doc
-from stanza.utils.conll import CoNLL
+import speechact.batching as batching
 import speechact.corpus as corp
+import speechact.conllu as conllu
+import speechact.registry as registry
 import speechact as sa
 
+if typing.TYPE_CHECKING:
+    import stanza
+    import stanza.models.common.doc as doc
+
 def read_sentences_bz2(connlu_corpus_file: str, max_sentences = -1) -> Generator[doc.Sentence, None, None]:
     """
     Read and yield each sentence in a bz2 compressed CoNLL-U corpus. The yielded sentences are Stanza 
@@ -49,10 +57,7 @@ def read_batched_doc(connlu_corpus: TextIO, batch_size: int, max_sentences = -1)
         
         # Parse the batch as document and yield it.
         if sentence_count == batch_size or sentence_count == max_sentences:
-            doc_conll, doc_comments = CoNLL.load_conll(lines)
-            doc_dict, doc_empty = CoNLL.convert_conll(doc_conll)
-            doc = stanza.Document(doc_dict, text=None, comments=doc_comments, empty_sentences=doc_empty)
-            yield doc
+            yield parse_doc(lines)
 
             # Reset accumulated lines if we have not reached max.
             if sentence_count != max_sentences:
@@ -65,10 +70,18 @@ def read_batched_doc(connlu_corpus: TextIO, batch_size: int, max_sentences = -1)
     
     # Parse remaining lines.
     if len(lines) != 0:
-        doc_conll, doc_comments = CoNLL.load_conll(lines)
-        doc_dict, doc_empty = CoNLL.convert_conll(doc_conll)
-        doc = stanza.Document(doc_dict, text=None, comments=doc_comments, empty_sentences=doc_empty)
-        yield doc
+        yield parse_doc(lines)
+
+
+def parse_doc(lines: list[str]) -> stanza.Document:
+    """
+    Parse the lines of a CoNLL-U corpus as a stanza.Document.
+    """
+    import stanza
+    from stanza.utils.conll import CoNLL
+    doc_conll, doc_comments = CoNLL.load_conll(lines)
+    doc_dict, doc_empty = CoNLL.convert_conll(doc_conll)
+    return stanza.Document(doc_dict, text=None, comments=doc_comments, empty_sentences=doc_empty)
 
 
 def lines(txt_file_source: str) -> list[str]:
@@ -236,6 +249,7 @@ def clean_up_conllu(source: TextIO, target: TextIO, print_progress=False):
     sentences that are improperly formatted. A sentence is incorrectly formatted if it cannot 
     be loaded by Stanza's CoNLL-U parser.
     """
+    from stanza.utils.conll import CoNLL
     if print_progress: print('Clean up corpus')
 
     lines = []
@@ -303,38 +317,87 @@ def extract_sub_sample(source: TextIO,
     if print_progress: print(f'Extracted {sentence_count}/{n_sentences}. Skipped {skipped_sentences} sentences.')
 
 
-def tag_dep_rel(source: TextIO, target: TextIO, print_progress=False, **kwargs):
+def create_dep_pipeline(batch_size=1000) -> stanza.Pipeline:
+    """
+    Get the stanza pipeline for dependency parsing of pretagged sentences. The pipeline is
+    loaded once and shared (see registry.py).
+    """
+    return registry.dep_pipeline(batch_size=batch_size)
+
+
+def create_sentiment_pipeline(device='mps'):
+    """
+    Get the transformers pipeline for sentiment analysis. The labels it gives are converted
+    with to_sentiment(). The pipeline is loaded once and shared (see registry.py).
+    """
+    return registry.sentiment_pipeline(device=device)
+
+
+def parse_dependencies(pipeline: stanza.Pipeline, sentences: list[doc.Sentence],
+                       bucketer: batching.LengthBucketer|None = None):
+    """
+    Parse the dependencies of pretagged sentences with a pipeline from create_dep_pipeline(),
+    and set the head and deprel of their words. With a bucketer, the sentences are parsed in
+    batches of sentences with similar lengths (in words), and otherwise all at once.
+    """
+    import stanza.models.common.doc as doc
+
+    def parse(batch: list[doc.Sentence]) -> list[doc.Sentence]:
+        # Parse the sentences as a document of their own, and copy the parse back.
+        parsed = pipeline.process(doc.Document([sentence.to_dict() for sentence in batch]))
+        for sentence, parsed_sentence in zip(batch, parsed.sentences):  # type: ignore
+            for word, parsed_word in zip(sentence.words, parsed_sentence.words):
+                word.head = parsed_word.head
+                word.deprel = parsed_word.deprel
+        return batch
+
+    if bucketer != None:
+        bucketer.map(parse, sentences, [len(sentence.words) for sentence in sentences])
+    elif len(sentences) > 0:
+        parse(sentences)
+
+
+def tag_dep_rel(source: TextIO, target: TextIO, print_progress=False,
+                bucketer: batching.LengthBucketer|None = None, **kwargs):
     """
     Tag a source CoNLL-U corpus with Universal Dependency relations. The tagged sentences are
-    written to the target as CoNLL-U.
+    written to the target as CoNLL-U, in the same order.
+
+    The corpus is read in windows of sentences, which are parsed in batches of similar lengths
+    by the bucketer (default: a window of 2000 sentences and a budget of 5000 padded words).
 
     The dependency tags are the Universal Dependency Relations: 
     https://universaldependencies.org/u/dep/index.html
     """
     if print_progress: print('Tag corpus with dep tags')
 
-    # Initialize the stanza pipeline for dependency parsing.
-    nlp_dep = stanza.Pipeline(lang='sv', processors='depparse', 
-                              depparse_pretagged=True, depparse_batch_size=1000)
+    if bucketer == None:
+        bucketer = batching.LengthBucketer(token_budget=5000, window=2000)
+
+    # Initialize the stanza pipeline for dependency parsing. A batch of the bucketer is parsed
+    # as one batch by stanza, which counts the words of its batches without padding.
+    nlp_dep = create_dep_pipeline(batch_size=bucketer.token_budget)
 
-    # Tag the corpus in batches.
-    batch_count = 0
+    # Tag the corpus in windows.
+    window_count = 0
     sentence_count = 0
-    for batched_doc in read_batched_doc(source, 200, **kwargs):
-        tagged_doc = nlp_dep.process(batched_doc)
-        CoNLL.write_doc2conll(tagged_doc, target)
+    with conllu.ConlluWriter(target) as writer:
+        for batched_doc in read_batched_doc(source, bucketer.window, **kwargs):
+            parse_dependencies(nlp_dep, batched_doc.sentences, bucketer)
+            writer.write_document(batched_doc)
 
-        batch_count += 1
-        sentence_count += len(batched_doc.sentences)
-        if print_progress: print(f'batch: {batch_count}, sentences: {sentence_count}')
+            window_count += 1
+            sentence_count += len(batched_doc.sentences)
+            if print_progress: print(f'window: {window_count}, sentences: {sentence_count}')
 
-        # Clear documents to free memory.
-        # However, I'm not sure if this actually improves memory performance. Running the script 
-        # (either at 100 or 1000 batchsize) seem to keep memory usage at ~1.2 GB.
-        batched_doc.sentences = None
-        tagged_doc.sentences = None  # type: ignore
+            # Clear documents to free memory.
+            # However, I'm not sure if this actually improves memory performance. Running the script 
+            # (either at 100 or 1000 batchsize) seem to keep memory usage at ~1.2 GB.
+            batched_doc.sentences = None
 
-    if print_progress: print(f'Parsing complete. Parsed {sentence_count} sentences')
+    if print_progress: 
+        print(f'Parsing complete. Parsed {sentence_count} sentences')
+        print(bucketer.report())
 
 
 def tag_sentiment(source: corp.Corpus, target: TextIO, print_progress=False):
@@ -346,14 +409,7 @@ def tag_sentiment(source: corp.Corpus, target: TextIO, print_progress=False):
 
     # Create sentiment analysis pipeline.
     # Accelerate it using GPU on Mac (device='mps')
-    import transformers as trf
-    sentiment_model = trf.AutoModelForSequenceClassification.from_pretrained(
-        'KBLab/robust-swedish-sentiment-multiclass')
-    tokenizer = trf.AutoTokenizer.from_pretrained('KBLab/megatron-bert-large-swedish-cased-165k') 
-    sentiment_nlp = trf.pipeline("sentiment-analysis", 
-                                 model=sentiment_model,
-                                 tokenizer=tokenizer,
-                                 device='mps')
+    sentiment_nlp = create_sentiment_pipeline(device='mps')
     
     # Tag and write each sentence.
     total_sentences = 0
@@ -0,0 +1,346 @@
+"""
+A process-wide registry of the heavy models: the SBERT model of the embedding classifier, the
+sentiment pipeline and the stanza dependency parser. Each model is loaded once, when it is first
+asked for, and the same instance is handed out to every classifier, provider and function that
+asks for it. The models are keyed by their kind, name, device and dtype (and the options of their
+loader, e.g. the batch size of the dependency parser).
+
+The shared models must not be changed by the code that uses them. A model in another precision
+is loaded as a model of its own.
+
+Models can be loaded from local paths instead of the Hugging Face hub and the stanza resources,
+e.g. on machines without internet access. A path is either set for a model name with
+set_path(), or found in the model directory (the SPEECHACT_MODEL_DIR environment variable) under
+the name of the model, e.g. <model dir>/KBLab/sentence-bert-swedish-cased. The stanza models are
+found in <model dir>/stanza, which is laid out as the stanza resources directory.
+
+The registry records the load time and memory of each model, see ModelRegistry.report().
+"""
+
+from __future__ import annotations
+import gc
+import os
+import threading
+import time
+import typing
+from typing import Any
+from typing import Callable
+
+if typing.TYPE_CHECKING:
+    import sentence_transformers as stf
+    import stanza
+
+SBERT = 'sbert'
+SENTIMENT = 'sentiment'
+DEPPARSE = 'depparse'
+KINDS = [SBERT, SENTIMENT, DEPPARSE]
+"""The kinds of models in the registry."""
+
+SENTIMENT_MODEL = 'KBLab/robust-swedish-sentiment-multiclass'
+SENTIMENT_TOKENIZER = 'KBLab/megatron-bert-large-swedish-cased-165k'
+"""The sentiment model and its tokenizer."""
+
+DEPPARSE_LANGUAGE = 'sv'
+"""The language of the stanza dependency parser, which is its name in the registry."""
+
+STANZA_DIR = 'stanza'
+"""The directory of the stanza resources in the model directory."""
+
+MODEL_DIR_VARIABLE = 'SPEECHACT_MODEL_DIR'
+"""The environment variable with the model directory."""
+
+Loader = Callable[..., Any]
+
+
+class LoadRecord:
+    """
+    The load time and memory of a model in the registry.
+
+    Args:
+        kind: the kind of the model.
+        name: the name of the model.
+        path: the local path or name it was loaded from.
+        device: the device of the model (None for the default of its library).
+        dtype: the dtype or precision of the model (None for the default).
+        load_time: the seconds it took to load the model.
+        weight_bytes: the size of the weights (parameters and buffers) of the model.
+        rss_bytes: the growth of the resident memory of the process while the model was
+            loaded, or None if it is not known. This includes the memory of the libraries that
+            were imported to load it.
+    """
+
+    def __init__(self, kind: str, name: str, path: str, device: str|None, dtype: str|None,
+                 load_time: float, weight_bytes: int, rss_bytes: int|None) -> None:
+        self.kind = kind
+        self.name = name
+        self.path = path
+        self.device = device
+        self.dtype = dtype
+        self.load_time = load_time
+        self.weight_bytes = weight_bytes
+        self.rss_bytes = rss_bytes
+        self.uses = 1
+
+
+class ModelRegistry:
+    """
+    Loads each model once, and hands out the shared instance. The models are loaded under a
+    lock, so threads that ask for the same model at the same time get the same instance.
+
+    Args:
+        model_dir: the directory of the local models (see the module documentation), or None.
+        verbose: print a line when a model is loaded.
+    """
+
+    def __init__(self, model_dir: str|None = None, verbose=True) -> None:
+        self.model_dir = model_dir
+        self.verbose = verbose
+        self.loaders = {
+            SBERT: load_sbert,
+            SENTIMENT: load_sentiment_pipeline,
+            DEPPARSE: load_dep_pipeline
+        }  # type: dict[str, Loader]
+        self.paths = {}  # type: dict[str, str]
+        self.models = {}  # type: dict[tuple, Any]
+        self.records = {}  # type: dict[tuple, LoadRecord]
+        self.lock = threading.RLock()
+
+
+    def set_path(self, name: str, path: str):
+        """
+        Load the model with the name from a local path.
+        """
+        self.paths[name] = path
+
+
+    def resolve(self, name: str) -> str:
+        """
+        Get the path to load a model from: the path set with set_path(), the model in the model
+        directory, or else the name itself.
+        """
+        if name in self.paths:
+            return self.paths[name]
+        if self.model_dir != None and os.path.exists(os.path.join(self.model_dir, name)):
+            return os.path.join(self.model_dir, name)
+        return name
+
+
+    def get(self, kind: str, name: str, device: str|None = None, dtype: str|None = None, **options) -> Any:
+        """
+        Get the shared model of a kind (see KINDS), and load it if it is not loaded. The options
+        are passed to the loader of the kind, and models with different options are loaded
+        separately.
+        """
+        assert kind in self.loaders, f'Unknown kind of model: {kind}'
+        key = (kind, name, device, dtype, tuple(sorted(options.items())))
+        with self.lock:
+            if key in self.models:
+                self.records[key].uses += 1
+                return self.models[key]
+
+            rss = resident_memory()
+            start = time.perf_counter()
+            model = self.loaders[kind](self, name, device, dtype, **options)
+            load_time = time.perf_counter() - start
+            rss_after = resident_memory()
+
+            path = (self.stanza_dir() or name) if kind == DEPPARSE else self.resolve(name)
+            record = LoadRecord(kind, name, path, device, dtype, load_time, weight_size(model),
+                                rss_after - rss if rss != None and rss_after != None else None)
+            self.models[key] = model
+            self.records[key] = record
+            if self.verbose:
+                print(f'Loaded {kind} model {name} in {load_time:.1f} s, {record.weight_bytes / 2**20:.0f} MiB of weights')
+            return model
+
+
+    def stanza_dir(self) -> str|None:
+        """
+        Get the local stanza resources directory: the path set for 'stanza', or the stanza
+        directory of the model directory. None to use the default of stanza.
+        """
+        if STANZA_DIR in self.paths:
+            return self.paths[STANZA_DIR]
+        if self.model_dir != None and os.path.isdir(os.path.join(self.model_dir, STANZA_DIR)):
+            return os.path.join(self.model_dir, STANZA_DIR)
+        return None
+
+
+    def sbert(self, name: str, device: str|None = None, precision='float32') -> stf.SentenceTransformer:
+        """
+        Get the shared SBERT model in a precision of embedding.PRECISIONS.
+        """
+        if precision == 'auto':
+            import speechact.classifier.embedding as emb
+            precision = 'bfloat16' if emb.bfloat16_supported() else 'int8'
+        return self.get(SBERT, name, device, precision)
+
+
+    def sentiment_pipeline(self, device: str|None = 'mps', dtype: str|None = None) -> Any:
+        """
+        Get the shared transformers pipeline for sentiment analysis. The labels it gives are
+        converted with preprocess.to_sentiment().
+        """
+        return self.get(SENTIMENT, SENTIMENT_MODEL, device, dtype)
+
+
+    def dep_pipeline(self, batch_size=1000, device: str|None = None) -> stanza.Pipeline:
+        """
+        Get the shared stanza pipeline for dependency parsing of pretagged sentences.
+        """
+        return self.get(DEPPARSE, DEPPARSE_LANGUAGE, device, batch_size=batch_size)
+
+
+    def release(self, kind: str|None = None):
+        """
+        Remove the models (of a kind, or all of them) from the registry. Their memory is freed
+        when no one else refers to them.
+        """
+        with self.lock:
+            for key in [key for key in self.models if kind == None or key[0] == kind]:
+                del self.models[key]
+                del self.records[key]
+        gc.collect()
+
+
+    def report(self) -> str:
+        """
+        Get a report of the loaded models: their load time, the size of their weights, the
+        growth of the resident memory while they were loaded, and how many times they were
+        handed out.
+        """
+        lines = [f'{"kind":<10} {"name":<45} {"device":<7} {"dtype":<9} {"load s":>7} '
+                 f'{"weights MiB":>12} {"RSS MiB":>8} {"uses":>5}']
+        for record in self.records.values():
+            rss = f'{record.rss_bytes / 2**20:8.0f}' if record.rss_bytes != None else f'{"?":>8}'
+            lines.append(f'{record.kind:<10} {record.name:<45} {str(record.device):<7} {str(record.dtype):<9} '
+                         f'{record.load_time:7.1f} {record.weight_bytes / 2**20:12.0f} {rss} {record.uses:5}')
+        total_time = sum(record.load_time for record in self.records.values())
+        total_weights = sum(record.weight_bytes for record in self.records.values())
+        lines.append(f'{len(self.records)} models, loaded in {total_time:.1f} s, {total_weights / 2**20:.0f} MiB of weights')
+        return '\n'.join(lines)
+
+
+def load_sbert(registry: ModelRegistry, name: str, device: str|None, precision: str|None) -> stf.SentenceTransformer:
+    """
+    Load an SBERT model, and convert it to the precision (see embedding.quantize_model()).
+    """
+    import sentence_transformers as stf
+    import speechact.classifier.embedding as emb
+    model = stf.SentenceTransformer(registry.resolve(name), device=device)
+    if precision != None:
+        emb.quantize_model(model, precision)
+    return model
+
+
+def load_sentiment_pipeline(registry: ModelRegistry, name: str, device: str|None, dtype: str|None) -> Any:
+    """
+    Load the transformers pipeline for sentiment analysis, with the model of the name and the
+    tokenizer SENTIMENT_TOKENIZER.
+    """
+    import transformers as trf
+    options = {}  # type: dict[str, Any]
+    if dtype != None:
+        import torch
+        options['torch_dtype'] = getattr(torch, dtype)
+    sentiment_model = trf.AutoModelForSequenceClassification.from_pretrained(registry.resolve(name), **options)
+    tokenizer = trf.AutoTokenizer.from_pretrained(registry.resolve(SENTIMENT_TOKENIZER))
+    return trf.pipeline("sentiment-analysis",
+                        model=sentiment_model,
+                        tokenizer=tokenizer,
+                        device=device)
+
+
+def load_dep_pipeline(registry: ModelRegistry, language: str, device: str|None, dtype: str|None,
+                      batch_size=1000) -> stanza.Pipeline:
+    """
+    Load the stanza pipeline for dependency parsing of pretagged sentences. With a local stanza
+    directory, the models are not downloaded.
+    """
+    import stanza
+    options = {}  # type: dict[str, Any]
+    stanza_dir = registry.stanza_dir()
+    if stanza_dir != None:
+        options['dir'] = stanza_dir
+        options['download_method'] = None
+    if device != None:
+        options['device'] = device
+    return stanza.Pipeline(lang=language, processors='depparse',
+                           depparse_pretagged=True, depparse_batch_size=batch_size, **options)
+
+
+def weight_size(model: Any) -> int:
+    """
+    Get the size in bytes of the parameters and buffers of the torch modules of a model: a
+    module, a transformers pipeline (its model) or a stanza pipeline (the models of its
+    processors).
+    """
+    import torch.nn as nn
+    modules = {}  # type: dict[int, nn.Module]
+
+    def find(value: Any, depth: int):
+        if isinstance(value, nn.Module):
+            modules[id(value)] = value
+        elif depth > 0 and hasattr(value, '__dict__'):
+            for attribute in vars(value).values():
+                if isinstance(attribute, dict):
+                    for item in attribute.values():
+                        find(item, depth - 1)
+                else:
+                    find(attribute, depth - 1)
+
+    find(model, 3)
+    tensors = {}
+    for module in modules.values():
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            tensors[tensor.data_ptr()] = tensor.numel() * tensor.element_size()
+    return sum(tensors.values())
+
+
+def available_device() -> str:
+    """
+    Get the fastest torch device of this machine: 'cuda' on an NVIDIA GPU, 'mps' on the GPU of
+    a Mac, or else 'cpu'.
+    """
+    import torch
+    if torch.cuda.is_available():
+        return 'cuda'
+    if torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+def resident_memory() -> int|None:
+    """
+    Get the resident memory of this process in bytes, or None if it is not known (it is read
+    from /proc, which only Linux has).
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+REGISTRY = ModelRegistry(model_dir=os.environ.get(MODEL_DIR_VARIABLE))
+"""The registry of this process."""
+
+
+def sbert(name: str, device: str|None = None, precision='float32') -> stf.SentenceTransformer:
+    return REGISTRY.sbert(name, device, precision)
+
+
+def sentiment_pipeline(device: str|None = 'mps', dtype: str|None = None) -> Any:
+    return REGISTRY.sentiment_pipeline(device, dtype)
+
+
+def dep_pipeline(batch_size=1000, device: str|None = None) -> stanza.Pipeline:
+    return REGISTRY.dep_pipeline(batch_size, device)
+
+
+def set_path(name: str, path: str):
+    REGISTRY.set_path(name, path)
+
+
+def report() -> str:
+    return REGISTRY.report()